@@ -1,6 +1,7 @@
 __all__ = [
     "config",
     "database",
+    "migrations",
     "models",
     "schemas",
     "security",
@@ -20,7 +20,37 @@ class Settings(BaseSettings):
     specialist_schema: str = Field("specialist_auth", env="SPECIALIST_SCHEMA")
     tests_schema: str = Field("test_data", env="TESTS_SCHEMA")
     ibge_data_schema: str = Field("ibge_data", env="IBGE_DATA_SCHEMA")
-    
+
+    # Planilhas do IBGE
+    ibge_data_dir: str = Field("data", env="IBGE_DATA_DIR")
+    ibge_cache_dir: str = Field("data/.cache", env="IBGE_CACHE_DIR")
+    ibge_import_workers: int = Field(2, env="IBGE_IMPORT_WORKERS")
+    ibge_upload_dir: str = Field("data/uploads", env="IBGE_UPLOAD_DIR")
+    ibge_upload_max_mb: int = Field(200, env="IBGE_UPLOAD_MAX_MB")
+    # Cache das respostas de leitura (invalidado pela versão do dataset)
+    ibge_response_cache_size: int = Field(256, env="IBGE_RESPONSE_CACHE_SIZE")
+    ibge_http_max_age: int = Field(60, env="IBGE_HTTP_MAX_AGE")
+    # Indicadores derivados: intervalo entre conferências da versão dos datasets
+    ibge_indicator_refresh_seconds: float = Field(5.0, env="IBGE_INDICATOR_REFRESH_SECONDS")
+    # Contorno das UFs usado para gerar o mapa (TopoJSON) servido pela API
+    ibge_geojson_path: str = Field("../frontend/public/brazil-states.geojson", env="IBGE_GEOJSON_PATH")
+
+    # Cubo de pesquisa (registros anonimizados): células com menos casos que isso saem suprimidas
+    research_min_cell_size: int = Field(5, env="RESEARCH_MIN_CELL_SIZE")
+    # Intervalo entre atualizações incrementais do cubo em segundo plano (0 desliga;
+    # aí só `python -m app.triagens refresh-cube` atualiza)
+    research_cube_refresh_seconds: float = Field(30.0, env="RESEARCH_CUBE_REFRESH_SECONDS")
+
+    # Agrupamento de commits do submit: submissões que chegam juntas esperam até
+    # test_write_coalesce_ms e são gravadas em uma transação (um commit por lote)
+    test_write_coalescing: bool = Field(False, env="TEST_WRITE_COALESCING")
+    test_write_coalesce_ms: float = Field(5.0, env="TEST_WRITE_COALESCE_MS")
+    test_write_coalesce_max: int = Field(200, env="TEST_WRITE_COALESCE_MAX")
+
+    # Compressão das respostas (brotli se o pacote estiver instalado, senão gzip)
+    http_compression_min_bytes: int = Field(1024, env="HTTP_COMPRESSION_MIN_BYTES")
+    http_gzip_level: int = Field(6, env="HTTP_GZIP_LEVEL")
+    http_brotli_quality: int = Field(4, env="HTTP_BROTLI_QUALITY")
 
     # Auth/JWT
     jwt_secret_key: str = Field("super-secret-development-key", env="JWT_SECRET_KEY")
@@ -0,0 +1,67 @@
+"""
+Linha de comando para as planilhas do IBGE.
+
+    python -m app.ibge import --all
+    python -m app.ibge import autism-indigenous students-autism-by-race
+    python -m app.ibge list
+"""
+import argparse
+import sys
+import time
+
+import app.database as database
+from .migrations import run_migrations
+from .services.ibge_sheets import IBGE_SHEETS, import_sheets
+
+
+def _cmd_list(args: argparse.Namespace) -> int:
+    for name, spec in IBGE_SHEETS.items():
+        print(f"{name:36} {spec.file_name:62} → {spec.table.fullname}")
+    return 0
+
+
+def _cmd_import(args: argparse.Namespace) -> int:
+    names = list(IBGE_SHEETS) if args.all else args.datasets
+    unknown = [name for name in names if name not in IBGE_SHEETS]
+    if not names or unknown:
+        print(f"Informe --all ou datasets válidos. Desconhecidos: {unknown}", file=sys.stderr)
+        return 2
+
+    database.init_engine()
+    database.create_all()
+    run_migrations()
+
+    started = time.perf_counter()
+    results, errors = import_sheets(names, workers=args.workers, force=args.force)
+    for name in names:
+        if name in results and results[name].unchanged:
+            print(f"⏭  {name}: sem alterações desde a última carga")
+        elif name in results:
+            result = results[name]
+            print(f"✅ {name}: inseridas={result.inserted} atualizadas={result.updated} ignoradas={result.skipped} anomalias={result.anomalies}")
+        else:
+            print(f"❌ {name}: {errors[name]!r}")
+    print(f"Concluído em {time.perf_counter() - started:.2f}s")
+    return 1 if errors else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ibge", description="Planilhas do IBGE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="lista as planilhas conhecidas")
+    list_parser.set_defaults(func=_cmd_list)
+
+    import_parser = commands.add_parser("import", help="importa planilhas para o banco")
+    import_parser.add_argument("datasets", nargs="*", help="nomes das planilhas (ver `list`)")
+    import_parser.add_argument("--all", action="store_true", help="importa todas as planilhas")
+    import_parser.add_argument("--workers", type=int, default=None, help="processos de leitura")
+    import_parser.add_argument("--force", action="store_true", help="recarrega mesmo sem mudanças na planilha")
+    import_parser.set_defaults(func=_cmd_import)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 from app.routers import contact
 from app.routers import ibge
+from .compression import CompressionMiddleware
 from .config import get_settings
 import app.database as db
-from .routers import auth, platform, tests
+from .migrations import run_migrations
+from .services.ibge_jobs import shutdown_import_pool
+from .services.research_cube import cube_refresher
+from .services.test_submissions import write_coalescer
+from .responses import AppJSONResponse, ResponseShapeMiddleware
+from .services.ibge_query import NEXT_CURSOR_HEADER
+from .services.research_export import EXPORT_MAX_ID_HEADER
+from .routers import auth, platform, research, tests
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
@@ -13,7 +21,8 @@ logging.basicConfig(level=logging.DEBUG)
 
 settings = get_settings()
 
-app = FastAPI(title=settings.app_name)
+# orjson por padrão; X-Response-Shape: columnar pede listas em colunas (ver responses.py)
+app = FastAPI(title=settings.app_name, default_response_class=AppJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +30,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, EXPORT_MAX_ID_HEADER],  # paginação do IBGE e exportação retomável
+)
+app.add_middleware(ResponseShapeMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.http_compression_min_bytes,
+    gzip_level=settings.http_gzip_level,
+    brotli_quality=settings.http_brotli_quality,
 )
 
 @app.on_event("startup")
@@ -53,14 +70,23 @@ def startup_event():
     # Só cria tabelas se tudo estiver ok
     if engine_ok and session_ok:
         db.create_all()
+        run_migrations()
+        cube_refresher.start()
     else:
         print("⚠️ Skipping create_all(): Engine or Session failed.")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_import_pool()
+    write_coalescer.stop()
+    cube_refresher.stop()
+
 app.include_router(contact.router, prefix="/api/v1/contact", tags=["Contato"])
 app.include_router(auth.router)
 app.include_router(platform.router)
 app.include_router(tests.router)
 app.include_router(ibge.router)
+app.include_router(research.router)
 
 @app.get("/health")
 def healthcheck():
@@ -0,0 +1,148 @@
+# Ajustes idempotentes em tabelas que já existiam antes da versão atual dos modelos.
+# `create_all` só cria o que falta; índices e colunas novas em tabelas antigas
+# precisam ser aplicados aqui.
+from sqlalchemy import bindparam, case, func, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+import app.database as database
+from . import models
+from .services.ibge_loader import LocationHierarchy, refresh_level_summaries
+from .services.ibge_sheets import IBGE_SHEETS
+from .services.item_statistics import rebuild_item_statistics
+from .services.test_rollups import rebuild_rollups
+
+# Tabelas do IBGE que passaram a ter `location` único (upsert da importação)
+IBGE_LOCATION_TABLES = [
+    models.IndigenousAutismStatistic.__table__,
+    models.IBGEStudentAutism.__table__,
+    models.ResidentAutismStatistic.__table__,
+]
+
+
+def _index_names(conn: Connection, table) -> set[str]:
+    return {index["name"] for index in inspect(conn).get_indexes(table.name, schema=table.schema)}
+
+
+def add_missing_columns(conn: Connection) -> None:
+    """ALTER TABLE ADD COLUMN para colunas novas dos modelos (precisam ser anuláveis)."""
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in database.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name, schema=table.schema)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+            ))
+
+
+# Localidades carregadas antes da coluna `level` (a indentação já tinha se perdido)
+COUNTRY_LOCATIONS = ("Brasil",)
+REGION_LOCATIONS = ("Norte", "Nordeste", "Sudeste", "Sul", "Centro-Oeste")
+
+
+def backfill_location_levels(conn: Connection) -> None:
+    for table in database.Base.metadata.sorted_tables:
+        if "level" not in table.c or "location" not in table.c:
+            continue
+        level = case(
+            (table.c.location.in_(COUNTRY_LOCATIONS), "country"),
+            (table.c.location.in_(REGION_LOCATIONS), "region"),
+            else_="state",
+        )
+        conn.execute(table.update().where(table.c.level.is_(None)).values(level=level))
+
+
+def backfill_location_parents(conn: Connection) -> None:
+    """Preenche `parent` pela ordem de carga (id), que segue a ordem da planilha."""
+    for table in database.Base.metadata.sorted_tables:
+        if "parent" not in table.c or "level" not in table.c:
+            continue
+        missing = select(table.c.id).where(table.c.parent.is_(None), table.c.level != "country").limit(1)
+        if conn.execute(missing).first() is None:
+            continue
+        rows = conn.execute(
+            select(table.c.id, table.c.location, table.c.level).where(table.c.level.is_not(None)).order_by(table.c.id)
+        ).all()
+        parents = LocationHierarchy().parents([row.level for row in rows], [row.location for row in rows])
+        conn.execute(
+            table.update().where(table.c.id == bindparam("row_id")).values(parent=bindparam("row_parent")),
+            [{"row_id": row.id, "row_parent": parent} for row, parent in zip(rows, parents)],
+        )
+
+
+def create_missing_indexes(conn: Connection) -> None:
+    """Índices não únicos novos em tabelas existentes (os únicos ficam em ensure_unique_locations)."""
+    for table in database.Base.metadata.sorted_tables:
+        if not inspect(conn).has_table(table.name, schema=table.schema):
+            continue
+        existing = _index_names(conn, table)
+        for index in table.indexes:
+            if not index.unique and index.name not in existing:
+                index.create(conn)
+
+
+def backfill_level_summaries(conn: Connection) -> None:
+    """Resumos por nível de planilhas carregadas antes de IBGELevelSummary existir."""
+    summaries = models.IBGELevelSummary.__table__
+    done = set(conn.execute(select(summaries.c.dataset).distinct()).scalars())
+    session = Session(bind=conn)
+    for spec in IBGE_SHEETS.values():
+        if spec.name in done:
+            continue
+        if conn.execute(select(spec.table.c.id).limit(1)).first() is not None:
+            refresh_level_summaries(session, spec)
+    session.flush()
+
+
+def backfill_test_rollups(conn: Connection) -> None:
+    """Contagens de resultados gravados antes de TestResultRollup existir."""
+    if conn.execute(select(models.TestResultRollup.id).limit(1)).first() is not None:
+        return
+    if conn.execute(select(models.TestResult.id).limit(1)).first() is None:
+        return
+    session = Session(bind=conn)
+    rebuild_rollups(session)
+    session.flush()
+
+
+def backfill_item_statistics(conn: Connection) -> None:
+    """Estatísticas por item dos resultados gravados antes de TestItemStatistic existir."""
+    if conn.execute(select(models.TestItemStatistic.id).limit(1)).first() is not None:
+        return
+    if conn.execute(select(models.TestResult.id).limit(1)).first() is None:
+        return
+    session = Session(bind=conn)
+    rebuild_item_statistics(session)
+    session.flush()
+
+
+def ensure_unique_locations(conn: Connection) -> None:
+    """Remove localidades duplicadas (mantém a carga mais recente) e cria o índice único."""
+    for table in IBGE_LOCATION_TABLES:
+        existing = _index_names(conn, table)
+        for index in table.indexes:
+            if not index.unique or index.name in existing:
+                continue
+            keep = select(func.max(table.c.id)).group_by(table.c.location)
+            conn.execute(table.delete().where(table.c.id.not_in(keep)))
+            index.create(conn)
+
+
+def run_migrations() -> None:
+    """Aplica todos os ajustes pendentes. Pode ser chamado a cada startup."""
+    assert database.engine is not None, "Engine não inicializada"
+    with database.engine.begin() as conn:
+        add_missing_columns(conn)
+        backfill_location_levels(conn)
+        backfill_location_parents(conn)
+        create_missing_indexes(conn)
+        ensure_unique_locations(conn)
+        backfill_level_summaries(conn)
+        backfill_test_rollups(conn)
+        backfill_item_statistics(conn)
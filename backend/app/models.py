@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy import (
     Boolean, CheckConstraint, Column, DateTime, Enum, ForeignKey,
-    Integer, JSON, String, Text, UniqueConstraint, Float
+    Index, Integer, JSON, LargeBinary, String, Text, UniqueConstraint, Float
 )
 from sqlalchemy.orm import relationship
 from .config import get_settings
@@ -85,6 +85,11 @@ class TestResult(Base):
     __table_args__ = (
         UniqueConstraint("testado_id", "teste_tipo", name="uq_resultado_testado_tipo"),
         CheckConstraint("score >= 0", name="check_score_positive"),
+        # Ordem e keyset do painel do especialista (geral e por filtro)
+        Index("ix_resultados_criado_em_id", "criado_em", "id"),
+        Index("ix_resultados_classificacao_criado_em", "classificacao", "criado_em", "id"),
+        Index("ix_resultados_teste_tipo_criado_em", "teste_tipo", "criado_em", "id"),
+        Index("ix_resultados_regiao_criado_em", "regiao_geografica", "criado_em", "id"),
         {"schema": settings.tests_schema},
     )
 
@@ -100,7 +105,10 @@ class TestResult(Base):
         nullable=True
     )
     teste_tipo = Column(String(64), nullable=False)
+    # Lista JSON legada; fica [] quando as respostas estão em respostas_codificadas
     respostas = Column(JSON, nullable=False)
+    # Um byte por resposta (ver services/answer_codec.py)
+    respostas_codificadas = Column(LargeBinary, nullable=True)
     score = Column(Integer, nullable=False)
     classificacao = Column(String(64), nullable=False)
     faixa_etaria = Column(String(64), nullable=False)
@@ -112,11 +120,78 @@ class TestResult(Base):
     anonimizado = relationship("AnonymisedRecord", back_populates="resultado", uselist=False, cascade="all, delete-orphan")
 
 
+class TestResultRollup(Base):
+    """Quantidade de resultados por combinação de tipo, classificação, faixa e região (atualizada no submit)."""
+    __tablename__ = "resultados_contagens"
+    __table_args__ = (
+        UniqueConstraint(
+            "teste_tipo", "classificacao", "faixa_etaria", "regiao_geografica", name="uq_resultados_contagens_chave"
+        ),
+        {"schema": settings.tests_schema},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    teste_tipo = Column(String(64), nullable=False)
+    classificacao = Column(String(64), nullable=False)
+    faixa_etaria = Column(String(64), nullable=False)
+    regiao_geografica = Column(String(128), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class TestItemStatistic(Base):
+    """Quantas vezes cada resposta foi dada a cada pergunta, por tipo, faixa e região (atualizada no submit)."""
+    __tablename__ = "resultados_itens"
+    __table_args__ = (
+        UniqueConstraint(
+            "teste_tipo", "pergunta_id", "resposta", "faixa_etaria", "regiao_geografica",
+            name="uq_resultados_itens_chave",
+        ),
+        {"schema": settings.tests_schema},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    teste_tipo = Column(String(64), nullable=False)
+    pergunta_id = Column(String(32), nullable=False)
+    resposta = Column(String(64), nullable=False)
+    faixa_etaria = Column(String(64), nullable=False)
+    regiao_geografica = Column(String(128), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Idempotency-Key já usada por um usuário no submit e o resultado que ela gerou."""
+    __tablename__ = "chaves_idempotencia"
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "chave", name="uq_chave_idempotencia_usuario"),
+        {"schema": settings.tests_schema},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(
+        Integer,
+        ForeignKey(f"{settings.user_schema}.usuarios.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    chave = Column(String(128), nullable=False)
+    # sha256 do CPF + corpo; a mesma chave com outro conteúdo é recusada
+    requisicao_hash = Column(String(64), nullable=False)
+    resultado_id = Column(
+        Integer,
+        ForeignKey(f"{settings.tests_schema}.resultados_testes.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 # ===================== ANONYMISED RECORDS =====================
 
 class AnonymisedRecord(Base):
     __tablename__ = "registros_anonimizados"
-    __table_args__ = {"schema": settings.tests_schema}
+    __table_args__ = (
+        # Registros ainda não somados no cubo de pesquisa (no_cubo IS NULL)
+        Index("ix_registros_anonimizados_no_cubo_id", "no_cubo", "id"),
+        {"schema": settings.tests_schema},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     resultado_id = Column(
@@ -130,10 +205,41 @@ class AnonymisedRecord(Base):
     score = Column(Integer, nullable=False)
     teste_tipo = Column(String(64), nullable=False)
     criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # True depois de somado no cubo de pesquisa; NULL enquanto pendente
+    no_cubo = Column(Boolean, nullable=True)
 
     resultado = relationship("TestResult", back_populates="anonimizado")
 
 
+class ResearchCubeCell(Base):
+    """Contagem e soma de scores dos registros anonimizados por tipo × faixa × região × mês × faixa de score."""
+    __tablename__ = "cubo_pesquisa"
+    __table_args__ = (
+        UniqueConstraint(
+            "teste_tipo", "faixa_etaria", "regiao_geografica", "mes", "faixa_score", name="uq_cubo_pesquisa_celula"
+        ),
+        {"schema": settings.tests_schema},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    teste_tipo = Column(String(64), nullable=False)
+    faixa_etaria = Column(String(64), nullable=False)
+    regiao_geografica = Column(String(128), nullable=False)
+    mes = Column(String(7), nullable=False)  # "2026-01"
+    faixa_score = Column(String(16), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    score_soma = Column(Integer, nullable=False, default=0)
+
+
+class ResearchCubeState(Base):
+    """Linha única travada durante a atualização do cubo; guarda quando ele foi atualizado."""
+    __tablename__ = "cubo_pesquisa_estado"
+    __table_args__ = {"schema": settings.tests_schema}
+
+    id = Column(Integer, primary_key=True)
+    atualizado_em = Column(DateTime, nullable=True)
+
+
 # ===================== CONTACT MESSAGES =====================
 
 class ContactMessage(Base):
@@ -152,10 +258,15 @@ class ContactMessage(Base):
 # ===================== IBGE ESTATISTICAS INDÍGENAS =====================
 class IndigenousAutismStatistic(Base):
     __tablename__ = "indigenous_autism_statistics"
-    __table_args__ = {"schema": settings.ibge_data_schema}
+    __table_args__ = (
+        Index("uq_indigenous_autism_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     location = Column(String(255), nullable=False)
+    level = Column(String(12))  # country, region, state (indentação da planilha)
+    parent = Column(String(255), index=True)  # localidade um nível acima (drill-down)
     indigenous_population = Column(Integer, nullable=False)
     autism_count = Column(Integer, nullable=False)
     autism_percentage = Column(Float, nullable=False)
@@ -164,10 +275,15 @@ class IndigenousAutismStatistic(Base):
 # ===================== IBGE ESTATISTICAS ESTUDANTES =====================
 class IBGEStudentAutism(Base):
     __tablename__ = "student_autism_statistics"
-    __table_args__ = {"schema": settings.ibge_data_schema}
+    __table_args__ = (
+        Index("uq_student_autism_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
 
     id = Column(Integer, primary_key=True)
     location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
 
     # ============================
     # 1. Total de estudantes
@@ -293,13 +409,16 @@ class IBGEStudentAutism(Base):
 
 # ===================== IBGE ESTATISTICAS POPULAÇÃO RESIDENTE =====================
 class ResidentAutismStatistic(Base):
-    __tablename__ = " resident_autism_statistics"
-    __table_args__ = {
-        "schema": settings.ibge_data_schema
-    }
+    __tablename__ = "resident_autism_statistics"
+    __table_args__ = (
+        Index("uq_resident_autism_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
     
     total_residentes = Column(Integer, nullable=False) # Total Residentes
     total_residentes_homens = Column(Integer, nullable=False) # Total Residentes Homens
@@ -312,4 +431,236 @@ class ResidentAutismStatistic(Base):
     porcentagem_mulheres_autismo = Column(Float, nullable=False)
     porcentagem_total_autismo = Column(Float, nullable=False)
     
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ===================== IBGE CONTROLE DE CARGAS =====================
+class IBGEDataset(Base):
+    """Última carga de cada planilha: impressão digital do arquivo e versão dos dados."""
+    __tablename__ = "datasets"
+    __table_args__ = {"schema": settings.ibge_data_schema}
+
+    name = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    row_count = Column(Integer, nullable=False, default=0)
+    loaded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Resultado das checagens de consistência da última carga (ibge_validation)
+    anomaly_report = Column(JSON, nullable=True)
+
+
+class IBGEImportJob(Base):
+    """Importação executada em segundo plano (pool de processos)."""
+    __tablename__ = "import_jobs"
+    __table_args__ = {"schema": settings.ibge_data_schema}
+
+    id = Column(String(36), primary_key=True)
+    dataset = Column(String(64), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded, failed
+    stage = Column(String(32), nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Boolean, nullable=False, default=False)
+    anomalies = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    # Quem pediu a carga (usuarios.id; sem FK: o IBGE pode estar em outro banco)
+    usuario_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def duration_seconds(self) -> float | None:
+        if self.started_at is None:
+            return None
+        end = self.finished_at or datetime.utcnow()
+        return (end - self.started_at).total_seconds()
+
+
+# ===================== IBGE PLANILHAS LARGAS =====================
+# As tabelas abaixo espelham planilhas com dezenas de colunas repetidas
+# (métrica × grupo × faixa). As colunas são geradas a partir das dimensões,
+# na mesma ordem em que aparecem na planilha.
+
+RACE_KEYS = ("total", "branca", "preta", "amarela", "parda", "indigena")
+SEX_KEYS = ("total", "homens", "mulheres")
+SCHOOL_AGE_BANDS = ("total", "6_14", "15_17", "18_24", "25_mais")
+EDUCATION_LEVELS = ("total", "sem_instrucao", "fundamental", "medio", "superior")
+COURSE_KEYS = (
+    "total", "creche", "pre_escolar", "alfabetizacao_adultos",
+    "fundamental", "eja_fundamental", "medio", "eja_medio",
+    "graduacao", "especializacao", "mestrado", "doutorado",
+)
+
+
+def grid_column_names(prefixes, *dimensions) -> list[str]:
+    """Ex.: grid_column_names(("", "aut"), ("total",), ("6_14",)) → ["total_6_14", "aut_total_6_14"]."""
+    names = [()]
+    for dimension in dimensions:
+        names = [combo + (value,) for combo in names for value in dimension]
+    return ["_".join(part for part in (prefix, *combo) if part) for prefix in prefixes for combo in names]
+
+
+def _add_columns(model, names, column_type) -> None:
+    for name in names:
+        setattr(model, name, Column(name, column_type))
+
+
+class IndigenousStudentAutism(Base):
+    __tablename__ = "indigenous_student_autism_statistics"
+    __table_args__ = (
+        Index("uq_indigenous_student_autism_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(IndigenousStudentAutism, grid_column_names(("total", "aut"), SCHOOL_AGE_BANDS), Integer)
+_add_columns(IndigenousStudentAutism, grid_column_names(("pct",), SCHOOL_AGE_BANDS), Float)
+
+
+class StudentAutismByCourse(Base):
+    __tablename__ = "student_autism_course_statistics"
+    __table_args__ = (
+        Index("uq_student_autism_course_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(StudentAutismByCourse, grid_column_names(("", "aut"), COURSE_KEYS, SCHOOL_AGE_BANDS), Integer)
+_add_columns(StudentAutismByCourse, grid_column_names(("pct",), COURSE_KEYS, SCHOOL_AGE_BANDS), Float)
+
+
+class AdultAutismByEducation(Base):
+    __tablename__ = "adult_autism_education_statistics"
+    __table_args__ = (
+        Index("uq_adult_autism_education_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(AdultAutismByEducation, grid_column_names(("", "aut"), SEX_KEYS, EDUCATION_LEVELS), Integer)
+_add_columns(AdultAutismByEducation, grid_column_names(("pct",), SEX_KEYS, EDUCATION_LEVELS), Float)
+
+
+class ResidentAutismByRace(Base):
+    __tablename__ = "resident_autism_race_statistics"
+    __table_args__ = (
+        Index("uq_resident_autism_race_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(ResidentAutismByRace, grid_column_names(("", "aut"), RACE_KEYS), Integer)
+_add_columns(ResidentAutismByRace, grid_column_names(("pct",), RACE_KEYS), Float)
+
+
+class IndigenousSchoolingRate(Base):
+    __tablename__ = "indigenous_schooling_rate_statistics"
+    __table_args__ = (
+        Index("uq_indigenous_schooling_rate_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(IndigenousSchoolingRate, grid_column_names(("taxa", "taxa_aut"), SCHOOL_AGE_BANDS), Float)
+
+
+class SchoolingRateByRace(Base):
+    __tablename__ = "schooling_rate_race_statistics"
+    __table_args__ = (
+        Index("uq_schooling_rate_race_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(SchoolingRateByRace, grid_column_names(("taxa", "taxa_aut"), RACE_KEYS, SCHOOL_AGE_BANDS), Float)
+
+
+class SchoolingRateBySex(Base):
+    __tablename__ = "schooling_rate_sex_statistics"
+    __table_args__ = (
+        Index("uq_schooling_rate_sex_location", "location", unique=True),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    level = Column(String(12))
+    parent = Column(String(255), index=True)
+
+
+_add_columns(SchoolingRateBySex, grid_column_names(("taxa", "taxa_aut"), SEX_KEYS, SCHOOL_AGE_BANDS), Float)
+
+
+# ===================== IBGE FORMATO LONGO =====================
+# Uma linha por (localidade, grupo, faixa, métrica): o cliente busca só o
+# recorte que vai plotar em vez das 90 colunas da tabela larga.
+
+STUDENT_METRICS = ("total", "aut", "pct")
+
+
+class StudentAutismByRaceValue(Base):
+    __tablename__ = "student_autism_by_race_values"
+    __table_args__ = (
+        Index("uq_student_autism_by_race_values", "location", "race", "age_band", "metric", unique=True),
+        # Recortes sem localidade (ex.: uma faixa em todas as UFs)
+        Index("ix_student_autism_by_race_values_slice", "race", "age_band", "metric"),
+        {"schema": settings.ibge_data_schema},
+    )
+
+    id = Column(Integer, primary_key=True)
+    location = Column(String(255), nullable=False)
+    race = Column(String(20), nullable=False)
+    age_band = Column(String(20), nullable=False)
+    metric = Column(String(10), nullable=False)
+    value = Column(Float)
+
+
+# ===================== IBGE RESUMOS POR NÍVEL =====================
+class IBGELevelSummary(Base):
+    """
+    Totais pré-calculados de cada planilha por nível (country, region, state),
+    refeitos a cada carga. Somar todas as linhas misturaria Brasil, regiões e
+    UFs; aqui cada nível é somado separadamente.
+    """
+    __tablename__ = "level_summaries"
+    __table_args__ = {"schema": settings.ibge_data_schema}
+
+    dataset = Column(String(100), primary_key=True)
+    level = Column(String(12), primary_key=True)
+    locations = Column(Integer, nullable=False)
+    # Soma de cada coluna inteira (contagens) das localidades do nível
+    totals = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,75 @@
+# Resposta JSON padrão da API (orjson) e formato colunar opcional.
+#
+# Com o cabeçalho `X-Response-Shape: columnar`, listas de objetos saem como
+# um array por campo ({"location": [...], "autism_count": [...]}) em vez de
+# repetir os nomes dos campos em cada item. Vale para a lista da resposta e
+# para listas de objetos logo abaixo da raiz (ex.: `pacientes` no dashboard
+# do especialista).
+from contextvars import ContextVar
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+RESPONSE_SHAPE_HEADER = "X-Response-Shape"
+COLUMNAR = "columnar"
+
+response_shape: ContextVar[str | None] = ContextVar("response_shape", default=None)
+
+
+def wants_columnar() -> bool:
+    return response_shape.get() == COLUMNAR
+
+
+def _is_records(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def records_to_columns(records: list[dict]) -> dict[str, list]:
+    """[{a: 1, b: 2}, {a: 3}] → {a: [1, 3], b: [2, None]}."""
+    fields = list(dict.fromkeys(key for record in records for key in record))
+    return {field: [record.get(field) for record in records] for field in fields}
+
+
+def to_columnar(content: Any) -> Any:
+    if _is_records(content):
+        return records_to_columns(content)
+    if isinstance(content, dict):
+        return {key: records_to_columns(value) if _is_records(value) else value for key, value in content.items()}
+    return content
+
+
+class AppJSONResponse(ORJSONResponse):
+    """ORJSONResponse que respeita o formato pedido pelo cliente."""
+
+    def render(self, content: Any) -> bytes:
+        if wants_columnar():
+            content = to_columnar(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class ResponseShapeMiddleware:
+    """Lê X-Response-Shape para o contexto da requisição e marca as respostas com Vary."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        shape = Headers(scope=scope).get(RESPONSE_SHAPE_HEADER.lower())
+        token = response_shape.set(shape.strip().lower() if shape else None)
+
+        async def send_with_vary(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).add_vary_header(RESPONSE_SHAPE_HEADER)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            response_shape.reset(token)
@@ -1,55 +1,290 @@
-from fastapi import APIRouter, Depends
+import os
+from typing import Literal
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from sqlalchemy.orm import Session
+from app.config import get_settings
 from app.database import get_db
-from app.services.ibge_importer import import_ibge_autism_file
-from app.schemas import IndigenousAutismStatisticResponse
-from app.models import IndigenousAutismStatistic
-from app.services.ibge_students_autism_by_race import import_ibge_students_autism_by_race
-from app.models import IBGEStudentAutism
-from app.schemas import IBGEStudentAutismByRaceResponse
-from app.schemas import IndigenousAutismStatisticResponse, IndigenousAutismSummary 
+from app.dependencies import require_role
+from app.responses import AppJSONResponse
+from app.models import IndigenousAutismStatistic, UserAccount
+from app.models import IBGEStudentAutism, RACE_KEYS, SCHOOL_AGE_BANDS, STUDENT_METRICS
+from app.schemas import StudentAutismByRaceValueResponse
+from app.schemas import IndigenousAutismSummary, IBGEImportJobResponse
+from app.schemas import IBGEAnomalyReportResponse, IBGELevelSummaryResponse
 from app.services.ibge_analytics import get_indigenous_autism_summary
+from app.services.ibge_dashboard import dashboard_response
+from app.services.ibge_indicators import (
+    UnknownIndicatorError,
+    evaluate_indicators,
+    indicators_etag,
+    list_indicators,
+)
 from app.services.ibge_resident_autism_sex import get_resident_gender_autism_distribution
+from app.services.ibge_jobs import get_job, submit_import
+from app.services.ibge_loader import LOCATION_LEVELS, current_dataset, level_summary
+from app.services.ibge_map import MAP_PRECISIONS, map_response
+from app.services.ibge_query import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, ListParams, UnknownFieldError, list_locations
+from app.services.ibge_response_cache import cached_json, etag_matches
+from app.services.ibge_students_autism_by_race import query_students_by_race_values
+from app.services.ibge_sheets import IBGE_SHEETS, sheet_path
+from app.services.ibge_stream import UPLOAD_EXTENSIONS, UploadTooLarge, spool_upload
+
+settings = get_settings()
 
 # Criação do roteador, definindo o prefixo da URL e as tags para o Swagger UI
 router = APIRouter(prefix="/api/v1/ibge", tags=["IBGE"])
 
+# Cargas trocam tabelas públicas (e o upload traz conteúdo novo): só especialistas
+_require_importer = require_role("especialista")
+
+
+# As importações rodam em segundo plano: a rota devolve o job na hora e o
+# andamento é consultado em GET /imports/{job_id}
+def _start_import(db: Session, name: str, force: bool, user: UserAccount) -> IBGEImportJobResponse:
+    job = submit_import(db, name, sheet_path(IBGE_SHEETS[name]), force=force, usuario_id=user.id)
+    return IBGEImportJobResponse.model_validate(job)
+
+
+# Parâmetros comuns das listagens: ?fields=location,autism_count&level=state&limit=10&cursor=42
+def _list_params(
+    fields: str | None = Query(None, description="Colunas separadas por vírgula"),
+    location: list[str] | None = Query(None),
+    level: Literal[LOCATION_LEVELS] | None = None,
+    parent: str | None = Query(None, description="Só as localidades logo abaixo desta (ex.: Norte → UFs do Norte)"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: int | None = Query(None, description=f"Valor do cabeçalho {NEXT_CURSOR_HEADER} da página anterior"),
+) -> ListParams:
+    return ListParams(fields=fields, locations=location, level=level, parent=parent, limit=limit, cursor=cursor)
+
+
+def _paginated(response: Response, rows: list[dict], next_cursor: int | None) -> list[dict]:
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_cursor)
+    return rows
+
+
+def _list_table(db: Session, response: Response, table, params: ListParams) -> list[dict]:
+    try:
+        rows, next_cursor = list_locations(db, table, params)
+    except UnknownFieldError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return _paginated(response, rows, next_cursor)
+
+
+@router.get("/imports/{job_id}", response_model=IBGEImportJobResponse)
+def read_import_job(job_id: str, db: Session = Depends(get_db)):
+    job = get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Importação não encontrada")
+    return job
+
+
 # autismo em indigenas
-@router.post("/autism-indigenous/import")
-def import_autism_indigenous(db: Session = Depends(get_db)):
-    import_ibge_autism_file(db, "data/autismo_em_indigenas.xlsx")
-    return {"status": "import completed"}
+@router.post("/autism-indigenous/import", response_model=IBGEImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_autism_indigenous(
+    force: bool = False, db: Session = Depends(get_db), current_user: UserAccount = Depends(_require_importer)
+):
+    return _start_import(db, "autism-indigenous", force, current_user)
+
+# Tudo que a página de dados precisa em uma resposta só (gzip em cache)
+@router.get("/dashboard")
+def read_dashboard(request: Request, db: Session = Depends(get_db)):
+    """Seções: brasil, states, gender, ethnicity e as versões dos datasets usados."""
+    return dashboard_response(request, db)
+
+# Mapa das UFs em TopoJSON com os indicadores já juntados (gerado uma vez por versão)
+@router.get("/map/states")
+def read_states_map(
+    request: Request,
+    precision: Literal[tuple(MAP_PRECISIONS)] = Query("medium", description="Grade de quantização: low, medium ou high"),
+    db: Session = Depends(get_db),
+):
+    try:
+        return map_response(request, db, precision)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Contorno das UFs não encontrado")
+
+
+# Indicadores derivados (razões, taxas por 100 mil), calculados sobre arrays em memória
+@router.get("/indicators")
+def read_indicator_catalog():
+    return list_indicators()
+
+
+@router.get("/indicators/values")
+def read_indicator_values(
+    request: Request,
+    name: list[str] = Query(..., description="Indicadores (ver GET /indicators); parâmetro repetível"),
+    level: Literal[LOCATION_LEVELS] | None = None,
+    location: list[str] | None = Query(None),
+    db: Session = Depends(get_db),
+):
+    etag = indicators_etag(db, name, level, location)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.ibge_http_max_age}"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        values = evaluate_indicators(db, name, level, location)
+    except UnknownIndicatorError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return AppJSONResponse(values, headers=headers)
+
+
+# As rotas GET abaixo passam por cached_json: a resposta serializada fica em
+# memória até a próxima importação do(s) dataset(s) indicado(s).
 
 # Rota que retorna uma LISTA de objetos.
 # Exemplo: [{"UF": "SP", "casos": 100}, {"UF": "RJ", "casos": 50}, ...]
-@router.get("/autism-indigenous", response_model=list[IndigenousAutismStatisticResponse])
-def list_autism_indigenous(db: Session = Depends(get_db)):
-    return db.query(IndigenousAutismStatistic).all()
+@router.get("/autism-indigenous")
+def list_autism_indigenous(
+    request: Request, params: ListParams = Depends(_list_params), db: Session = Depends(get_db)
+):
+    return cached_json(
+        request, db, ["autism-indigenous"],
+        lambda response: _list_table(db, response, IndigenousAutismStatistic.__table__, params),
+    )
 
 # Rota que retorna um ÚNICO objeto com a soma total.
 # Exemplo: {"total_populacao": 1000000, "total_casos": 5000}
 @router.get("/autism-indigenous/summary", response_model=IndigenousAutismSummary)
-def list_autism_indigenous_summary(db: Session = Depends(get_db)):
-    return get_indigenous_autism_summary(db)
+def list_autism_indigenous_summary(request: Request, db: Session = Depends(get_db)):
+    return cached_json(request, db, ["autism-indigenous"], lambda response: get_indigenous_autism_summary(db))
 
 # autismo em estudantes por cor
-@router.post("/students-autism-by-race/import")
-def import_students_autism_by_race_route(db: Session = Depends(get_db)):
-    import_ibge_students_autism_by_race(db, "data/autismo_estudantes_cor.xlsx")
-    return {"status": "import completed"}
+@router.post("/students-autism-by-race/import", response_model=IBGEImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_students_autism_by_race_route(
+    force: bool = False, db: Session = Depends(get_db), current_user: UserAccount = Depends(_require_importer)
+):
+    return _start_import(db, "students-autism-by-race", force, current_user)
 
 @router.get("/students-autism-by-race")
-def list_students_autism_by_race(db: Session = Depends(get_db)):
-    return db.query(IBGEStudentAutism).all()
+def list_students_autism_by_race(
+    request: Request, params: ListParams = Depends(_list_params), db: Session = Depends(get_db)
+):
+    return cached_json(
+        request, db, ["students-autism-by-race"],
+        lambda response: _list_table(db, response, IBGEStudentAutism.__table__, params),
+    )
+
+# Mesmos dados em formato longo, só o recorte pedido.
+# Ex.: ?location=Brasil&race=preta&race=parda&metric=pct
+@router.get("/students-autism-by-race/values", response_model=list[StudentAutismByRaceValueResponse])
+def query_students_autism_by_race(
+    request: Request,
+    location: list[str] | None = Query(None),
+    race: list[Literal[RACE_KEYS]] | None = Query(None),
+    age_band: list[Literal[SCHOOL_AGE_BANDS]] | None = Query(None),
+    metric: list[Literal[STUDENT_METRICS]] | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: int | None = None,
+    db: Session = Depends(get_db),
+):
+    def build(response: Response):
+        rows, next_cursor = query_students_by_race_values(db, location, race, age_band, metric, limit, cursor)
+        return _paginated(response, rows, next_cursor)
+
+    return cached_json(request, db, ["students-autism-by-race"], build)
 
 @router.get("/resident_gender_distribution")
-def read_resident_gender_distribution(db: Session = Depends(get_db)):
+def read_resident_gender_distribution(request: Request, db: Session = Depends(get_db)):
     """Busca a distribuição de autismo por sexo na população residente para o gráfico de pizza."""
-    
-    data = get_resident_gender_autism_distribution(db)
-    
-    if data is None:
-        # Se não houver dados, retorna uma resposta vazia ou 404 (aqui, retornamos um dicionário vazio)
-        return {} 
-        
-    return data
\ No newline at end of file
+
+    def build(response: Response):
+        data = get_resident_gender_autism_distribution(db)
+
+        if data is None:
+            # Se não houver dados, retorna uma resposta vazia ou 404 (aqui, retornamos um dicionário vazio)
+            return {}
+
+        return data
+
+    return cached_json(request, db, ["residents-autism-by-sex"], build)
+
+
+# Planilhas declaradas em services/ibge_sheets.py
+def _get_sheet(name: str):
+    spec = IBGE_SHEETS.get(name)
+    if spec is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Planilha do IBGE não encontrada")
+    return spec
+
+
+@router.get("/datasets")
+def list_datasets():
+    return [
+        {"name": spec.name, "file_name": spec.file_name, "table": spec.table.fullname}
+        for spec in IBGE_SHEETS.values()
+    ]
+
+
+@router.post("/datasets/{name}/import", response_model=IBGEImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_dataset(
+    name: str,
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: UserAccount = Depends(_require_importer),
+):
+    spec = _get_sheet(name)
+    return _start_import(db, spec.name, force, current_user)
+
+
+# Nova versão da planilha enviada pelo cliente (sem redeploy). O arquivo vai
+# para o disco em blocos e é lido em streaming pelo job.
+@router.post("/datasets/{name}/upload", response_model=IBGEImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def upload_dataset(
+    name: str,
+    file: UploadFile = File(...),
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: UserAccount = Depends(_require_importer),
+):
+    spec = _get_sheet(name)
+    if not (file.filename or "").lower().endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Envie uma planilha .xlsx")
+    try:
+        path = spool_upload(file)
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc))
+
+    try:
+        job = submit_import(
+            db, spec.name, path, force=force, streaming=True, remove_source=True, usuario_id=current_user.id
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    return IBGEImportJobResponse.model_validate(job)
+
+
+# Totais pré-calculados na importação para um nível (Brasil, soma das regiões, soma das UFs)
+@router.get("/datasets/{name}/summary", response_model=IBGELevelSummaryResponse)
+def read_dataset_summary(
+    name: str, request: Request, level: Literal[LOCATION_LEVELS] = "country", db: Session = Depends(get_db)
+):
+    spec = _get_sheet(name)
+
+    def build(response: Response):
+        summary = level_summary(db, spec.name, level)
+        if summary is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resumo não encontrado; importe a planilha")
+        return IBGELevelSummaryResponse.model_validate(summary)
+
+    return cached_json(request, db, [spec.name], build)
+
+
+# Checagens de consistência da última carga (percentuais, aut ≤ total, somas por nível)
+@router.get("/datasets/{name}/anomalies", response_model=IBGEAnomalyReportResponse)
+def read_dataset_anomalies(name: str, db: Session = Depends(get_db)):
+    dataset = current_dataset(db, _get_sheet(name))
+    if dataset is None or dataset.anomaly_report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Relatório não encontrado; importe a planilha")
+    return dataset.anomaly_report
+
+
+@router.get("/datasets/{name}")
+def list_dataset_rows(
+    name: str, request: Request, params: ListParams = Depends(_list_params), db: Session = Depends(get_db)
+):
+    spec = _get_sheet(name)
+    return cached_json(request, db, [spec.name], lambda response: _list_table(db, response, spec.table, params))
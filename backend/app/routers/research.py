@@ -0,0 +1,68 @@
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import get_db
+from ..dependencies import require_role
+from ..services.research_cube import CUBE_DIMENSIONS, query_cube
+from ..services.research_export import (
+    EXPORT_FORMATS,
+    EXPORT_MAX_ID_HEADER,
+    UnsupportedExportFormat,
+    export_max_id,
+    negotiate_export_format,
+    stream_export,
+)
+
+router = APIRouter(prefix="/api/v1/pesquisa", tags=["pesquisa"])
+
+MONTH_PATTERN = r"^\d{4}-\d{2}$"
+
+
+@router.get("/cubo", response_model=schemas.ResearchCubeResponse)
+def get_research_cube(
+    dimensao: List[Literal[CUBE_DIMENSIONS]] = Query(
+        ..., description="Dimensões do agrupamento (repetir: ?dimensao=teste_tipo&dimensao=mes)"
+    ),
+    teste_tipo: Optional[List[str]] = Query(None),
+    faixa_etaria: Optional[List[str]] = Query(None),
+    regiao_geografica: Optional[List[str]] = Query(None),
+    faixa_score: Optional[List[str]] = Query(None),
+    mes_inicio: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="AAAA-MM"),
+    mes_fim: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="AAAA-MM"),
+    db: Session = Depends(get_db),
+    current_user: models.UserAccount = Depends(require_role("especialista")),
+):
+    filters = {
+        "teste_tipo": teste_tipo,
+        "faixa_etaria": faixa_etaria,
+        "regiao_geografica": regiao_geografica,
+        "faixa_score": faixa_score,
+    }
+    return query_cube(db, dimensao, filters, mes_inicio=mes_inicio, mes_fim=mes_fim)
+
+
+@router.get("/exportar", response_class=StreamingResponse)
+def export_research_records(
+    after: int = Query(0, ge=0, description="Último id já recebido (retoma a exportação depois dele)"),
+    accept: str = Header("*/*"),
+    current_user: models.UserAccount = Depends(require_role("especialista")),
+):
+    try:
+        media_type = negotiate_export_format(accept)
+    except UnsupportedExportFormat as exc:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(exc)) from exc
+
+    max_id = export_max_id()
+    export_format = EXPORT_FORMATS[media_type]
+    return StreamingResponse(
+        stream_export(media_type, after, max_id),
+        media_type=export_format.media_type,
+        headers={
+            EXPORT_MAX_ID_HEADER: str(max_id),
+            "Content-Disposition": f'attachment; filename="registros_anonimizados.{export_format.extension}"',
+        },
+    )
@@ -1,13 +1,31 @@
-from datetime import datetime
-from typing import List
+from datetime import date
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_user, require_role
-from ..services import classify_orientation, compute_test_score
+from ..services import classify_orientation
+from ..services.item_statistics import ITEM_GROUPS, query_item_statistics
+from ..services.specialist_dashboard import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    DashboardFilters,
+    InvalidCursorError,
+    dashboard_charts,
+    list_dashboard_patients,
+)
+from ..services.test_rollups import risk_totals
+from ..services.test_submissions import (
+    CREATED,
+    DuplicateResultError,
+    IdempotencyKeyReusedError,
+    TestedNotFoundError,
+    submit_batch,
+    submit_single,
+)
 
 router = APIRouter(prefix="/api/v1/tests", tags=["tests"])
 
@@ -28,64 +46,33 @@ TESTE_FAIXAS = {
 def submit_test(
     cpf: str,
     payload: schemas.TestResultCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
     db: Session = Depends(get_db),
     current_user: models.UserAccount = Depends(get_current_user),
 ):
-    testado = db.query(models.TestedIndividual).filter(models.TestedIndividual.documento_cpf == cpf).first()
-    if not testado:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="CPF não cadastrado para triagem")
+    try:
+        outcome = submit_single(db, current_user.id, cpf, payload, idempotency_key)
+    except TestedNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except DuplicateResultError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    except IdempotencyKeyReusedError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
 
-    existing = (
-        db.query(models.TestResult)
-        .join(models.TestedIndividual)
-        .filter(models.TestedIndividual.documento_cpf == cpf, models.TestResult.teste_tipo == payload.teste_tipo)
-        .first()
-    )
-    if existing:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Já existe teste para este CPF e tipo")
-
-    score, classificacao = compute_test_score(payload.teste_tipo, payload.respostas)
-    resultado = models.TestResult(
-        testado_id=testado.id,
-        usuario_id=current_user.id,
-        teste_tipo=payload.teste_tipo,
-        respostas=[item.model_dump() for item in payload.respostas],
-        score=score,
-        classificacao=classificacao,
-        faixa_etaria=payload.faixa_etaria,
-        regiao_geografica=payload.regiao_geografica,
-        criado_em=datetime.utcnow(),
-    )
-    db.add(resultado)
-    db.flush()
-
-    if testado.consentimento_pesquisa:
-        anonimizado = models.AnonymisedRecord(
-            resultado_id=resultado.id,
-            faixa_etaria=payload.faixa_etaria,
-            regiao_geografica=payload.regiao_geografica,
-            score=score,
-            teste_tipo=payload.teste_tipo,
-        )
-        db.add(anonimizado)
+    if outcome.replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return schemas.TestSubmissionResponse(resultado=outcome.resultado, mensagem_orientacao=outcome.mensagem_orientacao)
 
-    db.commit()
-    db.refresh(resultado)
-
-    orientacao = classify_orientation(classificacao, payload.teste_tipo)
-    return schemas.TestSubmissionResponse(
-        resultado=schemas.TestResultResponse(
-            id=resultado.id,
-            teste_tipo=resultado.teste_tipo,
-            faixa_etaria=resultado.faixa_etaria,
-            regiao_geografica=resultado.regiao_geografica,
-            score=resultado.score,
-            classificacao=resultado.classificacao,
-            criado_em=resultado.criado_em,
-            respostas=[schemas.TestResponseItem(**item) for item in resultado.respostas],
-        ),
-        mensagem_orientacao=orientacao,
-    )
+
+@router.post("/lote", response_model=schemas.TestBatchResponse)
+def submit_test_batch(
+    payload: schemas.TestBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.UserAccount = Depends(get_current_user),
+):
+    itens = submit_batch(db, current_user.id, payload.itens)
+    return schemas.TestBatchResponse(criados=sum(item.status == CREATED for item in itens), itens=itens)
 
 
 @router.post("/testados", response_model=schemas.TestedIndividualResponse, status_code=status.HTTP_201_CREATED)
@@ -199,27 +186,71 @@ def get_responsavel_results(
     return schemas.ResponsibleDashboardResponse(pacientes=pacientes)
 
 
+def dashboard_filters(
+    risco: Optional[str] = None,
+    teste_tipo: Optional[str] = None,
+    faixa_etaria: Optional[str] = None,
+    regiao_geografica: Optional[str] = None,
+    regiao_bairro: Optional[str] = None,
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+) -> DashboardFilters:
+    return DashboardFilters(
+        risco=risco,
+        teste_tipo=teste_tipo,
+        faixa_etaria=faixa_etaria,
+        regiao_geografica=regiao_geografica,
+        regiao_bairro=regiao_bairro,
+        inicio=inicio,
+        fim=fim,
+    )
+
+
 @router.get("/especialista/dashboard", response_model=schemas.SpecialistDashboardResponse)
 def get_specialist_dashboard(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    filters: DashboardFilters = Depends(dashboard_filters),
     db: Session = Depends(get_db),
     current_user: models.UserAccount = Depends(require_role("especialista")),
 ):
-    resultados = db.query(models.TestResult).all()
+    try:
+        pacientes, next_cursor = list_dashboard_patients(db, filters, limit=limit, cursor=cursor)
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
 
-    totais_por_risco: dict[str, int] = {}
-    pacientes: List[schemas.SpecialistDashboardItem] = []
-    for resultado in resultados:
-        totais_por_risco[resultado.classificacao] = totais_por_risco.get(resultado.classificacao, 0) + 1
-        pacientes.append(
-            schemas.SpecialistDashboardItem(
-                nome_completo=resultado.testado.nome_completo,
-                faixa_etaria=resultado.faixa_etaria,
-                regiao_bairro=resultado.testado.regiao_bairro,
-                contato_principal=resultado.testado.contato_telefone,
-                risco=resultado.classificacao,
-                teste_tipo=resultado.teste_tipo,
-                data=resultado.criado_em,
-            )
-        )
+    return schemas.SpecialistDashboardResponse(
+        totais_por_risco=risk_totals(db),
+        pacientes=pacientes,
+        next_cursor=next_cursor,
+    )
 
-    return schemas.SpecialistDashboardResponse(totais_por_risco=totais_por_risco, pacientes=pacientes)
+
+@router.get("/especialista/dashboard/graficos", response_model=schemas.SpecialistDashboardChartsResponse)
+def get_specialist_dashboard_charts(
+    filters: DashboardFilters = Depends(dashboard_filters),
+    db: Session = Depends(get_db),
+    current_user: models.UserAccount = Depends(require_role("especialista")),
+):
+    """Gráficos do painel sobre todos os resultados filtrados, independentes da paginação."""
+    return dashboard_charts(db, filters)
+
+
+@router.get("/especialista/itens", response_model=schemas.ItemStatisticsResponse)
+def get_item_statistics(
+    teste_tipo: schemas.TesteTipo,
+    pergunta_id: Optional[List[str]] = Query(None, description="Perguntas (repetir); todas se omitido"),
+    por: List[Literal[ITEM_GROUPS]] = Query([], description="Separar por faixa_etaria e/ou regiao_geografica"),
+    faixa_etaria: Optional[List[str]] = Query(None),
+    regiao_geografica: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.UserAccount = Depends(require_role("especialista")),
+):
+    return query_item_statistics(
+        db,
+        teste_tipo,
+        perguntas=pergunta_id,
+        group_by=por,
+        faixa_etaria=faixa_etaria,
+        regiao_geografica=regiao_geografica,
+    )
@@ -105,6 +105,31 @@ class TestSubmissionResponse(BaseModel):
     mensagem_orientacao: str
 
 
+class TestBatchItem(TestResultCreate):
+    cpf: str
+
+
+class TestBatchRequest(BaseModel):
+    itens: List[TestBatchItem] = Field(..., min_length=1, max_length=1000)
+
+
+class TestBatchItemResult(BaseModel):
+    indice: int
+    cpf: str
+    teste_tipo: str
+    # criado | cpf_nao_cadastrado | duplicado
+    status: str
+    resultado_id: Optional[int] = None
+    score: Optional[int] = None
+    classificacao: Optional[str] = None
+    mensagem_orientacao: Optional[str] = None
+
+
+class TestBatchResponse(BaseModel):
+    criados: int
+    itens: List[TestBatchItemResult]
+
+
 class DashboardMetric(BaseModel):
     label: str
     value: str
@@ -145,6 +170,27 @@ class SpecialistDashboardItem(BaseModel):
 class SpecialistDashboardResponse(BaseModel):
     totais_por_risco: dict
     pacientes: List[SpecialistDashboardItem]
+    # Passar como ?cursor= para a próxima página; None na última
+    next_cursor: Optional[str] = None
+
+
+class DashboardHoodTotal(BaseModel):
+    regiao_bairro: str
+    total: int
+
+
+class DashboardDayTotal(BaseModel):
+    data: str
+    total: int
+    alto: int
+
+
+class SpecialistDashboardChartsResponse(BaseModel):
+    por_risco: dict[str, int]
+    # {"faixa": ..., "<classificação>": total, ...}
+    por_faixa: list[dict]
+    bairros_alto_risco: List[DashboardHoodTotal]
+    por_data: List[DashboardDayTotal]
 
 
 class PatientDashboardCard(BaseModel):
@@ -313,4 +359,90 @@ class IBGEStudentAutismByRaceResponse(IBGEStudentAutismByRaceBase):
 
 class IndigenousAutismSummary(BaseModel):
     total_population: int
-    total_autism_cases: int
\ No newline at end of file
+    total_autism_cases: int
+
+
+class IBGEImportJobResponse(BaseModel):
+    id: str
+    dataset: str
+    status: str
+    stage: Optional[str] = None
+    progress: float
+    inserted: int
+    updated: int
+    skipped: int
+    unchanged: bool
+    anomalies: Optional[int] = None
+    error: Optional[str] = None
+    usuario_id: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class StudentAutismByRaceValueResponse(BaseModel):
+    location: str
+    race: str
+    age_band: str
+    metric: str
+    value: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class IBGELevelSummaryResponse(BaseModel):
+    dataset: str
+    level: str
+    locations: int
+    totals: dict[str, Optional[int]]
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class IBGEAnomaly(BaseModel):
+    check: str
+    location: str
+    column: str
+    expected: Optional[float] = None
+    actual: Optional[float] = None
+
+
+class IBGEAnomalyReportResponse(BaseModel):
+    dataset: str
+    rows: int
+    checked_at: datetime
+    total: int
+    counts: dict[str, int]
+    anomalies: list[IBGEAnomaly]
+    truncated: bool
+
+
+class ResearchCubeResponse(BaseModel):
+    dimensoes: list[str]
+    min_celula: int
+    atualizado_em: Optional[datetime] = None
+    # Uma entrada por combinação das dimensões: valores + total, score_medio, suprimida
+    celulas: list[dict]
+
+
+class ItemStatistic(BaseModel):
+    pergunta_id: str
+    # Presentes quando pedidos no agrupamento
+    faixa_etaria: Optional[str] = None
+    regiao_geografica: Optional[str] = None
+    total: int
+    # resposta -> quantidade
+    respostas: dict[str, int]
+    em_risco: int
+    taxa_risco: float
+
+
+class ItemStatisticsResponse(BaseModel):
+    teste_tipo: str
+    versao_regras: str
+    agrupamento: list[str]
+    itens: list[ItemStatistic]
@@ -0,0 +1,118 @@
+# Formato compacto das respostas gravadas em resultados_testes.
+#
+# Em vez da lista JSON [{"pergunta_id": "1", "resposta": "concordo_totalmente"}, ...],
+# cada resposta vira um byte: a posição dela na tabela de códigos do teste.
+# As tabelas são fixas (e não derivadas das regras de pontuação, que podem
+# ganhar versões novas): o código gravado tem de continuar lendo a mesma
+# resposta para sempre. Só se acrescenta no fim de uma tabela; mudar ou
+# remover uma posição exige um formato novo.
+#
+# Layout de `respostas_codificadas` (o primeiro byte é o formato):
+#   1: perguntas "1".."n" em ordem (o caso do wizard): um byte de código por resposta;
+#   2: perguntas fora dessa ordem: pares (número da pergunta, código).
+# Listas que não cabem no formato (pergunta não numérica ou > 255, resposta
+# fora da tabela) continuam só no JSON, sem perda. Uma linha compactada
+# guarda [] em `respostas`.
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.test_rollups import bulk_update
+
+PACK_BATCH_SIZE = 5000
+
+_SEQUENTIAL = 1
+_PAIRS = 2
+
+ANSWER_CODES = {
+    "mchat": ("", "nao", "sim"),
+    "assq": ("", "nao", "sim", "um_pouco"),
+    "aq10": (
+        "", "nao", "sim",
+        "concordo_totalmente", "concordo_um_pouco", "discordo_totalmente", "discordo_um_pouco",
+    ),
+    "ados2": ("", "nao", "sim"),
+    "adir": ("", "nao", "sim"),
+}
+_CODE_OF = {teste_tipo: {resposta: code for code, resposta in enumerate(table)} for teste_tipo, table in ANSWER_CODES.items()}
+
+
+def _question_number(pergunta_id) -> int | None:
+    if not isinstance(pergunta_id, str) or not pergunta_id.isdigit() or str(int(pergunta_id)) != pergunta_id:
+        return None
+    number = int(pergunta_id)
+    return number if 1 <= number <= 255 else None
+
+
+def pack_answers(teste_tipo: str, respostas: list[dict]) -> bytes | None:
+    """Respostas no formato compacto, ou None quando alguma não cabe na tabela."""
+    codes_of = _CODE_OF.get(teste_tipo)
+    if codes_of is None or not isinstance(respostas, list):
+        return None
+    numbers, codes = [], []
+    for item in respostas:
+        number = _question_number(item.get("pergunta_id"))
+        code = codes_of.get(item.get("resposta"))
+        if number is None or code is None:
+            return None
+        numbers.append(number)
+        codes.append(code)
+    if numbers == list(range(1, len(numbers) + 1)):
+        return bytes([_SEQUENTIAL, *codes])
+    return bytes([_PAIRS, *(value for pair in zip(numbers, codes) for value in pair)])
+
+
+def unpack_answers(teste_tipo: str, packed: bytes) -> list[dict]:
+    table = ANSWER_CODES[teste_tipo]
+    layout, body = packed[0], packed[1:]
+    if layout == _SEQUENTIAL:
+        return [{"pergunta_id": str(number), "resposta": table[code]} for number, code in enumerate(body, start=1)]
+    if layout == _PAIRS:
+        return [{"pergunta_id": str(number), "resposta": table[code]} for number, code in zip(body[::2], body[1::2])]
+    raise ValueError(f"Formato de respostas desconhecido: {layout}")
+
+
+def stored_answers(teste_tipo: str, respostas, respostas_codificadas: bytes | None) -> list[dict]:
+    """Lista de respostas de um resultado gravado, venha do formato compacto ou do JSON."""
+    if respostas_codificadas is not None:
+        return unpack_answers(teste_tipo, respostas_codificadas)
+    return respostas
+
+
+def storage_values(teste_tipo: str, respostas: list[dict]) -> dict:
+    """Valores de `respostas` e `respostas_codificadas` para gravar uma lista de respostas."""
+    packed = pack_answers(teste_tipo, respostas)
+    if packed is None:
+        return {"respostas": respostas, "respostas_codificadas": None}
+    return {"respostas": [], "respostas_codificadas": packed}
+
+
+def pack_stored_answers(db: Session, batch_size: int = PACK_BATCH_SIZE) -> tuple[int, int]:
+    """
+    Converte para o formato compacto os resultados ainda em JSON, em lotes
+    por id, com um commit por lote. Devolve (compactados, mantidos em JSON).
+    """
+    result = models.TestResult
+    packed_total = kept = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(result.id, result.teste_tipo, result.respostas)
+            .where(result.id > last_id, result.respostas_codificadas.is_(None))
+            .order_by(result.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            packed = pack_answers(row.teste_tipo, row.respostas)
+            if packed is None:
+                kept += 1
+            else:
+                updates.append({"id": row.id, "respostas": [], "respostas_codificadas": packed})
+        bulk_update(db, result.__table__, "id", updates)
+        db.commit()
+        packed_total += len(updates)
+        last_id = rows[-1].id
+    return packed_total, kept
@@ -1,4 +1,6 @@
+import math
 from collections import Counter
+from dataclasses import dataclass, field
 from typing import List
 
 from app.schemas import TestResponseItem, TesteTipo
@@ -68,37 +70,106 @@ TEST_MAX_QUESTIONS = {
 }
 
 
-def compute_test_score(teste_tipo: TesteTipo, respostas: List[TestResponseItem]) -> tuple[int, str]:
-    if teste_tipo == "mchat":
-        risco = 0
-        for item in respostas:
-            expected = MCHAT_RISK_RULES.get(item.pergunta_id)
-            if expected and item.resposta.lower() == expected:
-                risco += 1
-        if risco <= 2:
-            classificacao = "Baixo"
-        elif risco <= 7:
-            classificacao = "Moderado"
-        else:
-            classificacao = "Alto"
-        return risco, classificacao
-    if teste_tipo == "assq":
-        score = sum(ASSQ_RISK_VALUES.get(item.resposta.lower(), 0) for item in respostas)
-        if score <= 12:
-            classificacao = "Baixo"
-        elif score <= 19:
-            classificacao = "Moderado"
-        else:
-            classificacao = "Alto"
-        return score, classificacao
-    if teste_tipo == "aq10":
-        score = sum(1 for item in respostas if item.resposta.lower() in AQ10_RISK_ITEMS.get(item.pergunta_id, set()))
-        classificacao = "Alto" if score >= 6 else "Baixo"
-        return score, classificacao
-    # For ADOS-2 and ADI-R placeholder with simple yes/no scoring
-    score = sum(1 for item in respostas if item.resposta.lower() == "sim")
-    classificacao = "Encaminhar" if score >= len(respostas) // 2 else "Observação"
-    return score, classificacao
+# Faixas de score usadas nas agregações de pesquisa: limites superiores
+# (inclusivos) alinhados aos cortes de classificação de cada teste
+SCORE_BANDS = {
+    "mchat": (2, 7),
+    "assq": (12, 19),
+    "aq10": (5,),
+}
+DEFAULT_SCORE_BANDS = (4,)
+
+
+def score_band(teste_tipo: str, score: int) -> str:
+    """Rótulo da faixa do score ("0-2", "3-7", "8+")."""
+    lower = 0
+    for upper in SCORE_BANDS.get(teste_tipo, DEFAULT_SCORE_BANDS):
+        if score <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+# ===== Regras de pontuação versionadas =====
+# Cada versão descreve, por teste, os pontos de cada resposta em cada pergunta e
+# os cortes de classificação. O submit pontua com CURRENT_RULES_VERSION; para
+# revisar um corte, crie uma versão nova (sem alterar as antigas) e reclassifique
+# os resultados gravados com `python -m app.triagens rescore`.
+
+@dataclass(frozen=True)
+class TestRules:
+    # pergunta_id -> resposta (minúscula) -> pontos
+    points: dict[str, dict[str, int]] = field(default_factory=dict)
+    # pontos das respostas em perguntas que não estão em `points`
+    default_points: dict[str, int] = field(default_factory=dict)
+    # (score mínimo, classificação) em ordem crescente; vale o último atingido
+    cutoffs: tuple[tuple[float, str], ...] = ()
+    # Cortes como fração do número de respostas (arredondada para baixo)
+    relative_cutoffs: bool = False
+
+    def item_points(self, pergunta_id: str, resposta: str) -> int:
+        return self.points.get(pergunta_id, self.default_points).get(resposta.lower(), 0)
+
+    def minimums(self, n_respostas: int) -> list[int]:
+        if self.relative_cutoffs:
+            return [math.floor(minimum * n_respostas) for minimum, _ in self.cutoffs]
+        return [int(minimum) for minimum, _ in self.cutoffs]
+
+    def classify(self, score: int, n_respostas: int) -> str:
+        classificacao = self.cutoffs[0][1]
+        for minimum, (_, label) in zip(self.minimums(n_respostas), self.cutoffs):
+            if score >= minimum:
+                classificacao = label
+        return classificacao
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    version: str
+    tests: dict[str, TestRules]
+    # Testes sem regra própria (ADOS-2 e ADI-R provisórios)
+    fallback: TestRules
+
+    def for_test(self, teste_tipo: str) -> TestRules:
+        return self.tests.get(teste_tipo, self.fallback)
+
+
+RULE_SETS = {
+    "2024.1": RuleSet(
+        version="2024.1",
+        tests={
+            "mchat": TestRules(
+                points={pergunta: {resposta: 1} for pergunta, resposta in MCHAT_RISK_RULES.items()},
+                cutoffs=((0, "Baixo"), (3, "Moderado"), (8, "Alto")),
+            ),
+            "assq": TestRules(
+                default_points=ASSQ_RISK_VALUES,
+                cutoffs=((0, "Baixo"), (13, "Moderado"), (20, "Alto")),
+            ),
+            "aq10": TestRules(
+                points={pergunta: dict.fromkeys(respostas, 1) for pergunta, respostas in AQ10_RISK_ITEMS.items()},
+                cutoffs=((0, "Baixo"), (6, "Alto")),
+            ),
+        },
+        # ADOS-2 e ADI-R: conta os "sim"; encaminha com pelo menos metade
+        fallback=TestRules(
+            default_points={"sim": 1},
+            cutoffs=((0, "Observação"), (0.5, "Encaminhar")),
+            relative_cutoffs=True,
+        ),
+    ),
+}
+CURRENT_RULES_VERSION = "2024.1"
+
+
+def compute_test_score(
+    teste_tipo: TesteTipo,
+    respostas: List[TestResponseItem],
+    rules_version: str = CURRENT_RULES_VERSION,
+) -> tuple[int, str]:
+    rules = RULE_SETS[rules_version].for_test(teste_tipo)
+    score = sum(rules.item_points(item.pergunta_id, item.resposta) for item in respostas)
+    return score, rules.classify(score, len(respostas))
 
 
 def classify_orientation(classificacao: str, teste_tipo: TesteTipo) -> str:
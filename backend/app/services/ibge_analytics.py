@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from app.models import IndigenousAutismStatistic 
 from app.schemas import IndigenousAutismStatisticResponse, IndigenousAutismSummary
+from app.services.ibge_importer import AUTISM_INDIGENOUS_SHEET
+from app.services.ibge_loader import level_summary
 
 def get_indigenous_autism_by_location(db: Session) -> list[IndigenousAutismStatisticResponse]:
     """
@@ -12,21 +13,19 @@ def get_indigenous_autism_by_location(db: Session) -> list[IndigenousAutismStati
 
 def get_indigenous_autism_summary(db: Session) -> IndigenousAutismSummary:
     """
-    Calcula a população indígena total e os casos de autismo total
-    para a dashboard.
+    População indígena total e casos de autismo total para a dashboard.
+
+    Vem do resumo do nível "country" calculado na importação (linha Brasil):
+    somar todas as linhas contaria o país, as regiões e as UFs juntos.
     """
-    # Consulta SQLAlchemy para SOMAR (SUM) os dados de todas as linhas
-    result = db.query(
-        func.sum(IndigenousAutismStatistic.indigenous_population).label('total_population'),
-        func.sum(IndigenousAutismStatistic.autism_count).label('total_autism_cases')
-    ).first()
-    
+    summary = level_summary(db, AUTISM_INDIGENOUS_SHEET.name, "country")
+
     # Verifica se retornou algo válido
-    if result and result.total_population is not None:
+    if summary and summary.totals.get("indigenous_population") is not None:
         return IndigenousAutismSummary(
-            total_population=result.total_population,
-            total_autism_cases=result.total_autism_cases
+            total_population=summary.totals["indigenous_population"],
+            total_autism_cases=summary.totals.get("autism_count") or 0,
         )
     
     # Retorno padrão se o banco estiver vazio
-    return IndigenousAutismSummary(total_population=0, total_autism_cases=0)
\ No newline at end of file
+    return IndigenousAutismSummary(total_population=0, total_autism_cases=0)
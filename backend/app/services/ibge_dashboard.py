@@ -0,0 +1,124 @@
+# Payload único da página de dados (DadosDashboard.jsx).
+#
+# Em vez de uma requisição por gráfico, GET /api/v1/ibge/dashboard devolve
+# tudo de uma vez. As consultas rodam em paralelo (uma thread e uma sessão
+# por seção) e o JSON montado fica guardado já comprimido em gzip, valendo
+# enquanto as versões dos datasets envolvidos não mudarem.
+import gzip
+import hashlib
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+import app.database as database
+from app.compression import accepted_encodings
+from app.config import get_settings
+from app.models import IBGEStudentAutism, IndigenousAutismStatistic
+from app.responses import AppJSONResponse, response_shape
+from app.services.ibge_importer import AUTISM_INDIGENOUS_SHEET
+from app.services.ibge_query import ListParams, list_locations
+from app.services.ibge_resident_autism_sex import get_resident_gender_autism_distribution
+from app.services.ibge_response_cache import dataset_versions, etag_matches
+from app.services.ibge_sheets import RESIDENTS_AUTISM_BY_SEX_SHEET
+from app.services.ibge_students_autism_by_race import STUDENTS_AUTISM_BY_RACE_SHEET
+
+settings = get_settings()
+
+DASHBOARD_DATASETS = [
+    AUTISM_INDIGENOUS_SHEET.name,
+    RESIDENTS_AUTISM_BY_SEX_SHEET.name,
+    STUDENTS_AUTISM_BY_RACE_SHEET.name,
+]
+
+INDIGENOUS_FIELDS = "location,indigenous_population,autism_count,autism_percentage"
+ETHNICITY_FIELDS = "aut_branca_total,aut_preta_total,aut_amarela_total,aut_parda_total"
+
+
+def _indigenous(db: Session, level: str) -> list[dict]:
+    rows, _ = list_locations(db, IndigenousAutismStatistic.__table__, ListParams(fields=INDIGENOUS_FIELDS, level=level))
+    return rows
+
+
+def _first(rows: list[dict]) -> dict | None:
+    return rows[0] if rows else None
+
+
+# Seção do payload → consulta (cada uma roda com a própria sessão)
+DASHBOARD_SECTIONS: dict[str, Callable[[Session], object]] = {
+    "brasil": lambda db: _first(_indigenous(db, "country")),
+    "states": lambda db: _indigenous(db, "state"),
+    "gender": get_resident_gender_autism_distribution,
+    "ethnicity": lambda db: _first(
+        list_locations(
+            db, IBGEStudentAutism.__table__, ListParams(fields=ETHNICITY_FIELDS, locations=["Brasil"])
+        )[0]
+    ),
+}
+
+
+@dataclass(frozen=True)
+class DashboardBundle:
+    versions: tuple
+    gzipped: bytes
+    etag: str
+
+
+# Um bundle por formato de resposta (X-Response-Shape), como no cached_json
+_bundles: dict[str | None, DashboardBundle] = {}
+_bundle_lock = threading.Lock()
+
+
+def _run_section(query: Callable[[Session], object]) -> object:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        return query(db)
+
+
+def build_dashboard() -> dict:
+    with ThreadPoolExecutor(max_workers=len(DASHBOARD_SECTIONS)) as pool:
+        futures = {name: pool.submit(_run_section, query) for name, query in DASHBOARD_SECTIONS.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def get_dashboard_bundle(versions: tuple) -> DashboardBundle:
+    """Bundle em cache para `versions`; remonta (uma thread por vez) se algum dataset mudou."""
+    shape = response_shape.get()
+    bundle = _bundles.get(shape)
+    if bundle is not None and bundle.versions == versions:
+        return bundle
+    with _bundle_lock:
+        bundle = _bundles.get(shape)
+        if bundle is None or bundle.versions != versions:
+            payload = {"versions": dict(zip(DASHBOARD_DATASETS, versions)), **build_dashboard()}
+            # Mesma serialização (orjson) das outras leituras do IBGE
+            body = AppJSONResponse(jsonable_encoder(payload)).body
+            bundle = DashboardBundle(
+                versions=versions,
+                gzipped=gzip.compress(body, compresslevel=9),
+                etag=hashlib.sha256(body).hexdigest()[:32],
+            )
+            _bundles[shape] = bundle
+        return bundle
+
+
+def dashboard_response(request: Request, db: Session) -> Response:
+    """Serve o blob gzip direto; só descomprime para clientes sem gzip."""
+    bundle = get_dashboard_bundle(dataset_versions(db, DASHBOARD_DATASETS))
+    use_gzip = "gzip" in accepted_encodings(request.headers.get("accept-encoding", ""))
+    # Cada codificação é uma representação diferente: ETag próprio
+    etag = f'"{bundle.etag}-gzip"' if use_gzip else f'"{bundle.etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.ibge_http_max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        return Response(bundle.gzipped, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(bundle.gzipped), media_type="application/json", headers=headers)
@@ -0,0 +1,257 @@
+# Indicadores derivados das planilhas do IBGE, calculados em memória.
+#
+# Cada dataset usado por algum indicador é lido uma vez por versão e vira um
+# conjunto de arrays NumPy (uma coluna por array, uma posição por
+# localidade). Um indicador é só uma expressão sobre essas colunas
+# (razão, taxa por 100 mil, razão entre prevalências), então avaliar todos
+# para todas as localidades é aritmética vetorial, sem SQL nem laço por linha.
+#
+# A versão dos datasets no banco é conferida no máximo a cada
+# `ibge_indicator_refresh_seconds`; entre uma conferência e outra as
+# requisições não tocam no banco.
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import RACE_KEYS, SCHOOL_AGE_BANDS
+from app.services.ibge_importer import AUTISM_INDIGENOUS_SHEET
+from app.services.ibge_response_cache import dataset_versions
+from app.services.ibge_sheets import (
+    IBGE_SHEETS,
+    RESIDENTS_AUTISM_BY_RACE_SHEET,
+    RESIDENTS_AUTISM_BY_SEX_SHEET,
+)
+from app.services.ibge_students_autism_by_race import STUDENTS_AUTISM_BY_RACE_SHEET
+
+settings = get_settings()
+
+
+class UnknownIndicatorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class DatasetArrays:
+    """Colunas de um dataset como arrays float (NaN = vazio), na ordem das localidades."""
+
+    version: int | None
+    locations: pd.Index
+    levels: np.ndarray
+    columns: dict[str, np.ndarray]
+    # Resultado de cada indicador nesta versão (calculado na primeira vez que é pedido)
+    computed: dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def indicator(self, indicator: "Indicator") -> np.ndarray:
+        values = self.computed.get(indicator.name)
+        if values is None:
+            values = self.computed[indicator.name] = indicator.compute(self).round(4)
+        return values
+
+
+@dataclass(frozen=True)
+class Indicator:
+    name: str
+    dataset: str
+    description: str
+    compute: Callable[[DatasetArrays], np.ndarray]
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # Divisão por zero ou por vazio vira NaN (sai como null)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def rate(part: str, whole: str, scale: float = 1.0) -> Callable[[DatasetArrays], np.ndarray]:
+    return lambda arrays: _divide(arrays[part], arrays[whole]) * scale
+
+
+def relative_rate(part: str, whole: str, ref_part: str, ref_whole: str) -> Callable[[DatasetArrays], np.ndarray]:
+    """Prevalência de part/whole dividida pela de ref_part/ref_whole."""
+    return lambda arrays: _divide(_divide(arrays[part], arrays[whole]), _divide(arrays[ref_part], arrays[ref_whole]))
+
+
+INDICATORS: dict[str, Indicator] = {
+    indicator.name: indicator
+    for indicator in (
+        *(
+            Indicator(
+                name=f"autism_prevalence_ratio_{race}_vs_branca",
+                dataset=RESIDENTS_AUTISM_BY_RACE_SHEET.name,
+                description=f"Prevalência de autismo na população {race} dividida pela da população branca",
+                compute=relative_rate(f"aut_{race}", race, "aut_branca", "branca"),
+            )
+            for race in RACE_KEYS
+            if race not in ("total", "branca")
+        ),
+        *(
+            Indicator(
+                name=f"student_autism_share_{band}",
+                dataset=STUDENTS_AUTISM_BY_RACE_SHEET.name,
+                description=f"% dos estudantes com autismo na faixa {band}",
+                compute=rate(f"aut_total_{band}", "aut_total_total", 100),
+            )
+            for band in SCHOOL_AGE_BANDS
+            if band != "total"
+        ),
+        Indicator(
+            name="autism_per_100k",
+            dataset=RESIDENTS_AUTISM_BY_SEX_SHEET.name,
+            description="Residentes com autismo por 100 mil residentes",
+            compute=rate("total_residentes_autismo", "total_residentes", 100_000),
+        ),
+        Indicator(
+            name="indigenous_autism_per_100k",
+            dataset=AUTISM_INDIGENOUS_SHEET.name,
+            description="Indígenas com autismo por 100 mil indígenas",
+            compute=rate("autism_count", "indigenous_population", 100_000),
+        ),
+        Indicator(
+            name="autism_male_female_ratio",
+            dataset=RESIDENTS_AUTISM_BY_SEX_SHEET.name,
+            description="Homens com autismo por mulher com autismo",
+            compute=rate("total_residentes_homens_autismo", "total_residentes_mulheres_autismo"),
+        ),
+        Indicator(
+            name="autism_male_female_prevalence_ratio",
+            dataset=RESIDENTS_AUTISM_BY_SEX_SHEET.name,
+            description="Prevalência de autismo entre homens dividida pela prevalência entre mulheres",
+            compute=relative_rate(
+                "total_residentes_homens_autismo", "total_residentes_homens",
+                "total_residentes_mulheres_autismo", "total_residentes_mulheres",
+            ),
+        ),
+    )
+}
+
+INDICATOR_DATASETS = list(dict.fromkeys(indicator.dataset for indicator in INDICATORS.values()))
+
+
+def load_dataset_arrays(db: Session, name: str, version: int | None) -> DatasetArrays:
+    spec = IBGE_SHEETS[name]
+    table = spec.table
+    values = list(spec.column_map.values())
+    df = pd.read_sql(
+        select(table.c.location, table.c.level, *(table.c[col] for col in values)).order_by(table.c.id),
+        db.connection(),
+    )
+    return DatasetArrays(
+        version=version,
+        locations=pd.Index(df["location"]),
+        levels=df["level"].to_numpy(dtype=object),
+        # Uma cópia contígua por coluna
+        columns={col: df[col].to_numpy(dtype=float, na_value=np.nan) for col in values},
+    )
+
+
+class IndicatorEngine:
+    """Guarda os arrays por dataset e só relê um dataset quando a versão dele muda."""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._arrays: dict[str, DatasetArrays] = {}
+        self._versions: tuple | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def versions(self, db: Session) -> tuple:
+        now = time.monotonic()
+        if self._versions is None or now - self._checked_at >= self.refresh_seconds:
+            self._versions = dataset_versions(db, INDICATOR_DATASETS)
+            self._checked_at = now
+        return self._versions
+
+    def arrays(self, db: Session, name: str) -> DatasetArrays:
+        version = dict(zip(INDICATOR_DATASETS, self.versions(db)))[name]
+        arrays = self._arrays.get(name)
+        if arrays is not None and arrays.version == version:
+            return arrays
+        with self._lock:
+            arrays = self._arrays.get(name)
+            if arrays is None or arrays.version != version:
+                arrays = self._arrays[name] = load_dataset_arrays(db, name, version)
+            return arrays
+
+    def clear(self) -> None:
+        with self._lock:
+            self._arrays.clear()
+            self._versions = None
+
+
+indicator_engine = IndicatorEngine(settings.ibge_indicator_refresh_seconds)
+
+
+def list_indicators() -> list[dict]:
+    return [
+        {"name": indicator.name, "dataset": indicator.dataset, "description": indicator.description}
+        for indicator in INDICATORS.values()
+    ]
+
+
+def indicators_etag(db: Session, names: list[str], level: str | None, locations: list[str] | None) -> str:
+    """Muda só quando a versão de algum dataset (ou os parâmetros) muda; dispensa calcular para o 304."""
+    key = [indicator_engine.versions(db), names, level, sorted(locations or [])]
+    return f'"{hashlib.sha256(json.dumps(key).encode()).hexdigest()[:32]}"'
+
+
+def evaluate_indicators(
+    db: Session, names: list[str], level: str | None = None, locations: list[str] | None = None
+) -> dict:
+    """
+    Avalia os indicadores `names` para todas as localidades de uma vez.
+
+    Devolve colunas alinhadas: `location`, `level` e um array por indicador
+    (null onde o denominador é zero ou vazio).
+    """
+    unknown = [name for name in names if name not in INDICATORS]
+    if unknown:
+        raise UnknownIndicatorError(f"Indicadores inexistentes: {', '.join(unknown)}")
+    indicators = [INDICATORS[name] for name in dict.fromkeys(names)]
+    arrays = {name: indicator_engine.arrays(db, name) for name in dict.fromkeys(i.dataset for i in indicators)}
+
+    # Localidades do primeiro dataset + as que só existem nos outros
+    base = next(iter(arrays.values()))
+    index, levels = base.locations, base.levels
+    for other in list(arrays.values())[1:]:
+        extra = ~other.locations.isin(index)
+        if extra.any():
+            index = index.append(other.locations[extra])
+            levels = np.concatenate([levels, other.levels[extra]])
+
+    mask = np.ones(len(index), dtype=bool)
+    if level is not None:
+        mask &= levels == level
+    if locations:
+        mask &= index.isin(locations)
+
+    selected = index[mask]
+    # Posição de cada localidade selecionada em cada dataset (-1 = não existe lá)
+    rows = np.flatnonzero(mask)
+    positions = {
+        name: np.where(rows < len(base.locations), rows, -1) if source is base else source.locations.get_indexer(selected)
+        for name, source in arrays.items()
+    }
+    values = {}
+    for indicator in indicators:
+        computed = arrays[indicator.dataset].indicator(indicator)
+        found = positions[indicator.dataset]
+        aligned = np.where(found >= 0, computed[found], np.nan) if len(found) else computed[:0]
+        values[indicator.name] = np.where(np.isnan(aligned), None, aligned).tolist()
+
+    return {
+        "location": selected.tolist(),
+        "level": levels[mask].tolist(),
+        "indicators": values,
+    }
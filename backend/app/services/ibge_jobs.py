@@ -0,0 +1,166 @@
+# Importações do IBGE em segundo plano.
+#
+# A rota só registra o job e devolve o id; leitura da planilha e carga rodam
+# em um pool de processos separado, fora do threadpool da API. O andamento
+# fica em ibge_data.import_jobs, gravado em transações curtas pelo próprio
+# processo que executa o job.
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+import app.database as database
+from app.config import get_settings
+from app.models import IBGEImportJob
+from app.services.ibge_loader import (
+    ImportResult,
+    is_dataset_current,
+    load_sheet,
+    load_sheet_chunks,
+    read_sheet,
+    unchanged_result,
+)
+from app.services.ibge_sheet_cache import sheet_fingerprint
+from app.services.ibge_sheets import IBGE_SHEETS
+from app.services.ibge_stream import iter_sheet_chunks
+
+logger = logging.getLogger("uvicorn.error")
+settings = get_settings()
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker() -> None:
+    # Cada processo do pool tem sua própria engine/conexões
+    database.init_engine()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.ibge_import_workers,
+                # spawn: não herda threads nem conexões abertas do servidor
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def shutdown_import_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _update_job(job_id: str, **fields) -> None:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        job = db.get(IBGEImportJob, job_id)
+        if job is None:
+            return
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.commit()
+
+
+def run_import_job(
+    job_id: str, dataset: str, path: str, force: bool = False, streaming: bool = False, remove_source: bool = False
+) -> None:
+    """
+    Executa a importação de uma planilha, registrando o andamento no job.
+
+    Com `streaming` a planilha é lida em blocos pelo openpyxl (uploads) em vez
+    de passar pelo pandas/cache; `remove_source` apaga o arquivo no fim.
+    """
+    spec = IBGE_SHEETS[dataset]
+    _update_job(job_id, status="running", stage="fingerprint", progress=0.0, started_at=datetime.utcnow())
+    try:
+        fingerprint = sheet_fingerprint(spec, path)
+        with database.SessionLocal() as db:
+            if not force and is_dataset_current(db, spec, fingerprint):
+                result = unchanged_result(db, spec)
+            elif streaming:
+                _update_job(job_id, stage="loading", progress=0.1)
+                result = load_sheet_chunks(
+                    db, spec, iter_sheet_chunks(spec, path), fingerprint, lambda partial: _report_rows(job_id, partial)
+                )
+                db.commit()
+            else:
+                _update_job(job_id, stage="parsing", progress=0.1)
+                df = read_sheet(spec, path, fingerprint)
+                _update_job(job_id, stage="loading", progress=0.5)
+                result = load_sheet(db, spec, df, fingerprint)
+                db.commit()
+    except Exception as exc:
+        logger.exception("❌ Job de importação %s falhou", job_id)
+        _update_job(job_id, status="failed", error=repr(exc), finished_at=datetime.utcnow())
+        return
+    finally:
+        if remove_source and os.path.exists(path):
+            os.remove(path)
+
+    _update_job(
+        job_id,
+        status="succeeded",
+        stage="done",
+        progress=1.0,
+        inserted=result.inserted,
+        updated=result.updated,
+        skipped=result.skipped,
+        unchanged=result.unchanged,
+        anomalies=result.anomalies,
+        finished_at=datetime.utcnow(),
+    )
+
+
+def _report_rows(job_id: str, partial: ImportResult) -> None:
+    # Sem total de linhas conhecido de antemão: o progresso é a contagem parcial
+    _update_job(job_id, inserted=partial.inserted, updated=partial.updated, skipped=partial.skipped)
+
+
+def _on_job_done(job_id: str, future: Future) -> None:
+    # Só dispara se o processo do job morreu antes de registrar o próprio erro
+    if future.cancelled():
+        _update_job(job_id, status="failed", error="cancelled", finished_at=datetime.utcnow())
+        return
+    exc = future.exception()
+    if exc is not None:
+        _update_job(job_id, status="failed", error=repr(exc), finished_at=datetime.utcnow())
+
+
+def submit_import(
+    db: Session,
+    dataset: str,
+    path: str,
+    force: bool = False,
+    streaming: bool = False,
+    remove_source: bool = False,
+    usuario_id: int | None = None,
+) -> IBGEImportJob:
+    """Registra o job e agenda a execução no pool; retorna sem esperar."""
+    job = IBGEImportJob(id=str(uuid.uuid4()), dataset=dataset, status="queued", progress=0.0, usuario_id=usuario_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info(
+        "📥 Job de importação %s (%s%s) pedido pelo usuário %s",
+        job.id, dataset, ", upload" if remove_source else "", usuario_id if usuario_id is not None else "CLI",
+    )
+
+    future = _get_executor().submit(run_import_job, job.id, dataset, path, force, streaming, remove_source)
+    future.add_done_callback(lambda done, job_id=job.id: _on_job_done(job_id, done))
+    return job
+
+
+def get_job(db: Session, job_id: str) -> IBGEImportJob | None:
+    return db.get(IBGEImportJob, job_id)
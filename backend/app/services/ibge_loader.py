@@ -0,0 +1,521 @@
+# Motor compartilhado de carga em lote das planilhas do IBGE.
+#
+# Recebe um DataFrame já saneado e grava tudo de uma vez na tabela de destino:
+#   - PostgreSQL: COPY para uma tabela temporária + INSERT ... ON CONFLICT
+#   - SQLite: um único executemany com INSERT ... ON CONFLICT
+# Linhas idênticas às já gravadas não são reescritas, então reimportar o
+# mesmo arquivo não cria duplicatas nem altera nada.
+#
+# No PostgreSQL a carga não escreve direto na tabela que a API lê: os dados
+# vão para uma cópia (<tabela>__staging), são validados e a cópia é trocada
+# pela tabela real com RENAME no fim da transação. Leitores continuam na
+# versão anterior durante toda a carga e o lock exclusivo dura só a troca.
+import hashlib
+import io
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Float, Integer, MetaData, Table, func, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models import IBGEDataset, IBGELevelSummary
+from app.services.ibge_sheet_cache import read_cached_sheet, sheet_fingerprint, write_cached_sheet
+from app.services.ibge_validation import validate_loaded_sheet
+
+
+# Nível de cada localidade, pela indentação na planilha (2 espaços por nível)
+LOCATION_LEVELS = ("country", "region", "state", "municipality")
+
+
+class LocationHierarchy:
+    """
+    Pai de cada localidade: a última localidade vista em um nível acima, na
+    ordem da planilha. Guarda estado entre blocos (leitura em streaming).
+    """
+
+    def __init__(self):
+        self._last: dict[int, str] = {}
+
+    def parents(self, levels, locations) -> list[str | None]:
+        parents = []
+        for level, location in zip(levels, locations):
+            depth = LOCATION_LEVELS.index(level)
+            above = [d for d in self._last if d < depth]
+            parents.append(self._last[max(above)] if above else None)
+            self._last = {d: name for d, name in self._last.items() if d < depth}
+            self._last[depth] = location
+        return parents
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    # Planilha idêntica à última carga: nada foi lido nem gravado
+    unchanged: bool = False
+    # Inconsistências achadas pelas checagens (relatório em IBGEDataset.anomaly_report)
+    anomalies: int = 0
+    # Linhas inseridas/atualizadas nas tabelas derivadas (fora das contagens acima)
+    derived_changed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.skipped
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def add(self, other: "ImportResult") -> None:
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        self.derived_changed += other.derived_changed
+
+
+@dataclass(frozen=True)
+class DerivedTable:
+    """Tabela montada a partir das mesmas linhas da planilha (ex.: formato longo)."""
+
+    model: type
+    # Recebe o bloco já saneado da planilha e devolve as linhas da tabela derivada
+    build: Callable[[pd.DataFrame], pd.DataFrame]
+    key: tuple[str, ...]
+
+    @property
+    def table(self) -> Table:
+        return self.model.__table__
+
+
+@dataclass(frozen=True)
+class IBGESheetSpec:
+    """
+    Descrição declarativa de uma planilha do IBGE.
+
+    `header` é a linha (0-based) usada como cabeçalho pelo pandas e
+    `column_map` leva o nome da coluna na planilha (ou sua posição) ao nome
+    da coluna no modelo. A primeira coluna é sempre a localidade.
+    """
+
+    name: str
+    file_name: str
+    header: int
+    model: type
+    column_map: dict = field(default_factory=dict)
+    # Linhas sem valor nestas colunas são descartadas
+    required: tuple[str, ...] = ()
+    # Gravadas na mesma transação, bloco a bloco
+    derived: tuple[DerivedTable, ...] = ()
+    # (percentual, parte, todo) fora da convenção pct_X/aut_X (ver ibge_validation)
+    ratios: tuple[tuple[str, str, str], ...] = ()
+
+    @property
+    def table(self) -> Table:
+        return self.model.__table__
+
+
+def sheet_column_map(labels, columns) -> dict[str, str]:
+    """
+    Monta um COLUMN_MAP para planilhas em que `labels` se repete em blocos.
+
+    O pandas desduplica cabeçalhos repetidos como "Total", "Total.1", ...;
+    `columns` traz os nomes do modelo na ordem em que aparecem na planilha.
+    """
+    seen: dict[str, int] = {}
+    column_map = {}
+    for index, column in enumerate(columns):
+        label = labels[index % len(labels)]
+        count = seen.get(label, 0)
+        seen[label] = count + 1
+        column_map[label if count == 0 else f"{label}.{count}"] = column
+    return column_map
+
+
+def parse_sheet(spec: IBGESheetSpec, source) -> pd.DataFrame:
+    """Lê a planilha e devolve só as colunas do modelo, já saneadas."""
+    return sanitize_sheet(spec, pd.read_excel(source, header=spec.header))
+
+
+def sanitize_sheet(
+    spec: IBGESheetSpec, df: pd.DataFrame, hierarchy: LocationHierarchy | None = None
+) -> pd.DataFrame:
+    """
+    Aplica o mapa de colunas da spec a linhas cruas (cabeçalho no padrão do pandas).
+
+    Em leitura por blocos, passe o mesmo `hierarchy` para todos os blocos.
+    """
+    column_map = {
+        df.columns[key] if isinstance(key, int) else key: value
+        for key, value in spec.column_map.items()
+    }
+    df = df.rename(columns={df.columns[0]: "location", **column_map})
+    values = list(column_map.values())
+    df = df[["location", *values]]
+
+    # Rodapé ("Fonte: IBGE...") e linhas em branco ficam de fora
+    df = df.dropna(subset=["location"])
+    df = df[~df["location"].astype(str).str.contains("Fonte", na=False)]
+    # A planilha indenta regiões e UFs com espaços: o nível vem da indentação
+    # e a chave fica sem eles
+    raw = df["location"].astype(str)
+    if "level" in spec.table.c:
+        indent = raw.str.len() - raw.str.lstrip(" ").str.len()
+        df["level"] = (indent // 2).clip(upper=len(LOCATION_LEVELS) - 1).map(dict(enumerate(LOCATION_LEVELS)))
+    df["location"] = raw.str.strip()
+    if "parent" in spec.table.c:
+        hierarchy = hierarchy or LocationHierarchy()
+        df["parent"] = hierarchy.parents(df["level"], df["location"])
+
+    # "-", "X" e afins viram nulo, coluna a coluna
+    df[values] = df[values].apply(pd.to_numeric, errors="coerce")
+    if spec.required:
+        df = df.dropna(subset=list(spec.required))
+    return df.reset_index(drop=True)
+
+
+def read_sheet(spec: IBGESheetSpec, path: str, fingerprint: str) -> pd.DataFrame:
+    """parse_sheet com cache em disco (ver ibge_sheet_cache)."""
+    df = read_cached_sheet(spec, fingerprint)
+    if df is None:
+        df = parse_sheet(spec, path)
+        write_cached_sheet(spec, fingerprint, df)
+    return df
+
+
+def current_dataset(db: Session, spec: IBGESheetSpec) -> IBGEDataset | None:
+    return db.get(IBGEDataset, spec.name)
+
+
+def is_dataset_current(db: Session, spec: IBGESheetSpec, fingerprint: str) -> bool:
+    dataset = current_dataset(db, spec)
+    return dataset is not None and dataset.fingerprint == fingerprint
+
+
+def unchanged_result(db: Session, spec: IBGESheetSpec) -> ImportResult:
+    dataset = current_dataset(db, spec)
+    if dataset is None:
+        return ImportResult(unchanged=True)
+    report = dataset.anomaly_report or {}
+    return ImportResult(skipped=dataset.row_count, unchanged=True, anomalies=report.get("total", 0))
+
+
+def import_sheet(db: Session, spec: IBGESheetSpec, path: str, force: bool = False) -> ImportResult:
+    """
+    Lê e carrega uma planilha em uma única transação.
+
+    Se o arquivo e a spec forem os mesmos da última carga, não toca no banco
+    (a menos que `force`).
+    """
+    fingerprint = sheet_fingerprint(spec, path)
+    if not force and is_dataset_current(db, spec, fingerprint):
+        return unchanged_result(db, spec)
+
+    result = load_sheet(db, spec, read_sheet(spec, path, fingerprint), fingerprint)
+    db.commit()
+    return result
+
+
+def load_sheet(db: Session, spec: IBGESheetSpec, df: pd.DataFrame, fingerprint: str | None = None) -> ImportResult:
+    return load_sheet_chunks(db, spec, [df], fingerprint)
+
+
+def load_sheet_chunks(
+    db: Session,
+    spec: IBGESheetSpec,
+    chunks: Iterable[pd.DataFrame],
+    fingerprint: str | None = None,
+    on_chunk: Callable[[ImportResult], None] | None = None,
+) -> ImportResult:
+    """
+    Carrega a planilha em blocos (um upsert por bloco), valida e publica.
+
+    Só as chaves ficam em memória entre um bloco e outro. As checagens de
+    consistência rodam no fim, sobre a tabela inteira, e não bloqueiam a carga.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        result = _load_with_swap(db, spec, chunks, on_chunk)
+    else:
+        # SQLite: a carga inteira é uma transação só e leitores não a veem pela metade
+        result, keys = _load_chunks(db, spec, spec.table, chunks, on_chunk)
+        validate_loaded(db, spec.table, spec, keys)
+    refresh_level_summaries(db, spec)
+    report = validate_loaded_sheet(db, spec)
+    result.anomalies = report["total"]
+    if fingerprint is not None:
+        record_dataset_version(db, spec, fingerprint, result, report)
+    return result
+
+
+def _load_chunks(db: Session, spec: IBGESheetSpec, table: Table, chunks, on_chunk) -> tuple[ImportResult, set[str]]:
+    result = ImportResult()
+    keys: set[str] = set()
+    for df in chunks:
+        result.add(bulk_upsert(db, table, df))
+        # As derivadas não passam pela troca de tabela: o upsert já é atômico na transação
+        for derived in spec.derived:
+            derived_result = bulk_upsert(db, derived.table, derived.build(df), key=derived.key)
+            result.derived_changed += derived_result.inserted + derived_result.updated
+        keys.update(df["location"].dropna())
+        if on_chunk is not None:
+            on_chunk(result)
+    return result, keys
+
+
+class LoadValidationError(ValueError):
+    """A tabela carregada não bate com a planilha; a troca não acontece."""
+
+
+def validate_loaded(db: Session, table: Table, spec: IBGESheetSpec, keys: set[str]) -> None:
+    keys = list(keys)
+    loaded = table.c.location.in_(keys)
+
+    found = db.execute(select(func.count()).select_from(table).where(loaded)).scalar_one()
+    if found != len(keys):
+        raise LoadValidationError(f"{spec.name}: {len(keys)} localidades na planilha, {found} carregadas")
+
+    for column in spec.required:
+        missing = db.execute(
+            select(func.count()).select_from(table).where(loaded, table.c[column].is_(None))
+        ).scalar_one()
+        if missing:
+            raise LoadValidationError(f"{spec.name}: {missing} linhas sem {column}")
+
+
+STAGING_SUFFIX = "__staging"
+
+
+def _quoted(schema: str | None, name: str) -> str:
+    return f'"{schema}"."{name}"' if schema else f'"{name}"'
+
+
+def _staging_table(live: Table) -> tuple[Table, list[tuple[str, str]]]:
+    """Cópia da definição de `live` com nomes próprios; devolve também (índice staging, índice real)."""
+    staging = live.to_metadata(MetaData(), name=f"{live.name}{STAGING_SUFFIX}")
+    live_names = {tuple(col.name for col in index.columns): str(index.name) for index in live.indexes}
+    renames = []
+    for index in staging.indexes:
+        live_name = live_names[tuple(col.name for col in index.columns)]
+        index.name = _staging_index_name(live_name)
+        renames.append((index.name, live_name))
+    return staging, renames
+
+
+def _staging_index_name(live_name: str) -> str:
+    # PostgreSQL limita identificadores a 63 caracteres; nomes longos ganham um hash
+    name = f"{live_name}{STAGING_SUFFIX}"
+    if len(name) <= 63:
+        return name
+    digest = hashlib.sha1(live_name.encode()).hexdigest()[:8]
+    return f"{live_name[:40]}_{digest}{STAGING_SUFFIX}"
+
+
+def _load_with_swap(db: Session, spec: IBGESheetSpec, chunks, on_chunk) -> ImportResult:
+    live = spec.table
+    staging, index_renames = _staging_table(live)
+    conn = db.connection()
+
+    # 1. Cópia com o conteúdo atual (localidades fora da planilha continuam existindo)
+    staging.drop(conn, checkfirst=True)
+    staging.create(conn)
+    conn.execute(staging.insert().from_select(list(live.c.keys()), select(live)))
+    seq = _quoted(live.schema, staging.name)
+    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{seq}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {seq}"))
+
+    # 2. Carga e validação fora da tabela lida pela API
+    result, keys = _load_chunks(db, spec, staging, chunks, on_chunk)
+    validate_loaded(db, staging, spec, keys)
+
+    # 3. Troca atômica; se a tabela estiver ocupada, desiste em vez de enfileirar leitores
+    conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+    old_name = f"{live.name}__old"
+    conn.execute(text(f'ALTER TABLE {_quoted(live.schema, live.name)} RENAME TO "{old_name}"'))
+    conn.execute(text(f'ALTER TABLE {_quoted(live.schema, staging.name)} RENAME TO "{live.name}"'))
+    conn.execute(text(f"DROP TABLE {_quoted(live.schema, old_name)}"))
+
+    # Devolve os nomes originais a índices, PK e sequência da nova tabela
+    for staging_name, live_name in index_renames:
+        conn.execute(text(f'ALTER INDEX {_quoted(live.schema, staging_name)} RENAME TO "{live_name}"'))
+    conn.execute(text(
+        f'ALTER TABLE {_quoted(live.schema, live.name)} '
+        f'RENAME CONSTRAINT "{staging.name}_pkey" TO "{live.name}_pkey"'
+    ))
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": _quoted(live.schema, live.name)}
+    ).scalar()
+    if sequence:
+        conn.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO "{live.name}_id_seq"'))
+    return result
+
+
+def refresh_level_summaries(db: Session, spec: IBGESheetSpec) -> None:
+    """Recalcula IBGELevelSummary da planilha com um GROUP BY level na tabela já carregada."""
+    table = spec.table
+    if "level" not in table.c:
+        return
+    counts = [col for col in table.c if isinstance(col.type, Integer) and col.name != "id"]
+    rows = db.execute(
+        select(table.c.level, func.count(), *(func.sum(col) for col in counts))
+        .where(table.c.level.is_not(None))
+        .group_by(table.c.level)
+    ).all()
+
+    summaries = IBGELevelSummary.__table__
+    db.execute(summaries.delete().where(summaries.c.dataset == spec.name))
+    if rows:
+        now = datetime.utcnow()
+        db.execute(summaries.insert(), [
+            {
+                "dataset": spec.name,
+                "level": level,
+                "locations": locations,
+                "totals": {col.name: int(total) if total is not None else None for col, total in zip(counts, totals)},
+                "updated_at": now,
+            }
+            for level, locations, *totals in rows
+        ])
+
+
+def level_summary(db: Session, dataset: str, level: str = "country") -> IBGELevelSummary | None:
+    return db.get(IBGELevelSummary, (dataset, level))
+
+
+def record_dataset_version(
+    db: Session, spec: IBGESheetSpec, fingerprint: str, result: ImportResult, report: dict | None = None
+) -> IBGEDataset:
+    """Guarda a impressão digital da carga e o relatório de anomalias; a versão só sobe se algum dado mudou."""
+    dataset = current_dataset(db, spec)
+    if dataset is None:
+        dataset = IBGEDataset(name=spec.name, version=0)
+        db.add(dataset)
+    # Tabelas derivadas também contam: as rotas delas usam a mesma versão no cache/ETag
+    if result.inserted or result.updated or result.derived_changed or dataset.version == 0:
+        dataset.version += 1
+    dataset.fingerprint = fingerprint
+    dataset.row_count = result.total
+    dataset.anomaly_report = report
+    dataset.loaded_at = datetime.utcnow()
+    db.flush()
+    return dataset
+
+
+def dataframe_to_records(df: pd.DataFrame) -> list[dict]:
+    """Converte o DataFrame em dicionários com tipos nativos (NaN → None)."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def bulk_upsert(db: Session, table: Table, df: pd.DataFrame, key: str | tuple[str, ...] = "location") -> ImportResult:
+    """
+    Insere/atualiza todas as linhas de `df` em `table` usando `key` como chave
+    (uma coluna ou uma tupla de colunas com índice único).
+
+    As colunas do DataFrame precisam existir na tabela. Linhas sem chave são
+    contadas como ignoradas. Não faz commit: quem chama controla a transação.
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    result = ImportResult()
+
+    missing_key = df[keys].isna().any(axis=1)
+    result.skipped += int(missing_key.sum())
+    # Se a planilha repetir uma localidade, vale a última ocorrência
+    df = df[~missing_key]
+    deduped = df.drop_duplicates(subset=keys, keep="last")
+    result.skipped += len(df.index) - len(deduped.index)
+
+    if deduped.empty:
+        return result
+
+    df = _coerce_types(table, deduped)
+    if "created_at" in table.c and "created_at" not in df.columns:
+        df["created_at"] = datetime.utcnow()
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        inserted, updated = _upsert_postgresql(db, table, df, keys)
+    elif dialect == "sqlite":
+        inserted, updated = _upsert_sqlite(db, table, df, keys)
+    else:
+        raise ValueError(f"Dialeto não suportado para carga em lote: {dialect}")
+
+    result.inserted += inserted
+    result.updated += updated
+    result.skipped += len(df.index) - inserted - updated
+    return result
+
+
+def _coerce_types(table: Table, df: pd.DataFrame) -> pd.DataFrame:
+    """Alinha os dtypes do DataFrame aos tipos das colunas da tabela."""
+    df = df.copy()
+    for col in df.columns:
+        column_type = table.c[col].type
+        if isinstance(column_type, Integer):
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+        elif isinstance(column_type, Float):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    return df
+
+
+def _value_columns(df: pd.DataFrame, keys: list[str]) -> list[str]:
+    # created_at registra a primeira carga, não participa da comparação
+    return [col for col in df.columns if col not in {*keys, "created_at"}]
+
+
+def _upsert_postgresql(db: Session, table: Table, df: pd.DataFrame, keys: list[str]) -> tuple[int, int]:
+    columns = list(df.columns)
+    values = _value_columns(df, keys)
+    target = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    staging = f"tmp_{table.name}"
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    conflict = ", ".join(f'"{col}"' for col in keys)
+
+    db.execute(text(f'CREATE TEMP TABLE "{staging}" (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP'))
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{staging}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+    set_clause = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in values)
+    current = ", ".join(f't."{col}"' for col in values)
+    incoming = ", ".join(f'EXCLUDED."{col}"' for col in values)
+    # xmax = 0 só acontece em linhas recém-inseridas
+    row = db.execute(text(f"""
+        WITH upserted AS (
+            INSERT INTO {target} AS t ({column_list})
+            SELECT {column_list} FROM "{staging}"
+            ON CONFLICT ({conflict}) DO UPDATE SET {set_clause}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (t.xmax = 0) AS inserted
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted) AS inserted,
+            COUNT(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """)).one()
+    db.execute(text(f'DROP TABLE IF EXISTS "{staging}"'))
+    return row.inserted, row.updated
+
+
+def _upsert_sqlite(db: Session, table: Table, df: pd.DataFrame, keys: list[str]) -> tuple[int, int]:
+    values = _value_columns(df, keys)
+    rows = list(df[keys].itertuples(index=False, name=None))
+    # Filtra só pela primeira coluna da chave: IN de tuplas estoura o limite de parâmetros
+    first = table.c[keys[0]].in_(df[keys[0]].unique().tolist())
+    existing = set(db.execute(select(*(table.c[col] for col in keys)).where(first)).tuples())
+
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={col: stmt.excluded[col] for col in values},
+        where=or_(*(table.c[col].is_distinct_from(stmt.excluded[col]) for col in values)),
+    )
+    changed = db.execute(stmt, dataframe_to_records(df)).rowcount
+
+    inserted = sum(1 for row in rows if row not in existing)
+    return inserted, max(changed - inserted, 0)
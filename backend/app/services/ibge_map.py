@@ -0,0 +1,324 @@
+# Mapa das UFs (TopoJSON) já com os indicadores do IBGE.
+#
+# O GeoJSON original (frontend/public/brazil-states.geojson) tem ~3 MB e o
+# navegador ainda precisava cruzar os nomes das UFs com a API. Aqui o
+# backend faz isso uma vez por versão do dataset:
+#   - as coordenadas viram inteiros numa grade (quantização = precisão);
+#   - as fronteiras comuns entre duas UFs viram um arco só (topologia);
+#   - cada arco é simplificado (Douglas-Peucker) com tolerância de uma
+#     célula da grade, igual para os dois lados da fronteira;
+#   - os indicadores de cada UF entram nas propriedades da feição.
+# O resultado fica no disco (ibge_cache_dir/maps) em gzip e, se o pacote
+# `brotli` estiver instalado, em br; a rota só escolhe o arquivo.
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.compression import accepted_encodings
+from app.config import get_settings
+from app.models import IndigenousAutismStatistic
+from app.services.ibge_importer import AUTISM_INDIGENOUS_SHEET
+from app.services.ibge_response_cache import dataset_versions, etag_matches
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele o mapa sai só em gzip
+    brotli = None
+
+settings = get_settings()
+
+MAP_FORMAT_VERSION = 1
+MAP_DATASETS = [AUTISM_INDIGENOUS_SHEET.name]
+
+# Precisão → tamanho da grade de quantização
+MAP_PRECISIONS = {"low": 1_000, "medium": 10_000, "high": 100_000}
+
+# Propriedades do GeoJSON mantidas e indicadores juntados em cada UF
+MAP_PROPERTIES = ("name", "sigla", "codigo_ibg", "regiao_id")
+MAP_INDICATORS = ("location", "indigenous_population", "autism_count", "autism_percentage")
+
+# Tolerância da simplificação, em células da grade
+SIMPLIFY_TOLERANCE = 1.0
+
+
+def normalize_name(name: str) -> str:
+    """Mesma normalização do BrazilMapD3.jsx: sem acento, minúsculo ("São Paulo" → "sao paulo")."""
+    decomposed = unicodedata.normalize("NFD", str(name))
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower().strip()
+
+
+# ===== Topologia =====
+
+def _polygons(geometry: dict) -> list:
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def _bbox(features: list[dict]) -> tuple[float, float, float, float]:
+    points = np.array(
+        [point[:2] for feature in features for polygon in _polygons(feature["geometry"]) for ring in polygon for point in ring],
+        dtype=float,
+    )
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+def _quantize_ring(ring: list, bbox: tuple, scale: tuple) -> list[tuple[int, int]] | None:
+    """Leva o anel para a grade e tira pontos repetidos; None se ele sumir."""
+    points = np.asarray(ring, dtype=float)[:, :2]
+    grid = np.rint((points - bbox[:2]) / scale).astype(np.int64)
+    quantized = [tuple(point) for point in grid.tolist()]
+    deduped = [quantized[0]]
+    for point in quantized[1:]:
+        if point != deduped[-1]:
+            deduped.append(point)
+    if deduped[0] != deduped[-1]:
+        deduped.append(deduped[0])
+    return deduped if len(deduped) >= 4 else None
+
+
+def _junctions(rings: list[list[tuple]]) -> set[tuple]:
+    """Pontos onde uma fronteira começa ou termina: vizinhos diferentes em anéis diferentes."""
+    neighbours: dict[tuple, frozenset] = {}
+    junctions = set()
+    for ring in rings:
+        size = len(ring) - 1
+        for index in range(size):
+            point = ring[index]
+            pair = frozenset((ring[index - 1 if index else size - 1], ring[index + 1]))
+            if neighbours.setdefault(point, pair) != pair:
+                junctions.add(point)
+    return junctions
+
+
+class _ArcIndex:
+    """Arcos únicos; um arco já visto ao contrário volta como ~índice (convenção do TopoJSON)."""
+
+    def __init__(self):
+        self.arcs: list[list[tuple]] = []
+        self._index: dict[tuple, int] = {}
+
+    def add(self, arc: list[tuple]) -> int:
+        key = tuple(arc)
+        if key in self._index:
+            return self._index[key]
+        if key[::-1] in self._index:
+            return ~self._index[key[::-1]]
+        self._index[key] = len(self.arcs)
+        self.arcs.append(arc)
+        return len(self.arcs) - 1
+
+
+def _ring_arcs(ring: list[tuple], junctions: set[tuple], arcs: _ArcIndex) -> list[int]:
+    points = ring[:-1]
+    cuts = [index for index, point in enumerate(points) if point in junctions]
+    if not cuts:
+        # Anel sem vizinhos (ilha, enclave): começa no menor ponto para que o
+        # mesmo anel visto por outra UF (como buraco) caia no mesmo arco
+        start = points.index(min(points))
+        rotated = points[start:] + points[:start]
+        return [arcs.add(rotated + rotated[:1])]
+
+    start = cuts[0]
+    rotated = points[start:] + points[:start] + [points[start]]
+    bounds = [index - start for index in cuts] + [len(points)]
+    return [arcs.add(rotated[first:last + 1]) for first, last in zip(bounds, bounds[1:])]
+
+
+def simplify_arc(arc: list[tuple], tolerance: float) -> list[tuple]:
+    """Douglas-Peucker iterativo; as pontas (junções) nunca saem."""
+    if tolerance <= 0 or len(arc) < 3:
+        return arc
+    points = np.asarray(arc, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, inner = points[first], points[first + 1:last] - points[first]
+        direction = points[last] - start
+        length = np.hypot(*direction)
+        if length == 0:
+            # Arco fechado: distância até o ponto inicial
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.extend(((first, middle), (middle, last)))
+    return [arc[index] for index in np.flatnonzero(keep)]
+
+
+def _delta_encode(arc: list[tuple]) -> list[list[int]]:
+    points = np.asarray(arc, dtype=np.int64)
+    return np.vstack([points[:1], np.diff(points, axis=0)]).tolist()
+
+
+def build_topology(geojson: dict, indicators: dict[str, dict], quantization: int) -> dict:
+    """GeoJSON das UFs → TopoJSON quantizado e simplificado, com `indicators` (por nome normalizado) nas propriedades."""
+    features = geojson["features"]
+    bbox = _bbox(features)
+    scale = tuple(
+        (high - low) / (quantization - 1) if high > low else 1.0 for low, high in zip(bbox[:2], bbox[2:])
+    )
+
+    shapes = []
+    for feature in features:
+        polygons = []
+        for polygon in _polygons(feature["geometry"]):
+            rings = [_quantize_ring(ring, bbox, scale) for ring in polygon]
+            # Sem o anel externo o polígono some; buracos pequenos demais só são descartados
+            if rings and rings[0] is not None:
+                polygons.append([ring for ring in rings if ring is not None])
+        shapes.append(polygons)
+
+    junctions = _junctions([ring for polygons in shapes for polygon in polygons for ring in polygon])
+    arcs = _ArcIndex()
+    geometries = []
+    for feature, polygons in zip(features, shapes):
+        source = feature.get("properties") or {}
+        properties = {name: source.get(name) for name in MAP_PROPERTIES}
+        joined = indicators.get(normalize_name(source.get("name", "")), {})
+        properties.update({name: joined.get(name) for name in MAP_INDICATORS})
+        geometries.append(
+            {
+                "type": "MultiPolygon",
+                "id": source.get("sigla"),
+                "properties": properties,
+                "arcs": [[_ring_arcs(ring, junctions, arcs) for ring in polygon] for polygon in polygons],
+            }
+        )
+
+    return {
+        "type": "Topology",
+        "bbox": list(bbox),
+        "transform": {"scale": list(scale), "translate": list(bbox[:2])},
+        "objects": {"states": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": [_delta_encode(simplify_arc(arc, SIMPLIFY_TOLERANCE)) for arc in arcs.arcs],
+    }
+
+
+# ===== Cache em disco =====
+
+@dataclass(frozen=True)
+class MapBundle:
+    digest: str
+    gzip_path: str
+    brotli_path: str | None
+
+
+_bundles: dict[str, MapBundle] = {}
+_bundles_lock = threading.Lock()
+
+
+def _map_dir() -> str:
+    return os.path.join(settings.ibge_cache_dir, "maps")
+
+
+def _source_stamp(path: str) -> list:
+    # Trocar o GeoJSON também invalida o mapa
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _state_indicators(db: Session) -> dict[str, dict]:
+    columns = [IndigenousAutismStatistic.__table__.c[name] for name in MAP_INDICATORS]
+    rows = db.execute(select(*columns).where(IndigenousAutismStatistic.level == "state")).mappings()
+    return {normalize_name(row["location"]): dict(row) for row in rows}
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    handle, scratch = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as target:
+            target.write(data)
+        os.replace(scratch, path)
+    except BaseException:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+        raise
+
+
+def _prune(prefix: str, keep: set[str]) -> None:
+    for name in os.listdir(_map_dir()):
+        if name.startswith(prefix) and os.path.join(_map_dir(), name) not in keep:
+            os.remove(os.path.join(_map_dir(), name))
+
+
+def get_map_bundle(db: Session, precision: str) -> MapBundle:
+    """Arquivos do mapa para a versão atual dos datasets; gera (uma thread por vez) se ainda não existem."""
+    quantization = MAP_PRECISIONS[precision]
+    key = {
+        "format": MAP_FORMAT_VERSION,
+        "quantization": quantization,
+        "versions": dataset_versions(db, MAP_DATASETS),
+        "source": _source_stamp(settings.ibge_geojson_path),
+    }
+    digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+    bundle = _bundles.get(precision)
+    if bundle is not None and bundle.digest == digest:
+        return bundle
+
+    with _bundles_lock:
+        bundle = _bundles.get(precision)
+        if bundle is not None and bundle.digest == digest:
+            return bundle
+
+        os.makedirs(_map_dir(), exist_ok=True)
+        prefix = f"states-{precision}-"
+        base = os.path.join(_map_dir(), f"{prefix}{digest}.json")
+        bundle = MapBundle(digest, f"{base}.gz", f"{base}.br" if brotli is not None else None)
+        # Outro processo (ou uma execução anterior) pode já ter gerado os arquivos
+        if not all(os.path.exists(path) for path in (bundle.gzip_path, bundle.brotli_path) if path):
+            with open(settings.ibge_geojson_path, encoding="utf-8") as source:
+                geojson = json.load(source)
+            topology = build_topology(geojson, _state_indicators(db), quantization)
+            body = json.dumps(topology, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            _write_atomic(bundle.gzip_path, gzip.compress(body, compresslevel=9))
+            if bundle.brotli_path:
+                _write_atomic(bundle.brotli_path, brotli.compress(body, quality=11))
+        _prune(prefix, {bundle.gzip_path, bundle.brotli_path})
+        _bundles[precision] = bundle
+        return bundle
+
+
+def map_response(request: Request, db: Session, precision: str) -> Response:
+    """Serve o arquivo br ou gzip do disco; só descomprime para clientes sem nenhum dos dois."""
+    bundle = get_map_bundle(db, precision)
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    if bundle.brotli_path and "br" in accepted:
+        encoding, path = "br", bundle.brotli_path
+    elif "gzip" in accepted:
+        encoding, path = "gzip", bundle.gzip_path
+    else:
+        encoding, path = None, bundle.gzip_path
+
+    etag = f'"{bundle.digest}-{encoding}"' if encoding else f'"{bundle.digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.ibge_http_max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    with open(path, "rb") as source:
+        data = source.read()
+    if encoding is None:
+        return Response(gzip.decompress(data), media_type="application/json", headers=headers)
+    return Response(data, media_type="application/json", headers={**headers, "Content-Encoding": encoding})
@@ -0,0 +1,91 @@
+# Listagens das tabelas do IBGE com projeção, filtros e paginação no SQL.
+#
+# `fields` vira a lista de colunas do SELECT, `location`/`level` viram WHERE e
+# a paginação é por keyset no id (WHERE id > cursor ORDER BY id LIMIT n), sem
+# OFFSET. O próximo cursor vai no cabeçalho para a resposta continuar sendo
+# uma lista simples.
+from dataclasses import dataclass
+
+from sqlalchemy import Table, select
+from sqlalchemy.orm import Session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+
+class UnknownFieldError(ValueError):
+    pass
+
+
+@dataclass
+class ListParams:
+    fields: str | None = None
+    locations: list[str] | None = None
+    level: str | None = None
+    # Drill-down: filhos diretos da localidade (país → regiões → UFs)
+    parent: str | None = None
+    limit: int | None = None
+    cursor: int | None = None
+
+
+def select_columns(table: Table, fields: str | None) -> list:
+    """`fields` no formato "location,autism_count"; vazio devolve todas as colunas."""
+    if not fields:
+        return list(table.c)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in table.c]
+    if unknown:
+        raise UnknownFieldError(f"Campos inexistentes: {', '.join(unknown)}")
+    return [table.c[name] for name in dict.fromkeys(names)]
+
+
+def location_filters(table: Table, params: ListParams) -> list:
+    filters = []
+    if params.locations:
+        filters.append(table.c.location.in_(params.locations))
+    if params.level:
+        filters.append(table.c.level == params.level)
+    if params.parent:
+        filters.append(table.c.parent == params.parent)
+    return filters
+
+
+def select_rows(
+    db: Session,
+    table: Table,
+    columns: list,
+    filters=(),
+    limit: int | None = None,
+    cursor: int | None = None,
+) -> tuple[list[dict], int | None]:
+    """Executa a consulta paginada; devolve as linhas e o cursor da próxima página (ou None)."""
+    # O id entra sempre no SELECT para calcular o cursor, mas só sai se foi pedido
+    with_id = any(column.name == "id" for column in columns)
+    stmt = select(*columns, *([] if with_id else [table.c.id.label("_cursor_id")]))
+    stmt = stmt.where(*filters).order_by(table.c.id)
+    if cursor is not None:
+        stmt = stmt.where(table.c.id > cursor)
+    if limit is not None:
+        # Uma linha a mais só para saber se existe próxima página
+        stmt = stmt.limit(limit + 1)
+
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]["id" if with_id else "_cursor_id"]
+    if not with_id:
+        for row in rows:
+            del row["_cursor_id"]
+    return rows, next_cursor
+
+
+def list_locations(db: Session, table: Table, params: ListParams) -> tuple[list[dict], int | None]:
+    return select_rows(
+        db,
+        table,
+        select_columns(table, params.fields),
+        location_filters(table, params),
+        params.limit,
+        params.cursor,
+    )
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models import ResidentAutismStatistic 
+from app.services.ibge_loader import level_summary
+from app.services.ibge_sheets import RESIDENTS_AUTISM_BY_SEX_SHEET
 
 def get_resident_gender_autism_distribution(db: Session):
     """
@@ -8,15 +8,13 @@ def get_resident_gender_autism_distribution(db: Session):
     em relação ao total de casos (TRA).
     """
     
-    # Consulta: Soma os totais de casos de autismo em todas as localidades
-    result = db.query(
-        func.sum(func.coalesce(ResidentAutismStatistic. total_residentes_homens_autismo, 0)).label("total_male_cases"),
-        func.sum(func.coalesce(ResidentAutismStatistic. total_residentes_mulheres_autismo, 0)).label("total_female_cases"),
-        func.sum(func.coalesce(ResidentAutismStatistic. total_residentes_autismo, 0)).label("total_overall_cases") # Soma total de casos (TRA)
-    ).first()
+    # Totais do país já calculados na importação (só a linha Brasil, sem
+    # somar regiões e UFs de novo)
+    summary = level_summary(db, RESIDENTS_AUTISM_BY_SEX_SHEET.name, "country")
+    totals = summary.totals if summary else {}
 
-    total_male_cases = result.total_male_cases or 0
-    total_female_cases = result.total_female_cases or 0
+    total_male_cases = totals.get("total_residentes_homens_autismo") or 0
+    total_female_cases = totals.get("total_residentes_mulheres_autismo") or 0
     total_overall_cases = total_male_cases + total_female_cases # Recalculamos o total geral para segurança
 
     # Se não houver casos de autismo em geral, retorna vazio.
@@ -0,0 +1,123 @@
+# Cache em memória das respostas das rotas de leitura do IBGE.
+#
+# Os dados só mudam quando uma importação roda, então a resposta já
+# serializada (bytes) fica guardada por rota + query string, junto com a
+# versão dos datasets de que ela depende (ibge_data.datasets). Cada
+# requisição só confere as versões (uma consulta pela PK); se alguma subiu,
+# a entrada é descartada e refeita. Como as importações rodam em outro
+# processo, a versão no banco é a única fonte confiável de invalidação.
+#
+# O ETag é o hash do corpo: If-None-Match igual devolve 304 sem corpo. O
+# formato colunar (X-Response-Shape) é outra entrada no cache.
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import IBGEDataset
+from app.responses import AppJSONResponse, response_shape
+
+settings = get_settings()
+
+# Cabeçalhos que o Response recria sozinho; não são guardados na entrada
+_GENERATED_HEADERS = {"content-length", "content-type"}
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    versions: tuple
+    body: bytes
+    etag: str
+    headers: dict[str, str]
+
+
+class ResponseCache:
+    """LRU simples e thread-safe (as rotas síncronas rodam no threadpool)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(settings.ibge_response_cache_size)
+
+
+def dataset_versions(db: Session, names: list[str]) -> tuple:
+    """Versão de cada dataset (None se nunca foi importado), na ordem de `names`."""
+    rows = dict(db.execute(select(IBGEDataset.name, IBGEDataset.version).where(IBGEDataset.name.in_(names))).all())
+    return tuple(rows.get(name) for name in names)
+
+
+def _request_key(request: Request) -> tuple:
+    return request.url.path, tuple(sorted(request.query_params.multi_items())), response_shape.get()
+
+
+def _opaque_tag(etag: str) -> str:
+    # Comparação fraca (RFC 9110): a compressão na saída troca "x" por W/"x"
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {_opaque_tag(candidate) for candidate in header.split(",")}
+    return "*" in candidates or _opaque_tag(etag) in candidates
+
+
+def cached_json(
+    request: Request, db: Session, datasets: list[str], build: Callable[[Response], Any]
+) -> Response:
+    """
+    Devolve a resposta JSON de `build` a partir do cache quando os datasets
+    não mudaram. `build` recebe um Response para definir cabeçalhos extras
+    (ex.: X-Next-Cursor), que também ficam guardados.
+    """
+    key = _request_key(request)
+    versions = dataset_versions(db, datasets)
+    entry = response_cache.get(key)
+
+    if entry is None or entry.versions != versions:
+        scratch = Response()
+        body = AppJSONResponse(jsonable_encoder(build(scratch))).body
+        headers = {name: value for name, value in scratch.headers.items() if name not in _GENERATED_HEADERS}
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        entry = CachedResponse(versions=versions, body=body, etag=etag, headers=headers)
+        response_cache.put(key, entry)
+
+    headers = {
+        **entry.headers,
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={settings.ibge_http_max_age}",
+    }
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,78 @@
+# Cache em disco das planilhas do IBGE já lidas e saneadas.
+#
+# `pd.read_excel` (openpyxl) é de longe o passo mais lento de uma importação.
+# O resultado de `parse_sheet` é gravado em Arrow IPC, com nome derivado do
+# SHA-256 da planilha e da própria spec; se nada mudou, o arquivo é lido de
+# volta via memory-map em milissegundos.
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Incrementar quando o saneamento em parse_sheet mudar de comportamento
+CACHE_FORMAT_VERSION = 3
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_fingerprint(spec, path: str) -> str:
+    """Identifica o conteúdo da planilha + a forma como ela é interpretada."""
+    definition = json.dumps(
+        {
+            "format": CACHE_FORMAT_VERSION,
+            "header": spec.header,
+            "columns": [[str(key), value] for key, value in spec.column_map.items()],
+            "required": list(spec.required),
+            "table": spec.table.fullname,
+            "derived": [derived.table.fullname for derived in spec.derived],
+        },
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(file_sha256(path).encode())
+    digest.update(definition.encode())
+    return digest.hexdigest()
+
+
+def _cache_path(spec, fingerprint: str) -> str:
+    return os.path.join(settings.ibge_cache_dir, f"{spec.name}-{fingerprint}.arrow")
+
+
+def read_cached_sheet(spec, fingerprint: str) -> pd.DataFrame | None:
+    path = _cache_path(spec, fingerprint)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        return ipc.open_file(source).read_all().to_pandas()
+
+
+def write_cached_sheet(spec, fingerprint: str, df: pd.DataFrame) -> None:
+    os.makedirs(settings.ibge_cache_dir, exist_ok=True)
+    path = _cache_path(spec, fingerprint)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Grava em arquivo temporário e troca de uma vez (leitores nunca veem meio arquivo)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(temp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temp_path, path)
+
+    # Versões antigas da mesma planilha não servem mais
+    for stale in glob.glob(os.path.join(settings.ibge_cache_dir, f"{spec.name}-*.arrow")):
+        if stale != path:
+            os.remove(stale)
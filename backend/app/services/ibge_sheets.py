@@ -0,0 +1,231 @@
+# Catálogo das planilhas do IBGE em backend/data e importação em paralelo.
+#
+# Cada planilha é descrita por um IBGESheetSpec (linha de cabeçalho, mapa de
+# colunas e tabela de destino). A leitura com openpyxl é o passo mais caro,
+# então as planilhas são lidas em um pool de processos e carregadas no banco
+# em paralelo, cada uma na sua sessão.
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import app.database as database
+from app.config import get_settings
+from app.models import (
+    COURSE_KEYS,
+    EDUCATION_LEVELS,
+    RACE_KEYS,
+    SCHOOL_AGE_BANDS,
+    SEX_KEYS,
+    AdultAutismByEducation,
+    IndigenousSchoolingRate,
+    IndigenousStudentAutism,
+    ResidentAutismByRace,
+    ResidentAutismStatistic,
+    SchoolingRateByRace,
+    SchoolingRateBySex,
+    StudentAutismByCourse,
+    grid_column_names,
+)
+from app.services.ibge_importer import AUTISM_INDIGENOUS_SHEET
+from app.services.ibge_loader import (
+    IBGESheetSpec,
+    ImportResult,
+    is_dataset_current,
+    load_sheet,
+    read_sheet,
+    sheet_column_map,
+    unchanged_result,
+)
+from app.services.ibge_sheet_cache import sheet_fingerprint
+from app.services.ibge_students_autism_by_race import STUDENTS_AUTISM_BY_RACE_SHEET
+
+logger = logging.getLogger("uvicorn.error")
+settings = get_settings()
+
+# Rótulos da última linha de cabeçalho, na ordem da planilha
+AGE_BAND_LABELS = ("Total", "6 a 14 anos", "15 a 17 anos", "18 a 24 anos", "25 anos ou mais")
+RACE_LABELS = ("Total", "Branca", "Preta", "Amarela", "Parda", "Indígena")
+EDUCATION_LABELS = (
+    "Total",
+    "Sem instrução e fundamental incompleto",
+    "Fundamental completo e médio incompleto",
+    "Médio completo e superior incompleto",
+    "Superior completo",
+)
+
+STUDENTS_AUTISM_BY_COURSE_SHEET = IBGESheetSpec(
+    name="students-autism-by-course",
+    file_name="autismo_estudantes_curso.xlsx",
+    header=5,
+    model=StudentAutismByCourse,
+    column_map=sheet_column_map(
+        AGE_BAND_LABELS, grid_column_names(("", "aut", "pct"), COURSE_KEYS, SCHOOL_AGE_BANDS)
+    ),
+)
+
+INDIGENOUS_STUDENTS_AUTISM_BY_AGE_SHEET = IBGESheetSpec(
+    name="indigenous-students-autism-by-age",
+    file_name="autismo_estudantes_indigenas_idade.xlsx",
+    header=4,
+    model=IndigenousStudentAutism,
+    column_map=sheet_column_map(AGE_BAND_LABELS, grid_column_names(("total", "aut", "pct"), SCHOOL_AGE_BANDS)),
+)
+
+ADULTS_AUTISM_BY_EDUCATION_SHEET = IBGESheetSpec(
+    name="adults-autism-by-education",
+    file_name="autismo_estudantes_sexo.xlsx",
+    header=5,
+    model=AdultAutismByEducation,
+    column_map=sheet_column_map(
+        EDUCATION_LABELS, grid_column_names(("", "aut", "pct"), SEX_KEYS, EDUCATION_LEVELS)
+    ),
+)
+
+RESIDENTS_AUTISM_BY_RACE_SHEET = IBGESheetSpec(
+    name="residents-autism-by-race",
+    file_name="autismo_pessoas_cor.xlsx",
+    header=4,
+    model=ResidentAutismByRace,
+    column_map=sheet_column_map(RACE_LABELS, grid_column_names(("", "aut", "pct"), RACE_KEYS)),
+)
+
+# Só as colunas "Total" de cada sexo; as faixas de idade não são armazenadas
+RESIDENTS_AUTISM_BY_SEX_SHEET = IBGESheetSpec(
+    name="residents-autism-by-sex",
+    file_name="autismo_pessoas_sexo.xlsx",
+    header=5,
+    model=ResidentAutismStatistic,
+    column_map={
+        "Total": "total_residentes",
+        "Total.1": "total_residentes_homens",
+        "Total.2": "total_residentes_mulheres",
+        "Total.3": "total_residentes_autismo",
+        "Total.4": "total_residentes_homens_autismo",
+        "Total.5": "total_residentes_mulheres_autismo",
+        "Total.6": "porcentagem_total_autismo",
+        "Total.7": "porcentagem_homens_autismo",
+        "Total.8": "porcentagem_mulheres_autismo",
+    },
+    required=("total_residentes",),
+    ratios=(
+        ("porcentagem_total_autismo", "total_residentes_autismo", "total_residentes"),
+        ("porcentagem_homens_autismo", "total_residentes_homens_autismo", "total_residentes_homens"),
+        ("porcentagem_mulheres_autismo", "total_residentes_mulheres_autismo", "total_residentes_mulheres"),
+    ),
+)
+
+INDIGENOUS_SCHOOLING_RATE_SHEET = IBGESheetSpec(
+    name="indigenous-schooling-rate",
+    file_name="taxa_escolarizacao_autismo_estudantes_indigenas_idade.xlsx",
+    header=4,
+    model=IndigenousSchoolingRate,
+    column_map=sheet_column_map(AGE_BAND_LABELS, grid_column_names(("taxa", "taxa_aut"), SCHOOL_AGE_BANDS)),
+)
+
+SCHOOLING_RATE_BY_RACE_SHEET = IBGESheetSpec(
+    name="schooling-rate-by-race",
+    file_name="taxa_escolarizacao_autismo_pessoas_cor.xlsx",
+    header=5,
+    model=SchoolingRateByRace,
+    column_map=sheet_column_map(
+        AGE_BAND_LABELS, grid_column_names(("taxa", "taxa_aut"), RACE_KEYS, SCHOOL_AGE_BANDS)
+    ),
+)
+
+SCHOOLING_RATE_BY_SEX_SHEET = IBGESheetSpec(
+    name="schooling-rate-by-sex",
+    file_name="taxa_escolarizacao_autismo_pessoas_sexo.xlsx",
+    header=5,
+    model=SchoolingRateBySex,
+    column_map=sheet_column_map(
+        AGE_BAND_LABELS, grid_column_names(("taxa", "taxa_aut"), SEX_KEYS, SCHOOL_AGE_BANDS)
+    ),
+)
+
+IBGE_SHEETS: dict[str, IBGESheetSpec] = {
+    spec.name: spec
+    for spec in (
+        AUTISM_INDIGENOUS_SHEET,
+        STUDENTS_AUTISM_BY_RACE_SHEET,
+        STUDENTS_AUTISM_BY_COURSE_SHEET,
+        INDIGENOUS_STUDENTS_AUTISM_BY_AGE_SHEET,
+        ADULTS_AUTISM_BY_EDUCATION_SHEET,
+        RESIDENTS_AUTISM_BY_RACE_SHEET,
+        RESIDENTS_AUTISM_BY_SEX_SHEET,
+        INDIGENOUS_SCHOOLING_RATE_SHEET,
+        SCHOOLING_RATE_BY_RACE_SHEET,
+        SCHOOLING_RATE_BY_SEX_SHEET,
+    )
+}
+
+
+def sheet_path(spec: IBGESheetSpec) -> str:
+    return os.path.join(settings.ibge_data_dir, spec.file_name)
+
+
+def _read_by_name(name: str, fingerprint: str) -> pd.DataFrame:
+    # Executado nos processos do pool: recebe só strings (picklable)
+    spec = IBGE_SHEETS[name]
+    return read_sheet(spec, sheet_path(spec), fingerprint)
+
+
+def _load_in_session(spec: IBGESheetSpec, df: pd.DataFrame, fingerprint: str) -> ImportResult:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        result = load_sheet(db, spec, df, fingerprint)
+        db.commit()
+    return result
+
+
+def import_sheets(
+    names: list[str], workers: int | None = None, force: bool = False
+) -> tuple[dict[str, ImportResult], dict[str, Exception]]:
+    """
+    Lê as planilhas em um pool de processos e carrega cada uma assim que fica
+    pronta. Planilhas iguais à última carga são puladas (a menos que `force`).
+    Uma falha não interrompe as demais: devolve resultados e erros.
+    """
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    results: dict[str, ImportResult] = {}
+    errors: dict[str, Exception] = {}
+
+    pending: dict[str, str] = {}
+    with database.SessionLocal() as db:
+        for name in names:
+            spec = IBGE_SHEETS[name]
+            fingerprint = sheet_fingerprint(spec, sheet_path(spec))
+            if not force and is_dataset_current(db, spec, fingerprint):
+                results[name] = unchanged_result(db, spec)
+            else:
+                pending[name] = fingerprint
+
+    if not pending:
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=workers) as parsers, ThreadPoolExecutor(max_workers=workers) as loaders:
+        parsing = {
+            parsers.submit(_read_by_name, name, fingerprint): (IBGE_SHEETS[name], fingerprint)
+            for name, fingerprint in pending.items()
+        }
+        loading = {}
+        for future in as_completed(parsing):
+            spec, fingerprint = parsing[future]
+            try:
+                df = future.result()
+            except Exception as exc:
+                errors[spec.name] = exc
+                continue
+            loading[loaders.submit(_load_in_session, spec, df, fingerprint)] = spec
+
+        for future in as_completed(loading):
+            spec = loading[future]
+            try:
+                results[spec.name] = future.result()
+            except Exception as exc:
+                errors[spec.name] = exc
+
+    for name, exc in errors.items():
+        logger.error("❌ Falha ao importar %s: %r", name, exc)
+    return results, errors
@@ -0,0 +1,93 @@
+# Upload de novas planilhas do IBGE com memória limitada.
+#
+# O arquivo enviado é copiado para o disco em blocos (nunca inteiro na
+# memória) e depois lido pelo openpyxl em modo read-only, linha a linha.
+# As linhas são agrupadas em DataFrames pequenos e saneados que vão direto
+# para o carregador em lote; o pico de memória não depende do tamanho da
+# planilha (ex.: recortes por município).
+import os
+import tempfile
+from collections.abc import Iterator
+
+import pandas as pd
+from fastapi import UploadFile
+from openpyxl import load_workbook
+
+from app.config import get_settings
+from app.services.ibge_loader import IBGESheetSpec, LocationHierarchy, sanitize_sheet
+
+settings = get_settings()
+
+UPLOAD_EXTENSIONS = (".xlsx",)
+
+_COPY_BUFFER = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def spool_upload(upload: UploadFile) -> str:
+    """Copia o upload para um arquivo temporário em ibge_upload_dir e devolve o caminho."""
+    os.makedirs(settings.ibge_upload_dir, exist_ok=True)
+    limit = settings.ibge_upload_max_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(dir=settings.ibge_upload_dir, suffix=".xlsx", delete=False) as target:
+        written = 0
+        try:
+            for chunk in iter(lambda: upload.file.read(_COPY_BUFFER), b""):
+                written += len(chunk)
+                if written > limit:
+                    raise UploadTooLarge(f"Arquivo maior que {settings.ibge_upload_max_mb} MB")
+                target.write(chunk)
+        except BaseException:
+            target.close()
+            os.remove(target.name)
+            raise
+    return target.name
+
+
+def _header_labels(row) -> list[str]:
+    # Mesmo padrão do pandas: repetidos viram "Total.1", vazios "Unnamed: i"
+    seen: dict[str, int] = {}
+    labels = []
+    for index, value in enumerate(row):
+        label = f"Unnamed: {index}" if value is None else str(value)
+        count = seen.get(label, 0)
+        seen[label] = count + 1
+        labels.append(label if count == 0 else f"{label}.{count}")
+    return labels
+
+
+def iter_sheet_chunks(spec: IBGESheetSpec, path: str, chunk_size: int = 5000) -> Iterator[pd.DataFrame]:
+    """Lê a primeira aba em streaming e devolve blocos de até `chunk_size` linhas já saneadas."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(spec.header):
+            next(rows, None)
+        header = next(rows, None)
+        if header is None:
+            return
+        labels = _header_labels(header)
+        # O pai de uma localidade pode estar no bloco anterior
+        hierarchy = LocationHierarchy()
+
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield _chunk_frame(spec, labels, buffer, hierarchy)
+                buffer = []
+        if buffer:
+            yield _chunk_frame(spec, labels, buffer, hierarchy)
+    finally:
+        workbook.close()
+
+
+def _chunk_frame(
+    spec: IBGESheetSpec, labels: list[str], rows: list[tuple], hierarchy: LocationHierarchy
+) -> pd.DataFrame:
+    # Linhas do read-only podem vir mais curtas que o cabeçalho
+    width = len(labels)
+    rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+    return sanitize_sheet(spec, pd.DataFrame.from_records(rows, columns=labels), hierarchy)
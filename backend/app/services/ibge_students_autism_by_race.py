@@ -1,6 +1,8 @@
 import pandas as pd
 from sqlalchemy.orm import Session
-from app.models import IBGEStudentAutism
+from app.models import RACE_KEYS, SCHOOL_AGE_BANDS, STUDENT_METRICS, IBGEStudentAutism, StudentAutismByRaceValue
+from app.services.ibge_loader import DerivedTable, IBGESheetSpec, ImportResult, import_sheet
+from app.services.ibge_query import select_rows
 import logging
 
 logger = logging.getLogger("uvicorn.error")
@@ -130,48 +132,72 @@ COLUMN_MAP = {
 }
 
 
-def sanitize_value(value):
-    if pd.isna(value):
-        return None
-    if isinstance(value, str) and value.strip() == "-":
-        return None
-    try:
-        return float(value)
-    except Exception:
-        return None
+# Coluna da tabela larga → (raça, faixa, métrica) na tabela longa
+LONG_FORMAT_COLUMNS = {
+    f"{prefix}{race}_{band}": (race, band, metric)
+    for metric, prefix in zip(STUDENT_METRICS, ("", "aut_", "pct_"))
+    for race in RACE_KEYS
+    for band in SCHOOL_AGE_BANDS
+}
 
 
-def import_ibge_students_autism_by_race(db: Session, file_path: str):
+def melt_students_by_race(df: pd.DataFrame) -> pd.DataFrame:
+    """Transforma as 90 colunas da planilha em linhas (location, race, age_band, metric, value)."""
+    columns = [col for col in LONG_FORMAT_COLUMNS if col in df.columns]
+    long = df.melt(id_vars="location", value_vars=columns, var_name="column", value_name="value")
+    dimensions = pd.DataFrame(
+        [LONG_FORMAT_COLUMNS[col] for col in columns], index=columns, columns=["race", "age_band", "metric"]
+    )
+    long = long.join(dimensions, on="column")
+    return long[["location", "race", "age_band", "metric", "value"]]
+
+
+STUDENTS_AUTISM_BY_RACE_SHEET = IBGESheetSpec(
+    name="students-autism-by-race",
+    file_name="autismo_estudantes_cor.xlsx",
+    header=5,
+    model=IBGEStudentAutism,
+    column_map=COLUMN_MAP,
+    derived=(
+        DerivedTable(
+            model=StudentAutismByRaceValue,
+            build=melt_students_by_race,
+            key=("location", "race", "age_band", "metric"),
+        ),
+    ),
+)
+
+
+def import_ibge_students_autism_by_race(db: Session, file_path: str, force: bool = False) -> ImportResult:
     logger.info("🔍 Iniciando importação...")
-    df = pd.read_excel(file_path, header=5)
-    logger.info(f"📄 Colunas originais: {list(df.columns)}")
-
-    # Garante que a PRIMEIRA coluna vire 'location'
-    first_col = df.columns[0]
-    if first_col != "location":
-        df.rename(columns={first_col: "location"}, inplace=True)
-
-    # Renomeia as demais colunas para os nomes do modelo
-    df.rename(columns=COLUMN_MAP, inplace=True)
-    logger.info(f"📄 Colunas após rename: {list(df.columns)}")
-
-    # IMPORTAÇÃO
-    for index, row in df.iterrows():
-        # se não tiver location, pula
-        if "location" not in row or pd.isna(row["location"]):
-            logger.info(f"⚠ Linha {index} ignorada: location vazio")
-            continue
-
-        data = {
-            "location": str(row["location"])
-        }
-
-        # Agora usamos os NOMES DO MODELO (já renomeados)
-        for model_col in COLUMN_MAP.values():
-            data[model_col] = sanitize_value(row.get(model_col))
-
-        logger.debug(f"➡ Linha {index} → {data}")
-        db.add(IBGEStudentAutism(**data))
-
-    db.commit()
-    logger.info("✅ Importação concluída!")
+    result = import_sheet(db, STUDENTS_AUTISM_BY_RACE_SHEET, file_path, force=force)
+    logger.info(
+        "✅ Importação concluída! inseridas=%s atualizadas=%s ignoradas=%s",
+        result.inserted, result.updated, result.skipped,
+    )
+    return result
+
+
+def query_students_by_race_values(
+    db: Session,
+    locations: list[str] | None = None,
+    races: list[str] | None = None,
+    age_bands: list[str] | None = None,
+    metrics: list[str] | None = None,
+    limit: int | None = None,
+    cursor: int | None = None,
+) -> tuple[list[dict], int | None]:
+    """Recorte da tabela longa; filtros vazios não restringem nada."""
+    table = StudentAutismByRaceValue.__table__
+    filters = [
+        column.in_(values)
+        for column, values in (
+            (table.c.location, locations),
+            (table.c.race, races),
+            (table.c.age_band, age_bands),
+            (table.c.metric, metrics),
+        )
+        if values
+    ]
+    columns = [table.c.location, table.c.race, table.c.age_band, table.c.metric, table.c.value]
+    return select_rows(db, table, columns, filters, limit, cursor)
@@ -0,0 +1,127 @@
+# Checagens de consistência das planilhas do IBGE, coluna a coluna.
+#
+# A carga converte "-", "X" e afins em nulo sem avisar e não confere se os
+# números batem entre si. Depois de cada carga a tabela é relida em um
+# DataFrame e as regras abaixo rodam sobre colunas inteiras (NumPy), sem
+# laço por linha:
+#   - missing: célula vazia em coluna de valor;
+#   - negative: contagem negativa;
+#   - out_of_range: percentual/taxa fora de 0–100;
+#   - part_exceeds_whole: aut_* maior que o total correspondente;
+#   - ratio_mismatch: percentual diferente de parte / todo × 100;
+#   - sum_mismatch: soma dos filhos (UFs de uma região, regiões do Brasil)
+#     diferente do valor do pai.
+# Nada disso bloqueia a carga (o IBGE arredonda as estimativas): o relatório
+# fica em IBGEDataset.anomaly_report e a contagem no job.
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, Integer, select
+from sqlalchemy.orm import Session
+
+# Percentual publicado com 1 casa decimal + contagens arredondadas
+RATIO_TOLERANCE = 0.15
+# Soma dos filhos x pai: relativo ao valor do pai, com um piso absoluto
+SUM_RELATIVE_TOLERANCE = 0.001
+SUM_ABSOLUTE_TOLERANCE = 5
+# O relatório guarda todas as contagens, mas só as primeiras ocorrências de cada checagem
+MAX_REPORTED_PER_CHECK = 100
+
+ANOMALY_COLUMNS = ["check", "location", "column", "expected", "actual"]
+
+
+def naming_ratios(columns) -> list[tuple[str, str, str]]:
+    """Trios (percentual, parte, todo) pela convenção das planilhas largas: pct_X = aut_X / X (ou total_X)."""
+    columns = set(columns)
+    ratios = []
+    for column in sorted(columns):
+        if not column.startswith("pct_"):
+            continue
+        base = column[len("pct_"):]
+        whole = base if base in columns else f"total_{base}"
+        if f"aut_{base}" in columns and whole in columns:
+            ratios.append((column, f"aut_{base}", whole))
+    return ratios
+
+
+def _anomalies(check: str, frame: pd.DataFrame, columns: list[str], mask: np.ndarray, expected, actual) -> pd.DataFrame:
+    """Uma linha por célula marcada em `mask` (linhas × colunas)."""
+    rows, cols = np.nonzero(mask)
+    return pd.DataFrame({
+        "check": check,
+        "location": frame["location"].to_numpy()[rows],
+        "column": np.asarray(columns, dtype=object)[cols],
+        "expected": expected[rows, cols] if expected is not None else np.nan,
+        "actual": actual[rows, cols],
+    })
+
+
+def _value_checks(spec, df: pd.DataFrame) -> list[pd.DataFrame]:
+    table = spec.table
+    values = [col for col in spec.column_map.values() if col in df.columns]
+    counts = [col for col in values if isinstance(table.c[col].type, Integer)]
+    rates = [col for col in values if isinstance(table.c[col].type, Float)]
+    found = []
+
+    matrix = df[values].to_numpy(dtype=float)
+    found.append(_anomalies("missing", df, values, np.isnan(matrix), None, matrix))
+
+    matrix = df[counts].to_numpy(dtype=float)
+    found.append(_anomalies("negative", df, counts, matrix < 0, None, matrix))
+
+    matrix = df[rates].to_numpy(dtype=float)
+    found.append(_anomalies("out_of_range", df, rates, (matrix < 0) | (matrix > 100), None, matrix))
+
+    ratios = [ratio for ratio in (*spec.ratios, *naming_ratios(values)) if set(ratio) <= set(df.columns)]
+    if ratios:
+        pct, part, whole = (df[list(names)].to_numpy(dtype=float) for names in zip(*ratios))
+        pct_columns, part_columns = [ratio[0] for ratio in ratios], [ratio[1] for ratio in ratios]
+        found.append(_anomalies("part_exceeds_whole", df, part_columns, part > whole, whole, part))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            computed = np.where(whole > 0, part / whole * 100, np.nan)
+        found.append(
+            _anomalies("ratio_mismatch", df, pct_columns, np.abs(pct - computed) > RATIO_TOLERANCE, computed.round(2), pct)
+        )
+    return found
+
+
+def _sum_checks(spec, df: pd.DataFrame) -> list[pd.DataFrame]:
+    if "parent" not in df.columns:
+        return []
+    counts = [col for col in spec.column_map.values() if col in df.columns and isinstance(spec.table.c[col].type, Integer)]
+    children = df[df["parent"].notna()]
+    # min_count=1: pai cujos filhos estão todos vazios não entra na comparação
+    sums = children.groupby("parent")[counts].sum(min_count=1)
+    parents = df.drop_duplicates("location").set_index("location")[counts].reindex(sums.index)
+
+    expected, actual = sums.to_numpy(dtype=float), parents.to_numpy(dtype=float)
+    tolerance = np.maximum(SUM_ABSOLUTE_TOLERANCE, SUM_RELATIVE_TOLERANCE * np.abs(actual))
+    mask = np.abs(expected - actual) > tolerance
+    return [_anomalies("sum_mismatch", sums.index.to_frame(name="location"), counts, mask, expected, actual)]
+
+
+def validate_sheet(spec, df: pd.DataFrame) -> dict:
+    """Roda todas as checagens sobre as linhas da planilha e devolve o relatório (JSON puro)."""
+    found = [frame for frame in (*_value_checks(spec, df), *_sum_checks(spec, df)) if not frame.empty]
+    anomalies = pd.concat(found, ignore_index=True) if found else pd.DataFrame(columns=ANOMALY_COLUMNS)
+    counts = anomalies["check"].value_counts()
+    listed = anomalies.groupby("check", sort=False).head(MAX_REPORTED_PER_CHECK)
+    return {
+        "dataset": spec.name,
+        "rows": len(df.index),
+        "checked_at": datetime.utcnow().isoformat(),
+        "total": len(anomalies.index),
+        "counts": {check: int(count) for check, count in counts.items()},
+        "anomalies": listed.astype(object).where(listed.notna(), None).to_dict("records"),
+        "truncated": len(listed.index) < len(anomalies.index),
+    }
+
+
+def validate_loaded_sheet(db: Session, spec) -> dict:
+    """Relê a tabela já carregada (inclui localidades de cargas anteriores) e valida."""
+    table = spec.table
+    columns = [table.c[name] for name in ("location", "level", "parent") if name in table.c]
+    columns += [table.c[name] for name in spec.column_map.values()]
+    df = pd.read_sql(select(*columns).order_by(table.c.id), db.connection())
+    return validate_sheet(spec, df)
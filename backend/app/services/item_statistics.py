@@ -0,0 +1,138 @@
+# Distribuição das respostas por pergunta (análise por item), mantida junto
+# com cada submissão.
+#
+# resultados_itens conta quantas vezes cada resposta foi dada a cada pergunta
+# por (teste_tipo, faixa_etaria, regiao_geografica). O submit soma as
+# respostas do resultado na mesma transação (upsert total = total + n), como
+# as contagens por risco. As consultas leem só essa tabela, sem abrir o JSON
+# de resultados_testes.
+#
+# "Em risco" não é gravado: sai das regras de pontuação na hora da consulta
+# (a resposta pontua naquela pergunta), então uma revisão das regras vale
+# sem recalcular a tabela. `rebuild_item_statistics` refaz tudo do zero
+# (python -m app.triagens rebuild-item-stats).
+from collections import Counter
+from collections.abc import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.answer_codec import stored_answers
+from app.services.core import CURRENT_RULES_VERSION, RULE_SETS
+from app.services.test_rollups import upsert_increments
+
+ITEM_KEYS = ("teste_tipo", "pergunta_id", "resposta", "faixa_etaria", "regiao_geografica")
+ITEM_GROUPS = ("faixa_etaria", "regiao_geografica")
+REBUILD_BATCH_SIZE = 5000
+
+
+def item_counts(teste_tipo: str, faixa_etaria: str, regiao_geografica: str, respostas: Iterable[dict]) -> Counter:
+    """Ocorrências de cada chave de ITEM_KEYS nas respostas de um resultado."""
+    # Cortados no tamanho das colunas: texto livre não pode derrubar o submit
+    return Counter(
+        (teste_tipo, str(item["pergunta_id"])[:32], str(item["resposta"]).lower()[:64], faixa_etaria, regiao_geografica)
+        for item in respostas
+    )
+
+
+def item_rows(counts: Counter) -> list[dict]:
+    """Linhas para o upsert, em ordem de chave (ver test_rollups.in_key_order)."""
+    return [{**dict(zip(ITEM_KEYS, key)), "total": total} for key, total in sorted(counts.items())]
+
+
+def increment_item_statistics(db: Session, counts: Counter) -> None:
+    """Soma as ocorrências nas estatísticas por item, na transação de `db`."""
+    upsert_increments(db, models.TestItemStatistic.__table__, list(ITEM_KEYS), item_rows(counts))
+
+
+def rebuild_item_statistics(db: Session, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Apaga e recalcula as estatísticas a partir de resultados_testes. Devolve quantos resultados foram lidos."""
+    result = models.TestResult
+    db.execute(models.TestItemStatistic.__table__.delete())
+    processed = last_id = 0
+    while True:
+        rows = db.execute(
+            select(
+                result.id, result.teste_tipo, result.faixa_etaria, result.regiao_geografica,
+                result.respostas, result.respostas_codificadas,
+            )
+            .where(result.id > last_id)
+            .order_by(result.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        counts: Counter = Counter()
+        for row in rows:
+            answers = stored_answers(row.teste_tipo, row.respostas, row.respostas_codificadas)
+            if isinstance(answers, list):
+                counts.update(item_counts(row.teste_tipo, row.faixa_etaria, row.regiao_geografica, answers))
+        increment_item_statistics(db, counts)
+        processed += len(rows)
+        last_id = rows[-1].id
+    return processed
+
+
+def _question_order(pergunta_id: str) -> tuple:
+    return (0, int(pergunta_id), "") if pergunta_id.isdigit() else (1, 0, pergunta_id)
+
+
+def query_item_statistics(
+    db: Session,
+    teste_tipo: str,
+    perguntas: list[str] | None = None,
+    group_by: list[str] | None = None,
+    faixa_etaria: list[str] | None = None,
+    regiao_geografica: list[str] | None = None,
+    rules_version: str = CURRENT_RULES_VERSION,
+) -> dict:
+    """
+    Distribuição das respostas e taxa de risco por pergunta de `teste_tipo`,
+    opcionalmente separadas por faixa etária e/ou região (`group_by`).
+    """
+    stat = models.TestItemStatistic
+    groups = list(dict.fromkeys(group_by or []))
+    group_columns = [getattr(stat, name) for name in groups]
+    stmt = (
+        select(stat.pergunta_id, *group_columns, stat.resposta, func.sum(stat.total).label("total"))
+        .where(stat.teste_tipo == teste_tipo)
+        .group_by(stat.pergunta_id, *group_columns, stat.resposta)
+    )
+    if perguntas:
+        stmt = stmt.where(stat.pergunta_id.in_(perguntas))
+    if faixa_etaria:
+        stmt = stmt.where(stat.faixa_etaria.in_(faixa_etaria))
+    if regiao_geografica:
+        stmt = stmt.where(stat.regiao_geografica.in_(regiao_geografica))
+
+    rules = RULE_SETS[rules_version].for_test(teste_tipo)
+    items: dict[tuple, dict] = {}
+    for row in db.execute(stmt).mappings():
+        total = int(row["total"] or 0)
+        if not total:
+            continue
+        key = (row["pergunta_id"], *(row[name] for name in groups))
+        item = items.setdefault(key, {
+            "pergunta_id": row["pergunta_id"],
+            **{name: row[name] for name in groups},
+            "total": 0,
+            "respostas": {},
+            "em_risco": 0,
+        })
+        item["total"] += total
+        item["respostas"][row["resposta"]] = item["respostas"].get(row["resposta"], 0) + total
+        if rules.item_points(row["pergunta_id"], row["resposta"]) > 0:
+            item["em_risco"] += total
+
+    ordered = sorted(items.values(), key=lambda item: (
+        _question_order(item["pergunta_id"]), *(item[name] for name in groups)
+    ))
+    for item in ordered:
+        item["taxa_risco"] = round(item["em_risco"] / item["total"], 4)
+    return {
+        "teste_tipo": teste_tipo,
+        "versao_regras": rules_version,
+        "agrupamento": groups,
+        "itens": ordered,
+    }
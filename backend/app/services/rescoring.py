@@ -0,0 +1,197 @@
+# Reclassificação em lote dos resultados gravados com uma versão das regras.
+#
+# Cada TestRules vira uma matriz pergunta × resposta → pontos (a última linha
+# vale para perguntas fora das regras e a última coluna para respostas
+# desconhecidas, que não pontuam). Um lote de resultados é achatado em dois
+# vetores de índices (pergunta, resposta) e o score de cada resultado sai de
+# uma soma por linha (bincount); os cortes são comparados de uma vez para o
+# lote inteiro.
+#
+# Os resultados são lidos em lotes por id (keyset) e só as linhas cujo score
+# ou classificação mudou são regravadas, junto com o score do registro
+# anonimizado e o ajuste das contagens por risco, na transação do lote. No fim,
+# se algum score mudou, o cubo de pesquisa é refeito (as faixas de score mudam).
+#
+# Só a versão atual (CURRENT_RULES_VERSION, a do submit) é gravada: com outra,
+# os resultados antigos e os novos ficariam em regras diferentes sem registro
+# disso. Outras versões servem só para o dry_run (prévia de uma revisão antes de
+# torná-la a atual).
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.answer_codec import stored_answers
+from app.services.core import CURRENT_RULES_VERSION, RULE_SETS, TestRules
+from app.services.research_cube import rebuild_research_cube
+from app.services.test_rollups import ROLLUP_KEYS, bulk_update, upsert_increments
+
+RESCORE_CHUNK_SIZE = 10000
+
+
+class RulesVersionNotCurrentError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class CompiledRules:
+    questions: dict[str, int]
+    answers: dict[str, int]
+    matrix: np.ndarray
+    cutoffs: np.ndarray
+    labels: np.ndarray
+    relative_cutoffs: bool
+
+
+def compile_rules(rules: TestRules) -> CompiledRules:
+    questions = {pergunta: index for index, pergunta in enumerate(sorted(rules.points))}
+    answer_names = {resposta for points in (*rules.points.values(), rules.default_points) for resposta in points}
+    answers = {resposta: index for index, resposta in enumerate(sorted(answer_names))}
+    matrix = np.zeros((len(questions) + 1, len(answers) + 1), dtype=np.int32)
+    for pergunta, points in rules.points.items():
+        for resposta, value in points.items():
+            matrix[questions[pergunta], answers[resposta]] = value
+    for resposta, value in rules.default_points.items():
+        matrix[-1, answers[resposta]] = value
+    return CompiledRules(
+        questions=questions,
+        answers=answers,
+        matrix=matrix,
+        cutoffs=np.array([minimum for minimum, _ in rules.cutoffs], dtype=np.float64),
+        labels=np.array([label for _, label in rules.cutoffs], dtype=object),
+        relative_cutoffs=rules.relative_cutoffs,
+    )
+
+
+def score_answers(compiled: CompiledRules, respostas: list[list[dict]]) -> tuple[np.ndarray, np.ndarray]:
+    """Scores e classificações de um lote de listas de respostas ({"pergunta_id", "resposta"})."""
+    counts = np.fromiter((len(items) for items in respostas), dtype=np.int64, count=len(respostas))
+    total = int(counts.sum())
+    other_question, other_answer = len(compiled.questions), len(compiled.answers)
+    question_index, answer_index = compiled.questions.get, compiled.answers.get
+    questions = np.fromiter(
+        (question_index(str(item["pergunta_id"]), other_question) for items in respostas for item in items),
+        dtype=np.intp, count=total,
+    )
+    answers = np.fromiter(
+        (answer_index(str(item["resposta"]).lower(), other_answer) for items in respostas for item in items),
+        dtype=np.intp, count=total,
+    )
+    rows = np.repeat(np.arange(len(respostas)), counts)
+    scores = np.bincount(rows, weights=compiled.matrix[questions, answers], minlength=len(respostas)).astype(np.int64)
+
+    if compiled.relative_cutoffs:
+        minimums = np.floor(compiled.cutoffs[np.newaxis, :] * counts[:, np.newaxis])
+    else:
+        minimums = compiled.cutoffs[np.newaxis, :]
+    # Cortes crescentes: quantos foram atingidos = posição da classificação
+    level = np.maximum((scores[:, np.newaxis] >= minimums).sum(axis=1) - 1, 0)
+    return scores, compiled.labels[level]
+
+
+@dataclass
+class RescoringReport:
+    version: str
+    dry_run: bool = False
+    processed: int = 0
+    # Linhas regravadas (score e/ou classificação)
+    changed: int = 0
+    score_changed: int = 0
+    # (teste_tipo, classificação anterior, nova) -> quantidade
+    shifts: Counter = field(default_factory=Counter)
+
+    @property
+    def reclassified(self) -> int:
+        return sum(self.shifts.values())
+
+
+def rescore_chunk(db: Session, compiled: dict[str, CompiledRules], rows: list, report: RescoringReport) -> None:
+    tipos = np.array([row.teste_tipo for row in rows], dtype=object)
+    scores = np.empty(len(rows), dtype=np.int64)
+    labels = np.empty(len(rows), dtype=object)
+    for teste_tipo in np.unique(tipos):
+        positions = np.flatnonzero(tipos == teste_tipo)
+        scores[positions], labels[positions] = score_answers(
+            compiled[teste_tipo],
+            [stored_answers(teste_tipo, rows[position].respostas, rows[position].respostas_codificadas) for position in positions],
+        )
+
+    old_scores = np.fromiter((row.score for row in rows), dtype=np.int64, count=len(rows))
+    old_labels = np.array([row.classificacao for row in rows], dtype=object)
+    score_changed = scores != old_scores
+    label_changed = labels != old_labels
+    changed = np.flatnonzero(score_changed | label_changed)
+
+    report.processed += len(rows)
+    report.changed += len(changed)
+    report.score_changed += int(score_changed.sum())
+    rollup_deltas: Counter = Counter()
+    for position in np.flatnonzero(label_changed):
+        row = rows[position]
+        report.shifts[(row.teste_tipo, row.classificacao, labels[position])] += 1
+        rollup_deltas[(row.teste_tipo, row.classificacao, row.faixa_etaria, row.regiao_geografica)] -= 1
+        rollup_deltas[(row.teste_tipo, labels[position], row.faixa_etaria, row.regiao_geografica)] += 1
+    if report.dry_run or not len(changed):
+        return
+
+    bulk_update(db, models.TestResult.__table__, "id", [
+        {"id": rows[position].id, "score": int(scores[position]), "classificacao": labels[position]}
+        for position in changed
+    ])
+    bulk_update(db, models.AnonymisedRecord.__table__, "resultado_id", [
+        {"resultado_id": rows[position].id, "score": int(scores[position])}
+        for position in np.flatnonzero(score_changed)
+    ])
+    upsert_increments(db, models.TestResultRollup.__table__, list(ROLLUP_KEYS), [
+        {**dict(zip(ROLLUP_KEYS, key)), "total": delta} for key, delta in rollup_deltas.items() if delta
+    ])
+
+
+def rescore_results(
+    db: Session,
+    version: str = CURRENT_RULES_VERSION,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> RescoringReport:
+    """
+    Recalcula score e classificação de todos os resultados com as regras `version`.
+
+    Commita a cada lote (um job longo não segura uma transação só). Com
+    `dry_run`, só conta o que mudaria; é o único modo aceito para uma
+    versão diferente de CURRENT_RULES_VERSION.
+    """
+    if version != CURRENT_RULES_VERSION and not dry_run:
+        raise RulesVersionNotCurrentError(
+            f"O submit usa as regras {CURRENT_RULES_VERSION}; a versão {version} só pode ser simulada (dry_run)"
+        )
+    rule_set = RULE_SETS[version]
+    compiled = {}
+    result = models.TestResult
+    report = RescoringReport(version=version, dry_run=dry_run)
+    last_id = 0
+    while True:
+        stmt = (
+            select(
+                result.id, result.teste_tipo, result.respostas, result.respostas_codificadas, result.score, result.classificacao,
+                result.faixa_etaria, result.regiao_geografica,
+            )
+            .where(result.id > last_id)
+            .order_by(result.id)
+            .limit(chunk_size)
+        )
+        rows = db.execute(stmt).all()
+        if not rows:
+            break
+        for teste_tipo in {row.teste_tipo for row in rows} - compiled.keys():
+            compiled[teste_tipo] = compile_rules(rule_set.for_test(teste_tipo))
+        rescore_chunk(db, compiled, rows, report)
+        last_id = rows[-1].id
+        if not dry_run:
+            db.commit()
+    if report.score_changed and not dry_run:
+        rebuild_research_cube(db)
+        db.commit()
+    return report
@@ -0,0 +1,210 @@
+# Cubo de agregados sobre os registros anonimizados (pesquisa).
+#
+# cubo_pesquisa guarda contagem e soma de score por célula
+# teste_tipo × faixa_etaria × regiao_geografica × mês × faixa de score. A
+# atualização é incremental: lê só os registros ainda não somados
+# (no_cubo IS NULL), agrega o lote em pandas, soma nas células com upsert e
+# marca esses registros, tudo na mesma transação. Uma marca por registro, e
+# não uma marca d'água por id: com submits concorrentes (lotes, commits
+# agrupados) um id menor pode commitar depois de um maior já somado, e ele
+# entra na atualização seguinte. As consultas agregam as células (nunca a
+# tabela bruta) pelas dimensões pedidas e só leem: a atualização roda numa
+# thread de fundo a cada `research_cube_refresh_seconds` (iniciada no startup)
+# e pela CLI (python -m app.triagens refresh-cube).
+#
+# As células guardadas têm a contagem exata (senão não daria para somar os
+# próximos lotes). A supressão vale para essas células-base: uma com menos de
+# `research_min_cell_size` casos não entra em soma nenhuma. Todo total servido
+# (qualquer combinação de dimensões, filtros e período) é soma só de
+# células-base publicáveis, então subtrair uma consulta de outra nunca
+# reconstrói uma célula suprimida nem a soma de scores dela. Uma combinação sem
+# nenhuma célula publicável sai marcada como suprimida, sem contagem nem média.
+import logging
+import threading
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+import app.database as database
+from app import models
+from app.config import get_settings
+from app.services.core import score_band
+from app.services.test_rollups import upsert_increments
+
+settings = get_settings()
+logger = logging.getLogger("uvicorn.error")
+
+CUBE_DIMENSIONS = ("teste_tipo", "faixa_etaria", "regiao_geografica", "mes", "faixa_score")
+REFRESH_BATCH_SIZE = 5000
+_STATE_ID = 1
+
+
+def _cube_state(db: Session) -> models.ResearchCubeState:
+    # FOR UPDATE: duas atualizações simultâneas não somam o mesmo lote duas vezes
+    state = db.get(models.ResearchCubeState, _STATE_ID, with_for_update=True)
+    if state is None:
+        state = models.ResearchCubeState(id=_STATE_ID)
+        db.add(state)
+        db.flush()
+    return state
+
+
+def aggregate_records(records: pd.DataFrame) -> list[dict]:
+    """Linhas de registros anonimizados → incrementos por célula do cubo."""
+    records = records.assign(mes=pd.to_datetime(records["criado_em"]).dt.strftime("%Y-%m"))
+    # A faixa depende só de (tipo, score): calcula uma vez por par distinto
+    pairs = records[["teste_tipo", "score"]].drop_duplicates()
+    pairs["faixa_score"] = [score_band(tipo, int(score)) for tipo, score in pairs.itertuples(index=False)]
+    records = records.merge(pairs, on=["teste_tipo", "score"], how="left")
+    cells = (
+        records.groupby(list(CUBE_DIMENSIONS), sort=False)
+        .agg(total=("score", "size"), score_soma=("score", "sum"))
+        .reset_index()
+    )
+    return [
+        {**row, "total": int(row["total"]), "score_soma": int(row["score_soma"])}
+        for row in cells.to_dict("records")
+    ]
+
+
+def refresh_research_cube(db: Session) -> int:
+    """Soma no cubo os registros anonimizados ainda não somados. Devolve quantos registros entraram."""
+    record = models.AnonymisedRecord
+    table = models.ResearchCubeCell.__table__
+    state = _cube_state(db)
+    processed = last_id = 0
+    while True:
+        stmt = (
+            select(record.id, record.teste_tipo, record.faixa_etaria, record.regiao_geografica, record.score, record.criado_em)
+            .where(record.no_cubo.is_(None), record.id > last_id)
+            .order_by(record.id)
+            .limit(REFRESH_BATCH_SIZE)
+        )
+        batch = pd.DataFrame(db.execute(stmt).mappings().all())
+        if batch.empty:
+            break
+        upsert_increments(db, table, list(CUBE_DIMENSIONS), aggregate_records(batch))
+        # Marca pelos ids lidos (não por faixa): um registro que commitar no
+        # meio do lote fica pendente em vez de marcado sem ter sido somado
+        ids = [int(value) for value in batch["id"]]
+        db.execute(update(record).where(record.id.in_(ids)).values(no_cubo=True))
+        last_id = ids[-1]
+        processed += len(ids)
+    state.atualizado_em = datetime.utcnow()
+    return processed
+
+
+def rebuild_research_cube(db: Session) -> int:
+    """Zera o cubo e as marcas dos registros e soma todos de novo."""
+    record = models.AnonymisedRecord
+    _cube_state(db)
+    db.execute(models.ResearchCubeCell.__table__.delete())
+    db.execute(update(record).where(record.no_cubo.is_not(None)).values(no_cubo=None))
+    return refresh_research_cube(db)
+
+
+class CubeRefresher:
+    """Thread que atualiza o cubo a cada `interval` segundos, com sessão própria."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="research-cube-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def refresh_once(self) -> int:
+        assert database.SessionLocal is not None, "SessionLocal não inicializada"
+        with database.SessionLocal() as db:
+            processed = refresh_research_cube(db)
+            db.commit()
+        return processed
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                processed = self.refresh_once()
+            except Exception:
+                # Tenta de novo no próximo intervalo
+                logger.exception("❌ Atualização do cubo de pesquisa falhou")
+                continue
+            if processed:
+                logger.info("Cubo de pesquisa: %d registros somados", processed)
+
+
+cube_refresher = CubeRefresher(settings.research_cube_refresh_seconds)
+
+
+def query_cube(
+    db: Session,
+    dimensions: list[str],
+    filters: dict[str, list[str]] | None = None,
+    mes_inicio: str | None = None,
+    mes_fim: str | None = None,
+    min_cell_size: int | None = None,
+) -> dict:
+    """
+    Agrega as células do cubo pelas `dimensions` pedidas (as demais somem na soma).
+
+    `filters` restringe cada dimensão a uma lista de valores; `mes_inicio` e
+    `mes_fim` ("AAAA-MM") delimitam o período, inclusive. Células-base com
+    menos de `min_cell_size` casos ficam fora de todas as somas.
+    """
+    cell = models.ResearchCubeCell
+    min_cell_size = settings.research_min_cell_size if min_cell_size is None else min_cell_size
+    columns = [getattr(cell, name) for name in dict.fromkeys(dimensions)]
+    publishable = cell.total >= min_cell_size
+    stmt = select(
+        *columns,
+        func.sum(case((publishable, cell.total), else_=0)).label("total"),
+        func.sum(case((publishable, cell.score_soma), else_=0)).label("score_soma"),
+        func.sum(case((cell.total > 0, 1), else_=0)).label("ocupadas"),
+    )
+    for name, values in (filters or {}).items():
+        if values:
+            stmt = stmt.where(getattr(cell, name).in_(values))
+    if mes_inicio:
+        stmt = stmt.where(cell.mes >= mes_inicio)
+    if mes_fim:
+        stmt = stmt.where(cell.mes <= mes_fim)
+    if columns:
+        stmt = stmt.group_by(*columns).order_by(*columns)
+
+    cells = []
+    for row in db.execute(stmt).mappings():
+        if not row["ocupadas"]:
+            continue
+        total = int(row["total"] or 0)
+        # Só células-base suprimidas na combinação
+        suppressed = not total
+        cells.append({
+            **{name: row[name] for name in dict.fromkeys(dimensions)},
+            "total": None if suppressed else total,
+            "score_medio": None if suppressed else round(row["score_soma"] / total, 2),
+            "suprimida": suppressed,
+        })
+
+    state = db.get(models.ResearchCubeState, _STATE_ID)
+    return {
+        "dimensoes": list(dict.fromkeys(dimensions)),
+        "min_celula": min_cell_size,
+        "atualizado_em": state.atualizado_em if state else None,
+        "celulas": cells,
+    }
@@ -0,0 +1,206 @@
+# Exportação completa dos registros anonimizados em streaming.
+#
+# A consulta roda com cursor do lado do servidor (yield_per): o banco entrega
+# as linhas em lotes de EXPORT_BATCH_SIZE e cada lote vira um bloco da
+# resposta antes do próximo ser lido, então a memória não cresce com o
+# tamanho da exportação. Formatos (pelo Accept):
+#   - NDJSON: um objeto por linha (padrão, e para application/*);
+#   - CSV: com cabeçalho (também para text/*);
+#   - Parquet: um row group por lote, comprimido (zstd); o rodapé sai no fim.
+# NDJSON e CSV são comprimidos em trânsito pelo CompressionMiddleware.
+#
+# A ordem é por id e `after` retoma depois do último id recebido. O maior id
+# no início da exportação fica fixo (cabeçalho X-Export-Max-Id): registros
+# que chegam durante a exportação ficam para a próxima.
+import csv
+import io
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+
+import app.database as database
+from app import models
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_MAX_ID_HEADER = "X-Export-Max-Id"
+
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+PARQUET = "application/vnd.apache.parquet"
+# Outros nomes usados para Parquet
+PARQUET_ALIASES = ("application/parquet", "application/x-parquet")
+
+EXPORT_COLUMNS = ("id", "teste_tipo", "faixa_etaria", "regiao_geografica", "score", "criado_em")
+
+
+class UnsupportedExportFormat(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    media_type: str
+    extension: str
+
+
+EXPORT_FORMATS = {
+    NDJSON: ExportFormat(NDJSON, "ndjson"),
+    CSV: ExportFormat(f"{CSV}; charset=utf-8", "csv"),
+    PARQUET: ExportFormat(PARQUET, "parquet"),
+}
+
+
+# Faixas genéricas do Accept -> formatos que cobrem
+_WILDCARDS = {
+    "*/*": (NDJSON, CSV, PARQUET),
+    "application/*": (NDJSON,),
+    "text/*": (CSV,),
+}
+
+
+def _accept_ranges(accept: str) -> Iterator[tuple[str, float]]:
+    """(faixa, q) de cada item do Accept; q inválido conta como 0."""
+    for part in accept.split(","):
+        media_range, *params = (piece.strip() for piece in part.split(";"))
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        yield media_range.lower(), q
+
+
+def negotiate_export_format(accept: str) -> str:
+    """
+    Formato de maior q no Accept; a ordem do servidor (NDJSON, CSV, Parquet)
+    só desempata. Um tipo exato vale mais que "text/*" ou "application/*",
+    que valem mais que "*/*" (ex.: "*/*, text/csv;q=0" exclui o CSV).
+    """
+    # formato -> (especificidade da faixa que o cobre, q)
+    quality: dict[str, tuple[int, float]] = {}
+
+    def offer(media_type: str, specificity: int, q: float) -> None:
+        if media_type not in quality or specificity > quality[media_type][0]:
+            quality[media_type] = (specificity, q)
+
+    for media_range, q in _accept_ranges(accept or "*/*"):
+        if media_range in PARQUET_ALIASES:
+            media_range = PARQUET
+        if media_range in EXPORT_FORMATS:
+            offer(media_range, 2, q)
+        for media_type in _WILDCARDS.get(media_range, ()):
+            offer(media_type, 0 if media_range == "*/*" else 1, q)
+
+    server_order = list(EXPORT_FORMATS)
+    candidates = [(q, -server_order.index(media_type), media_type) for media_type, (_, q) in quality.items() if q > 0]
+    if not candidates:
+        raise UnsupportedExportFormat(f"Formatos disponíveis: {', '.join(EXPORT_FORMATS)}")
+    return max(candidates)[2]
+
+
+def export_max_id() -> int:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        return db.execute(select(func.max(models.AnonymisedRecord.id))).scalar() or 0
+
+
+def iter_record_batches(after: int, max_id: int) -> Iterator[list[tuple]]:
+    """Lotes de linhas (tuplas em EXPORT_COLUMNS) com after < id <= max_id, em ordem de id."""
+    record = models.AnonymisedRecord
+    stmt = (
+        select(*(getattr(record, name) for name in EXPORT_COLUMNS))
+        .where(record.id > after, record.id <= max_id)
+        .order_by(record.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    # Sessão própria: a da requisição já foi fechada quando o corpo começa a sair
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        for partition in db.execute(stmt).partitions():
+            yield [tuple(row) for row in partition]
+
+
+def _ndjson_chunks(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in batch)
+
+
+def _csv_chunks(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows((*row[:-1], row[-1].isoformat()) for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Arquivo só de escrita que acumula o que o ParquetWriter escreve até alguém drenar."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("teste_tipo", pa.string()),
+        ("faixa_etaria", pa.string()),
+        ("regiao_geografica", pa.string()),
+        ("score", pa.int32()),
+        ("criado_em", pa.timestamp("us")),
+    ])
+
+
+def _parquet_chunks(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    # Rodapé (metadados dos row groups)
+    yield sink.drain()
+
+
+_ENCODERS = {NDJSON: _ndjson_chunks, CSV: _csv_chunks, PARQUET: _parquet_chunks}
+
+
+def stream_export(media_type: str, after: int, max_id: int) -> Iterator[bytes]:
+    return _ENCODERS[media_type](iter_record_batches(after, max_id))
@@ -0,0 +1,151 @@
+# Listagem do painel do especialista com filtros e paginação no SQL.
+#
+# Um único SELECT com JOIN em testados traz só as colunas que a tabela do
+# painel mostra (sem carregar objetos nem disparar uma consulta por
+# resultado). A ordem é sempre (criado_em, id), coberta pelos índices
+# compostos de TestResult, e a paginação é por keyset nesse par:
+# WHERE (criado_em, id) < (cursor) ORDER BY criado_em DESC, id DESC LIMIT n.
+# O cursor é opaco para o cliente (base64 de "criado_em|id").
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+@dataclass
+class DashboardFilters:
+    risco: str | None = None
+    teste_tipo: str | None = None
+    faixa_etaria: str | None = None
+    regiao_geografica: str | None = None
+    regiao_bairro: str | None = None
+    inicio: date | None = None
+    fim: date | None = None
+
+
+def encode_cursor(criado_em: datetime, result_id: int) -> str:
+    raw = f"{criado_em.isoformat()}|{result_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        criado_em, result_id = raw.split("|")
+        return datetime.fromisoformat(criado_em), int(result_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursorError("Cursor inválido") from exc
+
+
+def dashboard_conditions(filters: DashboardFilters) -> list:
+    result, testado = models.TestResult, models.TestedIndividual
+    conditions = []
+    if filters.risco:
+        conditions.append(result.classificacao == filters.risco)
+    if filters.teste_tipo:
+        conditions.append(result.teste_tipo == filters.teste_tipo)
+    if filters.faixa_etaria:
+        conditions.append(result.faixa_etaria == filters.faixa_etaria)
+    if filters.regiao_geografica:
+        conditions.append(result.regiao_geografica == filters.regiao_geografica)
+    if filters.regiao_bairro:
+        conditions.append(func.lower(testado.regiao_bairro) == filters.regiao_bairro.lower())
+    if filters.inicio:
+        conditions.append(result.criado_em >= datetime.combine(filters.inicio, time.min))
+    if filters.fim:
+        # Dia final inteiro
+        conditions.append(result.criado_em < datetime.combine(filters.fim + timedelta(days=1), time.min))
+    return conditions
+
+
+def list_dashboard_patients(
+    db: Session,
+    filters: DashboardFilters,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """Uma página de resultados (mais recentes primeiro) e o cursor da próxima (ou None)."""
+    result, testado = models.TestResult, models.TestedIndividual
+    stmt = (
+        select(
+            result.id,
+            result.criado_em.label("data"),
+            result.faixa_etaria,
+            result.classificacao.label("risco"),
+            result.teste_tipo,
+            testado.nome_completo,
+            testado.regiao_bairro,
+            testado.contato_telefone.label("contato_principal"),
+        )
+        .join(testado, result.testado_id == testado.id)
+        .where(*dashboard_conditions(filters))
+        .order_by(result.criado_em.desc(), result.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(result.criado_em, result.id) < tuple_(*decode_cursor(cursor)))
+
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["data"], rows[-1]["id"])
+    for row in rows:
+        del row["id"]
+    return rows, next_cursor
+
+
+
+def dashboard_charts(db: Session, filters: DashboardFilters, top_bairros: int = 5) -> dict:
+    """
+    Agregados dos gráficos do painel sobre todos os resultados que passam nos
+    filtros (não só a página carregada): por risco, por faixa etária × risco,
+    bairros com mais casos de risco alto e totais por dia.
+    """
+    result, testado = models.TestResult, models.TestedIndividual
+    conditions = dashboard_conditions(filters)
+
+    def grouped(*columns, extra=()):
+        return (
+            select(*columns, func.count(result.id).label("total"))
+            .select_from(result)
+            .join(testado, result.testado_id == testado.id)
+            .where(*conditions, *extra)
+            .group_by(*columns)
+        )
+
+    por_risco: dict[str, int] = {}
+    por_faixa: dict[str, dict] = {}
+    for faixa, risco, total in db.execute(grouped(result.faixa_etaria, result.classificacao)):
+        por_risco[risco] = por_risco.get(risco, 0) + total
+        por_faixa.setdefault(faixa, {"faixa": faixa})[risco] = total
+
+    bairro = testado.regiao_bairro
+    bairros = db.execute(
+        grouped(bairro, extra=(result.classificacao == "Alto",))
+        .order_by(func.count(result.id).desc(), bairro)
+        .limit(top_bairros)
+    ).all()
+
+    dia = func.date(result.criado_em)
+    alto = func.sum(case((result.classificacao == "Alto", 1), else_=0))
+    por_data = db.execute(grouped(dia).add_columns(alto.label("alto")).order_by(dia)).all()
+
+    return {
+        "por_risco": por_risco,
+        "por_faixa": list(por_faixa.values()),
+        "bairros_alto_risco": [{"regiao_bairro": nome, "total": total} for nome, total in bairros],
+        "por_data": [{"data": str(data), "total": total, "alto": int(alto or 0)} for data, total, alto in por_data],
+    }
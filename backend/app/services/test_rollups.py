@@ -0,0 +1,104 @@
+# Contagens de resultados por (teste_tipo, classificacao, faixa_etaria,
+# regiao_geografica), mantidas junto com cada submissão.
+#
+# O submit soma 1 na linha da combinação dentro da mesma transação do
+# resultado (upsert com total = total + 1, sem ler antes), então a contagem
+# nunca fica à frente nem atrás dos resultados gravados. Os totais do painel
+# saem de algumas dezenas de linhas em vez de varrer resultados_testes.
+# `rebuild_rollups` recalcula tudo do zero (python -m app.triagens rebuild-rollups).
+from collections import Counter
+from collections.abc import Iterable
+
+from sqlalchemy import bindparam, column, func, insert, select, update, values
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+ROLLUP_KEYS = ("teste_tipo", "classificacao", "faixa_etaria", "regiao_geografica")
+
+_UPSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def rollup_key(resultado) -> tuple[str, str, str, str]:
+    return tuple(getattr(resultado, key) for key in ROLLUP_KEYS)
+
+
+def in_key_order(rows: list[dict], keys: Iterable[str]) -> list[dict]:
+    """
+    `rows` ordenadas pela chave. Transações que escrevem nas mesmas linhas
+    (lotes, commits agrupados) travam na mesma ordem, sem deadlock no PostgreSQL.
+    """
+    keys = list(keys)
+    return sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+
+
+def upsert_increments(db: Session, table, keys: list[str], rows: list[dict]) -> None:
+    """Soma as colunas não-chave de `rows` nas linhas de mesma chave (cria as que faltam)."""
+    if not rows:
+        return
+    rows = in_key_order(rows, keys)
+    amounts = [column for column in rows[0] if column not in keys]
+    upsert = _UPSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: table.c[column] + stmt.excluded[column] for column in amounts},
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Outros bancos: UPDATE e, se a linha ainda não existe, INSERT
+    for row in rows:
+        where = [table.c[key] == row[key] for key in keys]
+        values = {column: table.c[column] + row[column] for column in amounts}
+        if not db.execute(update(table).where(*where).values(**values)).rowcount:
+            db.execute(insert(table).values(**row))
+
+
+def bulk_update(db: Session, table, key: str, rows: list[dict]) -> None:
+    """UPDATE por chave de várias linhas: um UPDATE ... FROM (VALUES ...) no PostgreSQL, executemany nos demais."""
+    if not rows:
+        return
+    names = [name for name in rows[0] if name != key]
+    if db.get_bind().dialect.name == "postgresql":
+        types = {name: table.c[name].type for name in rows[0]}
+        source = values(*(column(name, types[name]) for name in rows[0]), name="novos").data(
+            [tuple(row.values()) for row in rows]
+        )
+        db.execute(update(table).where(table.c[key] == source.c[key]).values({name: source.c[name] for name in names}))
+        return
+    stmt = update(table).where(table.c[key] == bindparam(f"b_{key}")).values(
+        {name: bindparam(f"b_{name}") for name in names}
+    )
+    db.execute(stmt, [{f"b_{name}": value for name, value in row.items()} for row in rows])
+
+
+def increment_rollups(db: Session, keys: Iterable[tuple[str, str, str, str]]) -> None:
+    """Soma uma ocorrência por chave (pode repetir) nas contagens, na transação de `db`."""
+    rows = [{**dict(zip(ROLLUP_KEYS, key)), "total": delta} for key, delta in Counter(keys).items()]
+    upsert_increments(db, models.TestResultRollup.__table__, list(ROLLUP_KEYS), rows)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Apaga e recalcula todas as contagens a partir de resultados_testes. Devolve o número de linhas."""
+    table = models.TestResultRollup.__table__
+    result = models.TestResult
+    columns = [getattr(result, key) for key in ROLLUP_KEYS]
+    db.execute(table.delete())
+    db.execute(
+        insert(table).from_select(
+            [*ROLLUP_KEYS, "total"],
+            select(*columns, func.count()).group_by(*columns),
+        )
+    )
+    return db.execute(select(func.count()).select_from(table)).scalar_one()
+
+
+def risk_totals(db: Session) -> dict[str, int]:
+    """Total de resultados por classificação, somando as contagens."""
+    rollup = models.TestResultRollup
+    stmt = select(rollup.classificacao, func.sum(rollup.total)).group_by(rollup.classificacao)
+    return {classificacao: int(total) for classificacao, total in db.execute(stmt) if total}
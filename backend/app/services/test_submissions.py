@@ -0,0 +1,521 @@
+# Gravação de resultados de testes: submissão única e em lote.
+#
+# As duas confiam na unicidade do banco (uq_resultado_testado_tipo) em vez de
+# consultar antes de inserir: o INSERT usa ON CONFLICT DO NOTHING RETURNING e
+# um resultado que não volta é um duplicado, mesmo com requisições
+# simultâneas.
+#
+# Submissão única no PostgreSQL: um só comando com CTEs (busca do testado,
+# insert do resultado, do registro anonimizado, da contagem, das estatísticas
+# por item e da Idempotency-Key) + o commit, duas idas ao banco. Nos outros bancos os mesmos
+# passos rodam em sequência na mesma transação. Com Idempotency-Key, uma
+# repetição da requisição devolve o resultado já gravado sem escrever nada.
+#
+# Em lote (campanhas em escolas, clínicas) e no agrupamento de commits
+# (test_write_coalescing), write_submissions grava muitas submissões com um
+# comando por etapa em vez de uma ida ao banco por item:
+#   - um SELECT das Idempotency-Keys informadas;
+#   - um SELECT ... WHERE documento_cpf IN (...) para os testados;
+#   - um INSERT de várias linhas em resultados_testes (RETURNING id) e outros
+#     em registros_anonimizados, chaves, contagens e estatísticas por item;
+#   - um commit.
+# Cada submissão recebe seu próprio resultado ou erro (CPF desconhecido,
+# duplicado, chave reutilizada), sem derrubar as outras.
+import hashlib
+import json
+from collections import Counter
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from sqlalchemy import cast, column, exists, func, insert, literal, select, true, tuple_
+from sqlalchemy import values as sql_values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import app.database as database
+from app import models, schemas
+from app.config import get_settings
+from app.services.answer_codec import storage_values, stored_answers
+from app.services.core import classify_orientation, compute_test_score
+from app.services.item_statistics import ITEM_KEYS, increment_item_statistics, item_counts, item_rows
+from app.services.test_rollups import ROLLUP_KEYS, in_key_order, increment_rollups
+from app.services.write_coalescer import WriteCoalescer
+
+settings = get_settings()
+
+CREATED = "criado"
+UNKNOWN_CPF = "cpf_nao_cadastrado"
+DUPLICATE = "duplicado"
+
+_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+class TestedNotFoundError(ValueError):
+    pass
+
+
+class DuplicateResultError(ValueError):
+    pass
+
+
+class IdempotencyKeyReusedError(ValueError):
+    pass
+
+
+@dataclass
+class SubmissionOutcome:
+    resultado: schemas.TestResultResponse
+    mensagem_orientacao: str
+    # True quando a Idempotency-Key já tinha sido usada e nada foi gravado agora
+    replayed: bool = False
+
+
+def _insert_ignoring_duplicates(db: Session, table):
+    dialect_insert = _INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=["testado_id", "teste_tipo"])
+
+
+def request_hash(cpf: str, payload: schemas.TestResultCreate) -> str:
+    body = json.dumps([cpf, payload.model_dump(mode="json")], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+@dataclass
+class _Submission:
+    cpf: str
+    usuario_id: int
+    payload: schemas.TestResultCreate
+    score: int
+    classificacao: str
+    criado_em: datetime
+    idempotency_key: str | None
+    request_hash: str
+
+    @property
+    def respostas(self) -> list[dict]:
+        return [answer.model_dump() for answer in self.payload.respostas]
+
+    def result_values(self) -> dict:
+        return {
+            "usuario_id": self.usuario_id,
+            "teste_tipo": self.payload.teste_tipo,
+            **storage_values(self.payload.teste_tipo, self.respostas),
+            "score": self.score,
+            "classificacao": self.classificacao,
+            "faixa_etaria": self.payload.faixa_etaria,
+            "regiao_geografica": self.payload.regiao_geografica,
+            "criado_em": self.criado_em,
+        }
+
+    def anonymised_values(self) -> dict:
+        return {
+            "faixa_etaria": self.payload.faixa_etaria,
+            "regiao_geografica": self.payload.regiao_geografica,
+            "score": self.score,
+            "teste_tipo": self.payload.teste_tipo,
+            "criado_em": self.criado_em,
+        }
+
+    def rollup_values(self) -> dict:
+        return {
+            "teste_tipo": self.payload.teste_tipo,
+            "classificacao": self.classificacao,
+            "faixa_etaria": self.payload.faixa_etaria,
+            "regiao_geografica": self.payload.regiao_geografica,
+        }
+
+    def item_counts(self) -> Counter:
+        return item_counts(
+            self.payload.teste_tipo, self.payload.faixa_etaria, self.payload.regiao_geografica, self.respostas
+        )
+
+    def outcome(self, result_id: int) -> SubmissionOutcome:
+        return SubmissionOutcome(
+            resultado=schemas.TestResultResponse(
+                id=result_id,
+                score=self.score,
+                classificacao=self.classificacao,
+                criado_em=self.criado_em,
+                teste_tipo=self.payload.teste_tipo,
+                faixa_etaria=self.payload.faixa_etaria,
+                regiao_geografica=self.payload.regiao_geografica,
+                respostas=self.payload.respostas,
+            ),
+            mensagem_orientacao=classify_orientation(self.classificacao, self.payload.teste_tipo),
+        )
+
+
+def _literals(values: dict, table) -> list:
+    # CAST explícito: no INSERT ... SELECT o Postgres trataria o parâmetro como text
+    return [cast(literal(value, type_=table.c[name].type), table.c[name].type).label(name) for name, value in values.items()]
+
+
+def _replay(db: Session, submission: _Submission, result_id: int, stored_hash: str) -> SubmissionOutcome:
+    if stored_hash != submission.request_hash:
+        raise IdempotencyKeyReusedError("Idempotency-Key já usada com outro conteúdo")
+    resultado = db.get(models.TestResult, result_id)
+    return SubmissionOutcome(
+        resultado=schemas.TestResultResponse.model_validate({
+            **{name: getattr(resultado, name) for name in schemas.TestResultResponse.model_fields},
+            "respostas": stored_answers(resultado.teste_tipo, resultado.respostas, resultado.respostas_codificadas),
+        }),
+        mensagem_orientacao=classify_orientation(resultado.classificacao, resultado.teste_tipo),
+        replayed=True,
+    )
+
+
+def _previous_key(db: Session, submission: _Submission):
+    key = models.IdempotencyKey
+    return db.execute(
+        select(key.resultado_id, key.requisicao_hash).where(
+            key.usuario_id == submission.usuario_id, key.chave == submission.idempotency_key
+        )
+    ).first()
+
+
+def _submit_postgresql(db: Session, submission: _Submission) -> SubmissionOutcome:
+    """Um único comando: cada passo é uma CTE que depende da anterior."""
+    testado = models.TestedIndividual
+    results = models.TestResult.__table__
+    anonymised = models.AnonymisedRecord.__table__
+    rollups = models.TestResultRollup.__table__
+    items = models.TestItemStatistic.__table__
+    keys = models.IdempotencyKey.__table__
+
+    target = (
+        select(testado.id, testado.consentimento_pesquisa)
+        .where(testado.documento_cpf == submission.cpf)
+        .cte("testado")
+    )
+    previous = (
+        select(keys.c.resultado_id, keys.c.requisicao_hash)
+        .where(keys.c.usuario_id == submission.usuario_id, keys.c.chave == submission.idempotency_key)
+        .cte("anterior")
+    )
+    values = submission.result_values()
+    inserted = (
+        postgresql_insert(results)
+        .from_select(
+            ["testado_id", *values],
+            select(target.c.id, *_literals(values, results)).where(~exists(select(previous.c.resultado_id))),
+        )
+        .on_conflict_do_nothing(index_elements=["testado_id", "teste_tipo"])
+        .returning(results.c.id)
+        .cte("resultado")
+    )
+    values = submission.anonymised_values()
+    anonymised_cte = (
+        insert(anonymised)
+        .from_select(
+            ["resultado_id", *values],
+            select(inserted.c.id, *_literals(values, anonymised))
+            .select_from(inserted.join(target, true()))
+            .where(target.c.consentimento_pesquisa),
+        )
+        .returning(anonymised.c.id)
+        .cte("anonimizado")
+    )
+    values = submission.rollup_values()
+    rollup_insert = postgresql_insert(rollups).from_select(
+        [*values, "total"],
+        select(*_literals(values, rollups), literal(1).label("total")).select_from(inserted),
+    )
+    rollup_cte = (
+        rollup_insert.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEYS),
+            set_={"total": rollups.c.total + rollup_insert.excluded.total},
+        )
+        .returning(rollups.c.id)
+        .cte("contagem")
+    )
+    # O Postgres executa toda CTE de escrita, mas o SQLAlchemy só emite as
+    # que aparecem na consulta final: por isso as contagens abaixo
+    written = [
+        select(func.count()).select_from(anonymised_cte).scalar_subquery().label("anonimizados"),
+        select(func.count()).select_from(rollup_cte).scalar_subquery().label("contagens"),
+    ]
+    rows = item_rows(submission.item_counts())
+    if rows:
+        answered = sql_values(
+            *(column(name, items.c[name].type) for name in [*ITEM_KEYS, "total"]), name="respondidos"
+        ).data([tuple(row.values()) for row in rows])
+        item_insert = postgresql_insert(items).from_select(
+            [*ITEM_KEYS, "total"],
+            # Em ordem de chave, como os lotes (in_key_order compara code
+            # points, o que equivale à collation "C"): travas na mesma ordem
+            select(*answered.c)
+            .select_from(answered.join(inserted, true()))
+            .order_by(*(answered.c[name].collate("C") for name in ITEM_KEYS)),
+        )
+        item_cte = (
+            item_insert.on_conflict_do_update(
+                index_elements=list(ITEM_KEYS),
+                set_={"total": items.c.total + item_insert.excluded.total},
+            )
+            .returning(items.c.id)
+            .cte("itens")
+        )
+        written.append(select(func.count()).select_from(item_cte).scalar_subquery().label("itens"))
+    if submission.idempotency_key is not None:
+        key_cte = (
+            postgresql_insert(keys)
+            .from_select(
+                ["usuario_id", "chave", "requisicao_hash", "resultado_id", "criado_em"],
+                select(
+                    literal(submission.usuario_id),
+                    literal(submission.idempotency_key),
+                    literal(submission.request_hash),
+                    inserted.c.id,
+                    literal(submission.criado_em),
+                ),
+            )
+            .returning(keys.c.id)
+            .cte("chave")
+        )
+        written.append(select(func.count()).select_from(key_cte).scalar_subquery().label("chaves"))
+
+    row = db.execute(
+        select(
+            select(target.c.id).scalar_subquery().label("testado_id"),
+            select(inserted.c.id).scalar_subquery().label("resultado_id"),
+            select(previous.c.resultado_id).scalar_subquery().label("anterior_id"),
+            select(previous.c.requisicao_hash).scalar_subquery().label("anterior_hash"),
+            *written,
+        )
+    ).one()
+
+    if row.anterior_id is not None:
+        return _replay(db, submission, row.anterior_id, row.anterior_hash)
+    if row.testado_id is None:
+        raise TestedNotFoundError("CPF não cadastrado para triagem")
+    if row.resultado_id is None:
+        raise DuplicateResultError("Já existe teste para este CPF e tipo")
+    db.commit()
+    return submission.outcome(row.resultado_id)
+
+
+def write_submissions(db: Session, submissions: list[_Submission]) -> list[SubmissionOutcome | Exception]:
+    """
+    Grava várias submissões na transação de `db` com um comando por etapa
+    (sem commit). Devolve, na ordem, o resultado ou o erro de cada uma.
+    """
+    outcomes: list[SubmissionOutcome | Exception | None] = [None] * len(submissions)
+    # Mesma Idempotency-Key repetida no lote: resolvida depois, com o resultado da primeira
+    followers: dict[int, int] = {}
+
+    keyed = {}
+    for index, submission in enumerate(submissions):
+        if submission.idempotency_key is None:
+            continue
+        key = (submission.usuario_id, submission.idempotency_key)
+        if key in keyed:
+            followers[index] = keyed[key]
+        else:
+            keyed[key] = index
+    if keyed:
+        keys = models.IdempotencyKey
+        stored = db.execute(
+            select(keys.usuario_id, keys.chave, keys.resultado_id, keys.requisicao_hash)
+            .where(tuple_(keys.usuario_id, keys.chave).in_(list(keyed)))
+        )
+        for row in stored:
+            index = keyed[(row.usuario_id, row.chave)]
+            try:
+                outcomes[index] = _replay(db, submissions[index], row.resultado_id, row.requisicao_hash)
+            except IdempotencyKeyReusedError as exc:
+                outcomes[index] = exc
+
+    open_indexes = [i for i in range(len(submissions)) if outcomes[i] is None and i not in followers]
+    testado = models.TestedIndividual
+    cpfs = {submissions[i].cpf for i in open_indexes}
+    testados = {
+        row.documento_cpf: row
+        for row in db.execute(
+            select(testado.id, testado.documento_cpf, testado.consentimento_pesquisa).where(testado.documento_cpf.in_(cpfs))
+        )
+    } if cpfs else {}
+
+    pending: list[tuple[int, int]] = []
+    taken = set()
+    for index in open_indexes:
+        submission = submissions[index]
+        row = testados.get(submission.cpf)
+        if row is None:
+            outcomes[index] = TestedNotFoundError("CPF não cadastrado para triagem")
+            continue
+        # Repetido dentro do próprio lote: vale o primeiro
+        key = (row.id, submission.payload.teste_tipo)
+        if key in taken:
+            outcomes[index] = DuplicateResultError("Já existe teste para este CPF e tipo")
+            continue
+        taken.add(key)
+        pending.append((index, row.id))
+
+    if pending:
+        result = models.TestResult
+        inserted = {
+            (row.testado_id, row.teste_tipo): row.id
+            for row in db.execute(
+                _insert_ignoring_duplicates(db, result.__table__).returning(result.id, result.testado_id, result.teste_tipo),
+                in_key_order(
+                    [{"testado_id": testado_id, **submissions[index].result_values()} for index, testado_id in pending],
+                    ("testado_id", "teste_tipo"),
+                ),
+            )
+        }
+        anonymised, rollups, idempotency = [], [], []
+        answered: Counter = Counter()
+        for index, testado_id in pending:
+            submission = submissions[index]
+            result_id = inserted.get((testado_id, submission.payload.teste_tipo))
+            if result_id is None:
+                outcomes[index] = DuplicateResultError("Já existe teste para este CPF e tipo")
+                continue
+            outcomes[index] = submission.outcome(result_id)
+            rollups.append(tuple(submission.rollup_values().values()))
+            answered.update(submission.item_counts())
+            if testados[submission.cpf].consentimento_pesquisa:
+                anonymised.append({"resultado_id": result_id, **submission.anonymised_values()})
+            if submission.idempotency_key is not None:
+                idempotency.append({
+                    "usuario_id": submission.usuario_id,
+                    "chave": submission.idempotency_key,
+                    "requisicao_hash": submission.request_hash,
+                    "resultado_id": result_id,
+                    "criado_em": submission.criado_em,
+                })
+        if anonymised:
+            db.execute(insert(models.AnonymisedRecord), anonymised)
+        if idempotency:
+            db.execute(insert(models.IdempotencyKey), idempotency)
+        increment_rollups(db, rollups)
+        increment_item_statistics(db, answered)
+
+    for index, leader in followers.items():
+        outcome = outcomes[leader]
+        if isinstance(outcome, SubmissionOutcome) and submissions[index].request_hash != submissions[leader].request_hash:
+            outcome = IdempotencyKeyReusedError("Idempotency-Key já usada com outro conteúdo")
+        elif isinstance(outcome, SubmissionOutcome):
+            outcome = replace(outcome, replayed=True)
+        outcomes[index] = outcome
+    return outcomes
+
+
+def _submit_sequential(db: Session, submission: _Submission) -> SubmissionOutcome:
+    """Os mesmos passos do caminho do PostgreSQL, um comando por vez, na mesma transação."""
+    try:
+        outcome = write_submissions(db, [submission])[0]
+    except IntegrityError:
+        # Bancos sem ON CONFLICT: a restrição única acusa o duplicado
+        db.rollback()
+        raise DuplicateResultError("Já existe teste para este CPF e tipo")
+    if isinstance(outcome, Exception):
+        raise outcome
+    if not outcome.replayed:
+        db.commit()
+    return outcome
+
+
+def _submit(db: Session, submission: _Submission) -> SubmissionOutcome:
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            return _submit_postgresql(db, submission)
+        return _submit_sequential(db, submission)
+    except (DuplicateResultError, IntegrityError) as exc:
+        # Mesma Idempotency-Key em duas requisições simultâneas: a segunda
+        # bate na chave (ou no resultado) da primeira; depois do commit dela
+        # vira replay, ou 422 se o conteúdo for outro
+        db.rollback()
+        if submission.idempotency_key is None:
+            raise
+        previous = _previous_key(db, submission)
+        if previous is not None:
+            return _replay(db, submission, *previous)
+        if isinstance(exc, IntegrityError):
+            raise DuplicateResultError("Já existe teste para este CPF e tipo") from exc
+        raise
+
+
+def _write_coalesced(submissions: list[_Submission]) -> list[SubmissionOutcome | Exception]:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        try:
+            outcomes = write_submissions(db, submissions)
+            db.commit()
+        except Exception:
+            # Nada do lote pode sobrar antes de o WriteCoalescer regravar os
+            # itens um a um (contagens somadas duas vezes)
+            db.rollback()
+            raise
+        return outcomes
+
+
+def _write_one(submission: _Submission) -> SubmissionOutcome:
+    assert database.SessionLocal is not None, "SessionLocal não inicializada"
+    with database.SessionLocal() as db:
+        return _submit(db, submission)
+
+
+# Opcional (test_write_coalescing): submissões simultâneas viram um commit só
+write_coalescer = WriteCoalescer(
+    _write_coalesced,
+    _write_one,
+    window_seconds=settings.test_write_coalesce_ms / 1000,
+    max_batch=settings.test_write_coalesce_max,
+)
+
+
+def _new_submission(
+    usuario_id: int, cpf: str, payload: schemas.TestResultCreate, idempotency_key: str | None = None
+) -> _Submission:
+    score, classificacao = compute_test_score(payload.teste_tipo, payload.respostas)
+    return _Submission(
+        cpf=cpf,
+        usuario_id=usuario_id,
+        payload=payload,
+        score=score,
+        classificacao=classificacao,
+        criado_em=datetime.utcnow(),
+        idempotency_key=idempotency_key,
+        request_hash=request_hash(cpf, payload),
+    )
+
+
+def submit_single(
+    db: Session,
+    usuario_id: int,
+    cpf: str,
+    payload: schemas.TestResultCreate,
+    idempotency_key: str | None = None,
+) -> SubmissionOutcome:
+    """Grava um resultado (ou devolve o já gravado para a mesma Idempotency-Key)."""
+    submission = _new_submission(usuario_id, cpf, payload, idempotency_key)
+    if settings.test_write_coalescing:
+        return write_coalescer.submit(submission)
+    return _submit(db, submission)
+
+
+_BATCH_STATUSES = {TestedNotFoundError: UNKNOWN_CPF, DuplicateResultError: DUPLICATE}
+
+
+def submit_batch(db: Session, usuario_id: int, items: list[schemas.TestBatchItem]) -> list[schemas.TestBatchItemResult]:
+    """Grava os itens válidos em uma transação e devolve o status de cada item, na ordem recebida."""
+    outcomes = write_submissions(db, [_new_submission(usuario_id, item.cpf, item) for item in items])
+    db.commit()
+
+    statuses = []
+    for index, (item, outcome) in enumerate(zip(items, outcomes)):
+        status = schemas.TestBatchItemResult(indice=index, cpf=item.cpf, teste_tipo=item.teste_tipo, status=CREATED)
+        if isinstance(outcome, Exception):
+            status.status = _BATCH_STATUSES[type(outcome)]
+        else:
+            status.resultado_id = outcome.resultado.id
+            status.score = outcome.resultado.score
+            status.classificacao = outcome.resultado.classificacao
+            status.mensagem_orientacao = outcome.mensagem_orientacao
+        statuses.append(status)
+    return statuses
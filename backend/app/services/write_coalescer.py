@@ -0,0 +1,105 @@
+# Agrupamento de escritas concorrentes em uma transação (group commit).
+#
+# Cada requisição entrega seu item e espera um Future. Uma thread única pega o
+# primeiro item da fila, espera mais alguns milissegundos (ou até juntar
+# `max_batch`) e grava tudo de uma vez com `write_batch`, pagando um commit
+# (e um flush do WAL) por lote em vez de um por requisição. Cada Future
+# recebe o resultado ou o erro do seu próprio item.
+#
+# Se o lote inteiro falhar (erro inesperado do banco), os itens são regravados
+# um a um com `write_one`, para que o erro fique só com quem o causou.
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteCoalescer:
+    def __init__(
+        self,
+        write_batch: Callable[[list], list],
+        write_one: Callable[[object], object],
+        window_seconds: float,
+        max_batch: int,
+    ):
+        self.write_batch = write_batch
+        self.write_one = write_one
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, item) -> object:
+        """Enfileira o item e bloqueia até o lote dele ser gravado."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+                self._thread.start()
+
+    def _collect(self, first) -> tuple[list, bool]:
+        batch, stop = [first], False
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                stop = True
+                break
+            batch.append(entry)
+        return batch, stop
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch: list) -> None:
+        items = [item for item, _ in batch]
+        try:
+            outcomes = self.write_batch(items)
+        except Exception:
+            logger.exception("Lote de %d escritas falhou; gravando um a um", len(batch))
+            for item, future in batch:
+                try:
+                    future.set_result(self.write_one(item))
+                except Exception as exc:
+                    future.set_exception(exc)
+            return
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
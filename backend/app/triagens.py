@@ -0,0 +1,117 @@
+"""
+Linha de comando para os resultados de triagem.
+
+    python -m app.triagens rebuild-rollups
+    python -m app.triagens refresh-cube [--rebuild]
+    python -m app.triagens rescore [--versao 2024.1] [--dry-run] [--lote 10000]
+    python -m app.triagens pack-answers [--lote 5000]
+    python -m app.triagens rebuild-item-stats
+"""
+import argparse
+import sys
+import time
+
+import app.database as database
+from .migrations import run_migrations
+from .services.answer_codec import PACK_BATCH_SIZE, pack_stored_answers
+from .services.core import CURRENT_RULES_VERSION, RULE_SETS
+from .services.item_statistics import rebuild_item_statistics
+from .services.rescoring import RESCORE_CHUNK_SIZE, RulesVersionNotCurrentError, rescore_results
+from .services.research_cube import rebuild_research_cube, refresh_research_cube
+from .services.test_rollups import rebuild_rollups
+
+
+def _prepare_database() -> None:
+    database.init_engine()
+    database.create_all()
+    run_migrations()
+
+
+def _cmd_rebuild_rollups(args: argparse.Namespace) -> int:
+    _prepare_database()
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        rows = rebuild_rollups(db)
+        db.commit()
+    print(f"✅ contagens recalculadas: {rows} combinações em {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def _cmd_rebuild_item_stats(args: argparse.Namespace) -> int:
+    _prepare_database()
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        processed = rebuild_item_statistics(db)
+        db.commit()
+    print(f"✅ estatísticas por item recalculadas: {processed} resultados em {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def _cmd_refresh_cube(args: argparse.Namespace) -> int:
+    _prepare_database()
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        processed = rebuild_research_cube(db) if args.rebuild else refresh_research_cube(db)
+        db.commit()
+    print(f"✅ cubo de pesquisa: {processed} registros somados em {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def _cmd_rescore(args: argparse.Namespace) -> int:
+    _prepare_database()
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        try:
+            report = rescore_results(db, version=args.versao, chunk_size=args.lote, dry_run=args.dry_run)
+        except RulesVersionNotCurrentError as exc:
+            print(f"❌ {exc}", file=sys.stderr)
+            return 1
+    verb = "mudariam" if report.dry_run else "regravados"
+    print(
+        f"✅ regras {report.version}: {report.processed} resultados lidos, {report.changed} {verb}, "
+        f"{report.reclassified} mudaram de classificação em {time.perf_counter() - started:.2f}s"
+    )
+    for (teste_tipo, before, after), total in sorted(report.shifts.items()):
+        print(f"   {teste_tipo}: {before} → {after}: {total}")
+    return 0
+
+
+def _cmd_pack_answers(args: argparse.Namespace) -> int:
+    _prepare_database()
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        packed, kept = pack_stored_answers(db, batch_size=args.lote)
+    print(f"✅ respostas compactadas: {packed} resultados ({kept} mantidos em JSON) em {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.triagens", description="Resultados de triagem")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollups_parser = commands.add_parser("rebuild-rollups", help="recalcula as contagens por risco do zero")
+    rollups_parser.set_defaults(func=_cmd_rebuild_rollups)
+
+    items_parser = commands.add_parser("rebuild-item-stats", help="recalcula as estatísticas por pergunta do zero")
+    items_parser.set_defaults(func=_cmd_rebuild_item_stats)
+
+    cube_parser = commands.add_parser("refresh-cube", help="soma no cubo de pesquisa os registros anonimizados novos")
+    cube_parser.add_argument("--rebuild", action="store_true", help="zera o cubo e soma todos os registros de novo")
+    cube_parser.set_defaults(func=_cmd_refresh_cube)
+
+    rescore_parser = commands.add_parser("rescore", help="recalcula score e classificação dos resultados gravados")
+    rescore_parser.add_argument("--versao", choices=sorted(RULE_SETS), default=CURRENT_RULES_VERSION, help="versão das regras (outra que não a atual só com --dry-run)")
+    rescore_parser.add_argument("--dry-run", action="store_true", help="só mostra o que mudaria")
+    rescore_parser.add_argument("--lote", type=int, default=RESCORE_CHUNK_SIZE, help="resultados por lote")
+    rescore_parser.set_defaults(func=_cmd_rescore)
+
+    pack_parser = commands.add_parser("pack-answers", help="converte as respostas gravadas em JSON para o formato compacto")
+    pack_parser.add_argument("--lote", type=int, default=PACK_BATCH_SIZE, help="resultados por lote")
+    pack_parser.set_defaults(func=_cmd_pack_answers)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# Fixtures dos testes: cada teste roda contra um banco vazio.
+#
+# SQLite sempre (os schemas viram bancos anexados com ATTACH); PostgreSQL só
+# com TEST_DATABASE_URL apontando para um banco descartável (os schemas da
+# aplicação são apagados e recriados a cada teste), senão esses casos são
+# pulados.
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+import app.database as database
+from app import models
+from app.config import get_settings
+from app.main import app
+from app.security import create_access_token
+
+settings = get_settings()
+
+SCHEMAS = (settings.user_schema, settings.specialist_schema, settings.tests_schema, settings.ibge_data_schema)
+BACKENDS = ("sqlite", "postgresql")
+
+
+def _sqlite_engine(directory):
+    engine = create_engine(f"sqlite:///{directory / 'main.db'}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _attach_schemas(dbapi_connection, _record):
+        for schema in SCHEMAS:
+            dbapi_connection.execute(f"ATTACH DATABASE '{directory / schema}.db' AS {schema}")
+
+    database.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _postgresql_engine():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL não definida")
+    engine = create_engine(url)
+    try:
+        with engine.begin() as conn:
+            for schema in SCHEMAS:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+                conn.execute(text(f"CREATE SCHEMA {schema}"))
+    except OperationalError as exc:
+        engine.dispose()
+        pytest.skip(f"PostgreSQL indisponível: {exc}")
+    database.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture(params=BACKENDS)
+def db_engine(request, tmp_path, monkeypatch):
+    engine = _sqlite_engine(tmp_path) if request.param == "sqlite" else _postgresql_engine()
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine, autoflush=False, future=True))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine):
+    with Session(bind=db_engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(db_engine):
+    # Sem o `with`: o startup da aplicação (init_engine com as configurações reais) não roda
+    return TestClient(app)
+
+
+@pytest.fixture
+def responsavel(db):
+    user = models.UserAccount(nome="Responsável", email="responsavel@example.com", senha_hash="x", role="responsavel")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(responsavel):
+    return {"Authorization": f"Bearer {create_access_token(responsavel.id, responsavel.role)}"}
+
+
+@pytest.fixture
+def make_testado(db, responsavel):
+    def make(cpf: str, consentimento_pesquisa: bool = True) -> models.TestedIndividual:
+        testado = models.TestedIndividual(
+            responsavel_id=responsavel.id,
+            nome_completo=f"Testado {cpf}",
+            documento_cpf=cpf,
+            regiao_bairro="Moema",
+            contato_telefone="11999999999",
+            contato_email="contato@example.com",
+            consentimento_pesquisa=consentimento_pesquisa,
+        )
+        db.add(testado)
+        db.commit()
+        return testado
+
+    return make
@@ -0,0 +1,64 @@
+import pytest
+
+from app.services.answer_codec import ANSWER_CODES, pack_answers, storage_values, stored_answers, unpack_answers
+
+
+def answers(*pairs) -> list[dict]:
+    return [{"pergunta_id": pergunta_id, "resposta": resposta} for pergunta_id, resposta in pairs]
+
+
+def test_code_tables_never_change():
+    # Códigos já gravados no banco: qualquer mudança aqui corrompe dados existentes
+    assert ANSWER_CODES == {
+        "mchat": ("", "nao", "sim"),
+        "assq": ("", "nao", "sim", "um_pouco"),
+        "aq10": (
+            "", "nao", "sim",
+            "concordo_totalmente", "concordo_um_pouco", "discordo_totalmente", "discordo_um_pouco",
+        ),
+        "ados2": ("", "nao", "sim"),
+        "adir": ("", "nao", "sim"),
+    }
+
+
+def test_sequential_layout_round_trip():
+    respostas = answers(("1", "concordo_totalmente"), ("2", "discordo_um_pouco"), ("3", "sim"), ("4", ""))
+
+    packed = pack_answers("aq10", respostas)
+
+    assert packed == bytes([1, 3, 6, 2, 0])
+    assert unpack_answers("aq10", packed) == respostas
+    assert storage_values("aq10", respostas) == {"respostas": [], "respostas_codificadas": packed}
+    assert stored_answers("aq10", [], packed) == respostas
+
+
+@pytest.mark.parametrize("perguntas", [("2", "1", "3"), ("1", "3"), ("10", "255")])
+def test_pairs_layout_round_trip(perguntas):
+    respostas = answers(*((pergunta_id, "um_pouco") for pergunta_id in perguntas))
+
+    packed = pack_answers("assq", respostas)
+
+    assert packed == bytes([2, *(value for pergunta_id in perguntas for value in (int(pergunta_id), 3))])
+    assert unpack_answers("assq", packed) == respostas
+
+
+@pytest.mark.parametrize(
+    "teste_tipo, respostas",
+    [
+        ("mchat", answers(("1", "talvez"))),           # resposta fora da tabela
+        ("mchat", answers(("a", "sim"))),              # pergunta não numérica
+        ("mchat", answers(("01", "sim"))),             # número com zero à esquerda
+        ("mchat", answers(("256", "sim"))),            # não cabe em um byte
+        ("assq", answers(("1", "concordo_totalmente"))),  # resposta de outro teste
+        ("desconhecido", answers(("1", "sim"))),
+    ],
+)
+def test_unpackable_answers_stay_in_json(teste_tipo, respostas):
+    assert pack_answers(teste_tipo, respostas) is None
+    assert storage_values(teste_tipo, respostas) == {"respostas": respostas, "respostas_codificadas": None}
+    assert stored_answers(teste_tipo, respostas, None) == respostas
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        unpack_answers("mchat", bytes([9, 1]))
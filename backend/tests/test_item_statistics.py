@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import select
+
+from app import models
+from app.security import create_access_token
+
+URL = "/api/v1/tests/especialista/itens"
+
+
+def mchat(faixa_etaria: str, regiao_geografica: str, *pairs) -> dict:
+    return {
+        "teste_tipo": "mchat",
+        "faixa_etaria": faixa_etaria,
+        "regiao_geografica": regiao_geografica,
+        "respostas": [{"pergunta_id": pergunta_id, "resposta": resposta} for pergunta_id, resposta in pairs],
+    }
+
+
+@pytest.fixture
+def especialista_headers(db):
+    especialista = models.UserAccount(nome="Especialista", email="especialista@example.com", senha_hash="x", role="especialista")
+    db.add(especialista)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(especialista.id, especialista.role)}"}
+
+
+@pytest.fixture
+def submitted(client, auth_headers, make_testado):
+    # M-CHAT 2024.1: resposta de risco "nao" na 1 e na 10, "sim" na 2
+    payloads = {
+        "11111111111": mchat("16-30 meses", "Sudeste", ("1", "nao"), ("2", "sim"), ("10", "sim")),
+        "22222222222": mchat("16-30 meses", "Sul", ("1", "sim"), ("2", "sim"), ("10", "nao")),
+        "33333333333": mchat("31-48 meses", "Sul", ("1", "nao"), ("2", "nao"), ("10", "sim")),
+        "44444444444": {
+            "teste_tipo": "assq", "faixa_etaria": "6-17 anos", "regiao_geografica": "Sul",
+            "respostas": [{"pergunta_id": "1", "resposta": "sim"}],
+        },
+    }
+    for cpf, payload in payloads.items():
+        make_testado(cpf)
+        assert client.post(f"/api/v1/tests/{cpf}/iniciar", json=payload, headers=auth_headers).status_code == 201
+
+
+def test_items_count_answers_and_risk(client, especialista_headers, submitted):
+    response = client.get(URL, params={"teste_tipo": "mchat"}, headers=especialista_headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["teste_tipo"], body["versao_regras"], body["agrupamento"]) == ("mchat", "2024.1", [])
+    # Ordem numérica das perguntas: 10 depois de 2
+    assert [
+        (item["pergunta_id"], item["total"], item["respostas"], item["em_risco"], item["taxa_risco"])
+        for item in body["itens"]
+    ] == [
+        ("1", 3, {"nao": 2, "sim": 1}, 2, 0.6667),
+        ("2", 3, {"sim": 2, "nao": 1}, 2, 0.6667),
+        ("10", 3, {"sim": 2, "nao": 1}, 1, 0.3333),
+    ]
+
+
+def test_items_grouped_by_region(client, especialista_headers, submitted):
+    response = client.get(
+        URL, params={"teste_tipo": "mchat", "por": "regiao_geografica", "pergunta_id": ["10", "1"]}, headers=especialista_headers
+    )
+
+    body = response.json()
+    assert body["agrupamento"] == ["regiao_geografica"]
+    assert [
+        (item["pergunta_id"], item["regiao_geografica"], item["faixa_etaria"], item["respostas"], item["em_risco"], item["taxa_risco"])
+        for item in body["itens"]
+    ] == [
+        ("1", "Sudeste", None, {"nao": 1}, 1, 1.0),
+        ("1", "Sul", None, {"sim": 1, "nao": 1}, 1, 0.5),
+        ("10", "Sudeste", None, {"sim": 1}, 0, 0.0),
+        ("10", "Sul", None, {"nao": 1, "sim": 1}, 1, 0.5),
+    ]
+
+
+def test_items_grouped_and_filtered(client, especialista_headers, submitted):
+    response = client.get(
+        URL,
+        params={
+            "teste_tipo": "mchat", "por": ["faixa_etaria", "regiao_geografica"],
+            "faixa_etaria": "16-30 meses", "pergunta_id": "2",
+        },
+        headers=especialista_headers,
+    )
+
+    assert response.json()["itens"] == [
+        {"pergunta_id": "2", "faixa_etaria": "16-30 meses", "regiao_geografica": "Sudeste",
+         "total": 1, "respostas": {"sim": 1}, "em_risco": 1, "taxa_risco": 1.0},
+        {"pergunta_id": "2", "faixa_etaria": "16-30 meses", "regiao_geografica": "Sul",
+         "total": 1, "respostas": {"sim": 1}, "em_risco": 1, "taxa_risco": 1.0},
+    ]
+
+
+def test_items_require_especialista(client, auth_headers):
+    assert client.get(URL, params={"teste_tipo": "mchat"}, headers=auth_headers).status_code == 403
+
+
+def test_submit_writes_item_rows_in_key_order(client, auth_headers, db, make_testado):
+    # Respostas em ordem decrescente; os ids sequenciais mostram a ordem de escrita
+    make_testado("11111111111")
+    payload = mchat("16-30 meses", "Sul", *((str(number), "sim") for number in range(20, 0, -1)))
+    assert client.post("/api/v1/tests/11111111111/iniciar", json=payload, headers=auth_headers).status_code == 201
+
+    stat = models.TestItemStatistic
+    keys = [
+        tuple(row) for row in db.execute(
+            select(stat.teste_tipo, stat.pergunta_id, stat.resposta, stat.faixa_etaria, stat.regiao_geografica).order_by(stat.id)
+        )
+    ]
+    assert len(keys) == 20 and keys == sorted(keys)
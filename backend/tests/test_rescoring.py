@@ -0,0 +1,134 @@
+import pytest
+from sqlalchemy import select
+
+from app import models
+from app.services import core, rescoring
+from app.services.core import MCHAT_RISK_RULES, RULE_SETS, RuleSet
+from app.services.rescoring import RulesVersionNotCurrentError, rescore_results
+
+# Revisão de teste: cada resposta de risco do M-CHAT vale 2, mesmos cortes
+CURRENT = RULE_SETS["2024.1"]
+REVISED = RuleSet(
+    version="teste",
+    tests={
+        **CURRENT.tests,
+        # core.TestRules: importado direto, o pytest tentaria coletá-lo
+        "mchat": core.TestRules(
+            points={pergunta: {resposta: 2} for pergunta, resposta in MCHAT_RISK_RULES.items()},
+            cutoffs=CURRENT.tests["mchat"].cutoffs,
+        ),
+    },
+    fallback=CURRENT.fallback,
+)
+
+
+def mchat(riscos: int) -> dict:
+    """M-CHAT com as `riscos` primeiras perguntas respondidas com a resposta de risco."""
+    respostas = [
+        {"pergunta_id": pergunta, "resposta": resposta if index < riscos else ("sim" if resposta == "nao" else "nao")}
+        for index, (pergunta, resposta) in enumerate(MCHAT_RISK_RULES.items())
+    ]
+    return {"teste_tipo": "mchat", "faixa_etaria": "16-30 meses", "regiao_geografica": "Sudeste", "respostas": respostas}
+
+
+ASSQ = {
+    "teste_tipo": "assq",
+    "faixa_etaria": "6-17 anos",
+    "regiao_geografica": "Norte",
+    "respostas": [{"pergunta_id": str(number), "resposta": "sim"} for number in range(1, 28)],
+}
+
+
+@pytest.fixture
+def seeded(client, auth_headers, make_testado, monkeypatch):
+    """Resultados gravados com 2024.1; devolve cpf -> payload."""
+    monkeypatch.setitem(RULE_SETS, REVISED.version, REVISED)
+    payloads = {
+        "11111111111": mchat(0),   # 0 Baixo  -> 0 Baixo
+        "22222222222": mchat(2),   # 2 Baixo  -> 4 Moderado
+        "33333333333": mchat(4),   # 4 Moderado -> 8 Alto
+        "44444444444": mchat(1),   # 1 Baixo  -> 2 Baixo (só o score muda)
+        "55555555555": ASSQ,       # regras iguais nas duas versões
+    }
+    for cpf, payload in payloads.items():
+        make_testado(cpf, consentimento_pesquisa=cpf != "44444444444")
+        assert client.post(f"/api/v1/tests/{cpf}/iniciar", json=payload, headers=auth_headers).status_code == 201
+    return payloads
+
+
+def snapshot(db) -> dict:
+    db.expire_all()
+    result, testado = models.TestResult, models.TestedIndividual
+    rollup, record = models.TestResultRollup, models.AnonymisedRecord
+    return {
+        "resultados": {
+            row.documento_cpf: (row.score, row.classificacao)
+            for row in db.execute(
+                select(testado.documento_cpf, result.score, result.classificacao).join(testado, result.testado_id == testado.id)
+            )
+        },
+        "anonimizados": {
+            row.documento_cpf: row.score
+            for row in db.execute(
+                select(testado.documento_cpf, record.score)
+                .join(result, record.resultado_id == result.id)
+                .join(testado, result.testado_id == testado.id)
+            )
+        },
+        "contagens": {
+            (row.teste_tipo, row.classificacao): row.total
+            for row in db.execute(select(rollup)).scalars()
+            if row.total
+        },
+        "cubo": sorted(
+            (row.teste_tipo, row.faixa_score, row.total) for row in db.execute(select(models.ResearchCubeCell)).scalars()
+        ),
+    }
+
+
+def test_dry_run_reports_without_writing(db, seeded):
+    before = snapshot(db)
+
+    report = rescore_results(db, REVISED.version, chunk_size=2, dry_run=True)
+
+    assert (report.processed, report.changed, report.score_changed) == (5, 3, 3)
+    assert report.shifts == {("mchat", "Baixo", "Moderado"): 1, ("mchat", "Moderado", "Alto"): 1}
+    assert snapshot(db) == before
+
+
+def test_other_version_is_only_simulated(db, seeded):
+    before = snapshot(db)
+
+    with pytest.raises(RulesVersionNotCurrentError):
+        rescore_results(db, REVISED.version)
+
+    assert snapshot(db) == before
+
+
+def test_rescore_updates_results_records_and_counts(db, seeded, monkeypatch):
+    before = snapshot(db)
+    assert before["contagens"] == {("mchat", "Baixo"): 3, ("mchat", "Moderado"): 1, ("assq", "Alto"): 1}
+    monkeypatch.setattr(rescoring, "CURRENT_RULES_VERSION", REVISED.version)
+
+    report = rescore_results(db, REVISED.version, chunk_size=2)
+
+    assert (report.processed, report.changed, report.score_changed, report.reclassified) == (5, 3, 3, 2)
+    assert report.shifts == {("mchat", "Baixo", "Moderado"): 1, ("mchat", "Moderado", "Alto"): 1}
+    after = snapshot(db)
+    assert after["resultados"] == {
+        "11111111111": (0, "Baixo"),
+        "22222222222": (4, "Moderado"),
+        "33333333333": (8, "Alto"),
+        "44444444444": (2, "Baixo"),
+        "55555555555": before["resultados"]["55555555555"],
+    }
+    # Sem consentimento (44444444444) não há registro anonimizado
+    assert after["anonimizados"] == {
+        "11111111111": 0, "22222222222": 4, "33333333333": 8, "55555555555": before["anonimizados"]["55555555555"],
+    }
+    # Baixo -1, Moderado +1 -1, Alto +1
+    assert after["contagens"] == {
+        ("mchat", "Baixo"): 2, ("mchat", "Moderado"): 1, ("mchat", "Alto"): 1, ("assq", "Alto"): 1,
+    }
+    # Rodar de novo com as mesmas regras não muda nada
+    assert rescore_results(db, REVISED.version).changed == 0
@@ -0,0 +1,107 @@
+import random
+from datetime import datetime
+from itertools import combinations
+
+from sqlalchemy import insert
+
+from app import models
+from app.services.research_cube import CUBE_DIMENSIONS, query_cube, rebuild_research_cube, refresh_research_cube
+
+MIN_CELL = 5
+
+
+def add_cells(db, cells: list[dict]) -> None:
+    db.execute(insert(models.ResearchCubeCell), cells)
+    db.commit()
+
+
+def cell(total: int, score_soma: int | None = None, **values) -> dict:
+    base = {"teste_tipo": "assq", "faixa_etaria": "6-17 anos", "regiao_geografica": "Sul", "mes": "2026-01", "faixa_score": "0-4"}
+    return {**base, **values, "total": total, "score_soma": total * 3 if score_soma is None else score_soma}
+
+
+def served(db, dimensions, **kwargs) -> dict[tuple, dict]:
+    result = query_cube(db, dimensions, min_cell_size=MIN_CELL, **kwargs)
+    return {tuple(row[name] for name in dimensions): row for row in result["celulas"]}
+
+
+def test_suppressed_cell_cannot_be_rebuilt_from_marginals(db):
+    add_cells(db, [
+        cell(7, 14),
+        cell(4, 36, regiao_geografica="Sudeste", mes="2026-02"),
+    ])
+
+    by_type = served(db, ["teste_tipo"])
+    by_region = served(db, ["teste_tipo", "regiao_geografica"])
+    january = served(db, ["teste_tipo"], mes_fim="2026-01")
+
+    assert by_region[("assq", "Sudeste")]["suprimida"] is True
+    assert by_region[("assq", "Sudeste")]["total"] is None
+    # Marginal menos as células visíveis, ou período inteiro menos janeiro: nada sobra
+    assert by_type[("assq",)]["total"] - by_region[("assq", "Sul")]["total"] == 0
+    assert by_type[("assq",)]["total"] - january[("assq",)]["total"] == 0
+    # Nem a soma de scores da célula suprimida vaza pela média
+    assert by_type[("assq",)]["total"] * by_type[("assq",)]["score_medio"] == 14
+
+
+def test_every_served_total_sums_only_publishable_base_cells(db):
+    rnd = random.Random(7)
+    cells = {}
+    for _ in range(120):
+        key = (
+            rnd.choice(["mchat", "assq", "aq10"]),
+            rnd.choice(["16-30 meses", "6-17 anos", "Adultos"]),
+            rnd.choice(["Sul", "Sudeste", "Norte"]),
+            rnd.choice(["2026-01", "2026-02", "2026-03"]),
+            rnd.choice(["0-4", "5-9", "10+"]),
+        )
+        cells[key] = rnd.randint(1, 12)
+    add_cells(db, [{**dict(zip(CUBE_DIMENSIONS, key)), "total": total, "score_soma": total} for key, total in cells.items()])
+
+    for size in range(len(CUBE_DIMENSIONS) + 1):
+        for dimensions in combinations(CUBE_DIMENSIONS, size):
+            positions = [CUBE_DIMENSIONS.index(name) for name in dimensions]
+            expected: dict[tuple, int] = {}
+            for key, total in cells.items():
+                group = tuple(key[position] for position in positions)
+                expected[group] = expected.get(group, 0) + (total if total >= MIN_CELL else 0)
+
+            rows = served(db, list(dimensions))
+
+            assert rows.keys() == expected.keys()
+            for group, total in expected.items():
+                assert rows[group]["total"] == (total or None), (dimensions, group)
+                assert rows[group]["suprimida"] is (total == 0)
+
+
+def test_refresh_sums_records_that_commit_after_a_higher_id(db):
+    def record(record_id: int) -> dict:
+        return {
+            "id": record_id, "resultado_id": record_id, "faixa_etaria": "Adultos", "regiao_geografica": "Sul",
+            "score": 6, "teste_tipo": "aq10", "criado_em": datetime(2026, 1, 15),
+        }
+
+    # Cada registro anonimizado referencia um resultado
+    db.execute(insert(models.TestedIndividual), [
+        {"id": record_id, "nome_completo": f"T{record_id}", "documento_cpf": f"{record_id:011d}", "regiao_bairro": "Sé",
+         "contato_telefone": "11", "contato_email": "t@example.com", "consentimento_pesquisa": True}
+        for record_id in range(1, 11)
+    ])
+    db.execute(insert(models.TestResult), [
+        {"id": record_id, "testado_id": record_id, "teste_tipo": "aq10", "respostas": [], "score": 6,
+         "classificacao": "Alto", "faixa_etaria": "Adultos", "regiao_geografica": "Sul", "criado_em": datetime(2026, 1, 15)}
+        for record_id in range(1, 11)
+    ])
+    db.execute(insert(models.AnonymisedRecord), [record(record_id) for record_id in range(1, 11) if record_id != 5])
+    db.commit()
+    assert refresh_research_cube(db) == 9
+    db.commit()
+
+    db.execute(insert(models.AnonymisedRecord), [record(5)])
+    db.commit()
+
+    assert refresh_research_cube(db) == 1
+    db.commit()
+    assert served(db, ["teste_tipo"])[("aq10",)]["total"] == 10
+    assert refresh_research_cube(db) == 0
+    assert rebuild_research_cube(db) == 10
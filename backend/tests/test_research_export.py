@@ -0,0 +1,54 @@
+import pytest
+
+from app import models
+from app.security import create_access_token
+from app.services.research_export import CSV, NDJSON, PARQUET, UnsupportedExportFormat, negotiate_export_format
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("", NDJSON),
+        ("*/*", NDJSON),
+        ("text/csv, application/x-ndjson;q=0.1", CSV),
+        ("application/x-ndjson;q=0.5, application/vnd.apache.parquet", PARQUET),
+        ("application/parquet", PARQUET),
+        ("text/*", CSV),
+        ("application/*", NDJSON),
+        ("text/*;q=0.9, application/*;q=0.8", CSV),
+        # Mesmo q: desempata pela ordem do servidor
+        ("text/csv, application/x-ndjson", NDJSON),
+        # Tipo exato com q=0 vale mais que o curinga
+        ("*/*, application/x-ndjson;q=0", CSV),
+        ("text/html, */*;q=0.1", NDJSON),
+    ],
+)
+def test_negotiate_export_format(accept, expected):
+    assert negotiate_export_format(accept) == expected
+
+
+@pytest.mark.parametrize("accept", ["text/csv;q=0", "image/png", "text/html, application/json", "text/*;q=0"])
+def test_negotiate_export_format_rejects_unsupported(accept):
+    with pytest.raises(UnsupportedExportFormat):
+        negotiate_export_format(accept)
+
+
+@pytest.mark.parametrize(
+    "accept, status, content_type",
+    [
+        ("text/*", 200, "text/csv; charset=utf-8"),
+        ("text/csv;q=0.2, application/x-ndjson;q=0.1", 200, "text/csv; charset=utf-8"),
+        ("image/png", 406, None),
+    ],
+)
+def test_export_endpoint_honours_accept(client, db, accept, status, content_type):
+    especialista = models.UserAccount(nome="Especialista", email="especialista@example.com", senha_hash="x", role="especialista")
+    db.add(especialista)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(especialista.id, especialista.role)}", "Accept": accept}
+
+    response = client.get("/api/v1/pesquisa/exportar", headers=headers)
+
+    assert response.status_code == status
+    if content_type is not None:
+        assert response.headers["content-type"] == content_type
@@ -0,0 +1,115 @@
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from app import models
+from app.services.test_rollups import ROLLUP_KEYS
+
+MCHAT = {
+    "teste_tipo": "mchat",
+    "faixa_etaria": "16-30 meses",
+    "regiao_geografica": "Sudeste",
+    "respostas": [{"pergunta_id": str(number), "resposta": "sim"} for number in range(1, 21)],
+}
+ASSQ = {
+    "teste_tipo": "assq",
+    "faixa_etaria": "6-17 anos",
+    "regiao_geografica": "Norte",
+    "respostas": [{"pergunta_id": str(number), "resposta": "nao"} for number in range(1, 28)],
+}
+
+
+def post_batch(client, headers, itens):
+    return client.post("/api/v1/tests/lote", json={"itens": itens}, headers=headers)
+
+
+def count(db, model) -> int:
+    return db.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_batch_reports_status_per_item(client, auth_headers, db, make_testado):
+    make_testado("11111111111")
+    make_testado("22222222222", consentimento_pesquisa=False)
+    make_testado("33333333333")
+    assert client.post("/api/v1/tests/33333333333/iniciar", json=MCHAT, headers=auth_headers).status_code == 201
+
+    response = post_batch(client, auth_headers, [
+        {**MCHAT, "cpf": "11111111111"},
+        {**MCHAT, "cpf": "99999999999"},
+        {**MCHAT, "cpf": "33333333333"},   # já gravado antes
+        {**MCHAT, "cpf": "11111111111"},   # repetido no próprio lote
+        {**ASSQ, "cpf": "22222222222"},
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["criados"] == 2
+    assert [item["status"] for item in body["itens"]] == [
+        "criado", "cpf_nao_cadastrado", "duplicado", "duplicado", "criado",
+    ]
+    assert [item["indice"] for item in body["itens"]] == list(range(5))
+    created = [item for item in body["itens"] if item["status"] == "criado"]
+    assert all(item["resultado_id"] and item["classificacao"] and item["mensagem_orientacao"] for item in created)
+    assert all(item["resultado_id"] is None for item in body["itens"] if item["status"] != "criado")
+
+
+def test_batch_writes_counts_once(client, auth_headers, db, make_testado):
+    make_testado("11111111111")
+    make_testado("22222222222", consentimento_pesquisa=False)
+    make_testado("33333333333")
+
+    response = post_batch(client, auth_headers, [
+        {**MCHAT, "cpf": "11111111111"},
+        {**MCHAT, "cpf": "11111111111"},
+        {**MCHAT, "cpf": "33333333333"},
+        {**ASSQ, "cpf": "22222222222"},
+        {**ASSQ, "cpf": "00000000000"},
+    ])
+
+    assert response.json()["criados"] == 3
+    db.expire_all()
+    assert count(db, models.TestResult) == 3
+    # Sem consentimento (22222222222): resultado sim, registro anonimizado não
+    assert count(db, models.AnonymisedRecord) == 2
+    rollups = {
+        (row.teste_tipo, row.faixa_etaria): row.total
+        for row in db.execute(select(models.TestResultRollup)).scalars()
+    }
+    assert rollups == {("mchat", "16-30 meses"): 2, ("assq", "6-17 anos"): 1}
+    items = Counter({
+        (row.teste_tipo, row.pergunta_id, row.resposta): row.total
+        for row in db.execute(select(models.TestItemStatistic)).scalars()
+    })
+    expected = Counter()
+    for payload, times in ((MCHAT, 2), (ASSQ, 1)):
+        for answer in payload["respostas"]:
+            expected[(payload["teste_tipo"], answer["pergunta_id"], answer["resposta"])] += times
+    assert items == expected
+
+
+def test_batch_writes_shared_rows_in_key_order(client, auth_headers, db, make_testado):
+    # Chaves chegam em ordem decrescente; as linhas compartilhadas têm de ser
+    # escritas (e travadas) em ordem de chave, o que os ids sequenciais mostram
+    cpfs = ["55555555555", "44444444444", "33333333333"]
+    for cpf in cpfs:
+        make_testado(cpf)
+    regions = ["Sul", "Nordeste", "Centro-Oeste"]
+
+    post_batch(client, auth_headers, [
+        {**MCHAT, "cpf": cpf, "regiao_geografica": region} for cpf, region in zip(cpfs, regions)
+    ])
+
+    db.expire_all()
+    rollup = models.TestResultRollup
+    keys = [tuple(row) for row in db.execute(select(*(getattr(rollup, key) for key in ROLLUP_KEYS)).order_by(rollup.id))]
+    assert keys == sorted(keys) and len(keys) == 3
+    stat = models.TestItemStatistic
+    item_keys = [
+        tuple(row) for row in db.execute(
+            select(stat.teste_tipo, stat.pergunta_id, stat.resposta, stat.faixa_etaria, stat.regiao_geografica).order_by(stat.id)
+        )
+    ]
+    assert item_keys == sorted(item_keys)
+    result = models.TestResult
+    testado_ids = db.execute(select(result.testado_id).order_by(result.id)).scalars().all()
+    assert testado_ids == sorted(testado_ids)
@@ -0,0 +1,135 @@
+import pytest
+from sqlalchemy import func, select
+
+from app import models
+from app.services import test_submissions
+
+CPF = "12345678901"
+PAYLOAD = {
+    "teste_tipo": "mchat",
+    "faixa_etaria": "16-30 meses",
+    "regiao_geografica": "Sudeste",
+    "respostas": [{"pergunta_id": str(number), "resposta": "sim" if number % 3 else "nao"} for number in range(1, 21)],
+}
+
+
+@pytest.fixture(autouse=True)
+def _pin_submit_path(db_engine, monkeypatch):
+    # No PostgreSQL o submit tem de ir pelo comando único (_submit_postgresql)
+    if db_engine.dialect.name == "postgresql":
+        def fail(*args, **kwargs):
+            raise AssertionError("caminho sequencial usado no PostgreSQL")
+
+        monkeypatch.setattr(test_submissions, "_submit_sequential", fail)
+
+
+def submit(client, headers, cpf=CPF, payload=PAYLOAD, key=None):
+    if key is not None:
+        headers = {**headers, "Idempotency-Key": key}
+    return client.post(f"/api/v1/tests/{cpf}/iniciar", json=payload, headers=headers)
+
+
+def count(db, model) -> int:
+    db.expire_all()
+    return db.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def rollup_total(db, classificacao: str) -> int:
+    rollup = models.TestResultRollup
+    db.expire_all()
+    return db.execute(
+        select(func.coalesce(func.sum(rollup.total), 0)).where(
+            rollup.teste_tipo == PAYLOAD["teste_tipo"],
+            rollup.classificacao == classificacao,
+            rollup.faixa_etaria == PAYLOAD["faixa_etaria"],
+            rollup.regiao_geografica == PAYLOAD["regiao_geografica"],
+        )
+    ).scalar_one()
+
+
+def item_totals(db) -> dict[tuple[str, str], int]:
+    stat = models.TestItemStatistic
+    db.expire_all()
+    return {
+        (row.pergunta_id, row.resposta): row.total
+        for row in db.execute(select(stat.pergunta_id, stat.resposta, stat.total).where(stat.total != 0))
+    }
+
+
+EXPECTED_ITEMS = {(item["pergunta_id"], item["resposta"]): 1 for item in PAYLOAD["respostas"]}
+
+
+def test_submit_creates_result_record_and_counts(client, auth_headers, db, make_testado):
+    make_testado(CPF)
+
+    response = submit(client, auth_headers)
+
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+    resultado = response.json()["resultado"]
+    assert resultado["respostas"] == PAYLOAD["respostas"]
+    assert count(db, models.TestResult) == 1
+    assert count(db, models.AnonymisedRecord) == 1
+    assert rollup_total(db, resultado["classificacao"]) == 1
+    assert item_totals(db) == EXPECTED_ITEMS
+
+
+def test_unknown_cpf_returns_404_and_writes_nothing(client, auth_headers, db):
+    response = submit(client, auth_headers, cpf="00000000000")
+
+    assert response.status_code == 404
+    assert count(db, models.TestResult) == 0
+    assert count(db, models.TestResultRollup) == 0
+    assert item_totals(db) == {}
+
+
+def test_duplicate_returns_409_and_counts_once(client, auth_headers, db, make_testado):
+    make_testado(CPF)
+    classificacao = submit(client, auth_headers).json()["resultado"]["classificacao"]
+
+    response = submit(client, auth_headers)
+
+    assert response.status_code == 409
+    assert count(db, models.TestResult) == 1
+    assert count(db, models.AnonymisedRecord) == 1
+    assert rollup_total(db, classificacao) == 1
+    assert item_totals(db) == EXPECTED_ITEMS
+
+
+def test_replay_with_same_key_returns_stored_result(client, auth_headers, db, make_testado):
+    make_testado(CPF)
+    first = submit(client, auth_headers, key="chave-1")
+
+    replay = submit(client, auth_headers, key="chave-1")
+
+    assert replay.status_code == 201
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert count(db, models.TestResult) == 1
+    assert count(db, models.IdempotencyKey) == 1
+    assert rollup_total(db, first.json()["resultado"]["classificacao"]) == 1
+    assert item_totals(db) == EXPECTED_ITEMS
+
+
+def test_same_key_with_other_body_returns_422(client, auth_headers, db, make_testado):
+    make_testado(CPF)
+    submit(client, auth_headers, key="chave-1")
+
+    other = {**PAYLOAD, "respostas": [{"pergunta_id": "1", "resposta": "nao"}]}
+    response = submit(client, auth_headers, payload=other, key="chave-1")
+
+    assert response.status_code == 422
+    assert count(db, models.TestResult) == 1
+    assert item_totals(db) == EXPECTED_ITEMS
+
+
+def test_without_consent_no_anonymised_record(client, auth_headers, db, make_testado):
+    make_testado(CPF, consentimento_pesquisa=False)
+
+    response = submit(client, auth_headers)
+
+    assert response.status_code == 201
+    assert count(db, models.TestResult) == 1
+    assert count(db, models.AnonymisedRecord) == 0
+    assert rollup_total(db, response.json()["resultado"]["classificacao"]) == 1
+    assert item_totals(db) == EXPECTED_ITEMS
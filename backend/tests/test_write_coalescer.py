@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from app import models, schemas
+from app.services import test_submissions
+from app.services.write_coalescer import WriteCoalescer
+
+
+def submit_together(coalescer: WriteCoalescer, items: list) -> list:
+    """Submete os itens em paralelo; devolve o resultado ou a exceção de cada um."""
+    def submit(item):
+        try:
+            return coalescer.submit(item)
+        except Exception as exc:
+            return exc
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(items)) as pool:
+            return list(pool.map(submit, items))
+    finally:
+        coalescer.stop()
+
+
+def test_failed_batch_retries_each_item_in_isolation():
+    batches, retried = [], []
+
+    def write_batch(items):
+        batches.append(list(items))
+        raise RuntimeError("lote falhou")
+
+    def write_one(item):
+        retried.append(item)
+        if item == "ruim":
+            raise ValueError(item)
+        return item.upper()
+
+    # max_batch = número de itens: o lote fecha quando todos chegam
+    coalescer = WriteCoalescer(write_batch, write_one, window_seconds=5, max_batch=3)
+    outcomes = submit_together(coalescer, ["a", "ruim", "b"])
+
+    assert len(batches) == 1 and sorted(batches[0]) == ["a", "b", "ruim"]
+    assert sorted(retried) == ["a", "b", "ruim"]
+    assert outcomes[0] == "A" and outcomes[2] == "B"
+    assert isinstance(outcomes[1], ValueError)
+
+
+def test_stop_ends_the_writer_thread():
+    coalescer = WriteCoalescer(lambda items: items, lambda item: item, window_seconds=0, max_batch=10)
+    assert coalescer.submit("x") == "x"
+    thread = coalescer._thread
+
+    coalescer.stop()
+
+    assert not thread.is_alive()
+    assert coalescer._thread is None
+
+
+def test_failed_batch_is_rolled_back_before_item_retries(db, make_testado, responsavel, monkeypatch):
+    cpfs = ["11111111111", "22222222222", "33333333333"]
+    for cpf in cpfs:
+        make_testado(cpf)
+    payload = schemas.TestResultCreate(
+        teste_tipo="mchat",
+        faixa_etaria="16-30 meses",
+        regiao_geografica="Sudeste",
+        respostas=[{"pergunta_id": str(number), "resposta": "sim"} for number in range(1, 21)],
+    )
+    submissions = [test_submissions._new_submission(responsavel.id, cpf, payload) for cpf in cpfs]
+
+    # O lote falha na última etapa, com resultados, registros e contagens já
+    # escritos na transação; as regravações um a um passam
+    increment = test_submissions.increment_item_statistics
+    calls = []
+
+    def fail_first_call(session, counts):
+        calls.append(counts)
+        if len(calls) == 1:
+            raise RuntimeError("falha no meio do lote")
+        increment(session, counts)
+
+    monkeypatch.setattr(test_submissions, "increment_item_statistics", fail_first_call)
+    coalescer = WriteCoalescer(
+        test_submissions._write_coalesced, test_submissions._write_one, window_seconds=5, max_batch=len(cpfs)
+    )
+    outcomes = submit_together(coalescer, submissions)
+
+    # O lote chegou à última etapa com as três submissões
+    assert sum(calls[0].values()) == 3 * 20
+    assert all(isinstance(outcome, test_submissions.SubmissionOutcome) for outcome in outcomes)
+    db.expire_all()
+    assert db.execute(select(func.count()).select_from(models.TestResult)).scalar_one() == 3
+    assert db.execute(select(func.count()).select_from(models.AnonymisedRecord)).scalar_one() == 3
+    assert db.execute(select(func.sum(models.TestResultRollup.total))).scalar_one() == 3
+    item_totals = db.execute(select(models.TestItemStatistic.total)).scalars().all()
+    assert len(item_totals) == 20 and set(item_totals) == {3}
+
@@ -33,6 +33,13 @@ const normalizeName = (name) => {
         .trim();
 };
 
+// O mapa da API já traz o percentual nas propriedades; o cruzamento por nome fica de reserva
+const statePercentage = (d, dataMap) => {
+    const joined = d.properties ? d.properties.autism_percentage : undefined;
+    if (joined !== undefined && joined !== null) return joined;
+    return dataMap[normalizeName(d.properties ? d.properties.name : "")];
+};
+
 // --- Função para Remover o Tooltip ---
 const removeTooltip = () => {
     d3.select(".tooltip").remove();
@@ -87,13 +94,7 @@ export default function BrazilMapD3({ ibgeData, geoData }) {
           .attr("class", "state")
           .attr("d", path)
           .style("fill", (d) => {
-            // Pega o nome original do GeoJSON (ex: "Sao Paulo" ou "São Paulo")
-            const rawName = d.properties ? d.properties.name : "";
-            
-            // Normaliza o nome do GeoJSON para bater com a chave do banco (ex: "sao paulo")
-            const searchKey = normalizeName(rawName);
-            
-            const percentage = dataMap[searchKey];
+            const percentage = statePercentage(d, dataMap);
             
             // Se encontrou, pinta com a cor da escala. Se não, cinza (#eee).
             return (percentage !== undefined && percentage !== null) 
@@ -104,9 +105,7 @@ export default function BrazilMapD3({ ibgeData, geoData }) {
           .style("stroke-width", "0.5px")
           .on("mouseover", function(event, d) {
               const rawName = d.properties ? d.properties.name : "Desconhecido";
-              // Normaliza também para o tooltip achar o valor correto
-              const searchKey = normalizeName(rawName);
-              const percentage = dataMap[searchKey];
+              const percentage = statePercentage(d, dataMap);
               
               const displayValue = (percentage !== undefined && percentage !== null) 
                   ? `${percentage.toFixed(2)}%` 
@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from "react";
+import { feature } from "topojson-client";
 import { useApi } from "../hooks/useApi"; 
 import BrazilMapD3 from './BrazilMapD3'; 
 import GenderPieChart from './GenderPieChart';
@@ -46,44 +47,24 @@ export default function DadosDashboard() {
     const fetchData = async () => {
       try {
         // 1. BUSCA DADOS DA SUA API
-        const ibgeDataRaw = await get("/api/v1/ibge/autism-indigenous");
-        const dataArray = Array.isArray(ibgeDataRaw) ? ibgeDataRaw : (ibgeDataRaw.data || []);
-        
-        // --- PROCESSO DE FILTRAGEM E ISOLAMENTO DOS DADOS TOTAIS ---
-        
-        // Isola a linha "Brasil" para o card de total
-        const totalBrasil = dataArray.find(item => item.location === "Brasil");
-        setBrasilData(totalBrasil);
-        
-        // Filtra a linha "Brasil" e as Regiões (Norte, Nordeste, etc.) da tabela e mapa
-        const filteredForMapAndTable = dataArray.filter(item => 
-            !["Brasil", "Norte", "Nordeste", "Sudeste", "Sul", "Centro-Oeste"].includes(item.location)
-        );
+        // Uma requisição só: o backend monta (e guarda em cache) tudo que a página usa
+        const { data: dashboard } = await get("/api/v1/ibge/dashboard");
 
-        setIbgeData(filteredForMapAndTable); 
-        
-        // 2. BUSCA OS DADOS DE GÊNERO
-        const genderDataRaw = await get("/api/v1/ibge/resident_gender_distribution");
-        setGenderData(genderDataRaw.data); // Armazena os dados de gênero
-
-        // 3. BUSCA OS DADOS POR ETNIA
-        const ethnicityDataRaw = await get("/api/v1/ibge/students-autism-by-race");
-        
-        setEthnicityData(ethnicityDataRaw.data[0]); // Armazena os dados de etnia
-        console.log("Dados processados para o gráfico de barras:", ethnicityDataRaw.data);
+        // Linha "Brasil" para o card de total
+        setBrasilData(dashboard.brasil);
 
-        // 4. BUSCA O MAPA DO BRASIL (GeoJSON LOCAL)
-        const geoResponse = await fetch('/brazil-states.geojson');
+        // Só as UFs vão para a tabela e o mapa
+        setIbgeData(dashboard.states);
 
-        if (!geoResponse.ok) {
-            throw new Error(`Falha ao baixar o mapa: ${geoResponse.statusText}`);
-        }
+        // 2. DADOS DE GÊNERO
+        setGenderData(dashboard.gender);
 
-        const mapJson = await geoResponse.json();
+        // 3. DADOS POR ETNIA (totais do Brasil)
+        setEthnicityData(dashboard.ethnicity);
 
-        if (mapJson && mapJson.features) {
-            setGeoData(mapJson.features);
-        }
+        // 4. MAPA DO BRASIL (TopoJSON simplificado, já com os indicadores de cada UF)
+        const { data: topology } = await get("/api/v1/ibge/map/states");
+        setGeoData(feature(topology, topology.objects.states).features);
 
       } catch (e) {
         console.error("Erro no Dashboard:", e);
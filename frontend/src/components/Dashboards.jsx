@@ -1,13 +1,9 @@
-import React, { useEffect, useMemo, useState } from 'react';
+import React, { useEffect, useMemo, useRef, useState } from 'react';
 import { useApi } from '../hooks/useApi';
 import { BAIRROS_SP } from '../constants/bairrosSP';
 
 // Lightweight dashboard charts without external libs.
-// Expected row fields (case-insensitive, alternatives handled):
-// - risco: 'Alto' | 'Moderado' | 'Baixo'
-// - faixa etária: 'faixa_etaria' | 'faixaEtaria' | 'Faixa etária' | 'faixa'
-// - bairro/região: 'bairro' | 'Bairro' | 'Região/Bairro' | 'regiao_bairro' | 'regiaoBairro'
-// - data: 'data' | 'Data' | 'created_at' (supports dd/mm/yyyy or ISO)
+// Dates in table rows: 'data' | 'Data' | 'created_at' (supports dd/mm/yyyy or ISO)
 
 function normalizeDate(str) {
   if (!str) return null;
@@ -25,10 +21,6 @@ function normalizeDate(str) {
   return Number.isNaN(dt.getTime()) ? null : dt;
 }
 
-function toKeyDate(dt) {
-  return dt.toISOString().slice(0, 10);
-}
-
 const COLORS = {
   Alto: '#e34d4d',
   Moderado: '#f0ad4e',
@@ -103,48 +95,23 @@ const formatCpf = (value = '') => {
   return `${digits.slice(0, 3)}.${digits.slice(3, 6)}.${digits.slice(6, 9)}-${digits.slice(9)}`;
 };
 
-// Internal charts component (exported as default)
-function Charts({ data = [] }) {
+// Internal charts component (exported as default).
+// Recebe os agregados de /especialista/dashboard/graficos: contam todos os
+// resultados dos filtros, não só as linhas carregadas na tabela.
+function Charts({ charts }) {
   const { riskCounts, ageGroups, topHoods, trend } = useMemo(() => {
-    const riskCounts = { Alto: 0, Moderado: 0, Baixo: 0 };
-    const ageMap = new Map();
-    const hoodMap = new Map();
-    const dateMap = new Map();
-
-    data.forEach((row) => {
-      const risk = row.risco || row.Risco || row.risk;
-      const age = row['Faixa etária'] || row.faixa_etaria || row.faixaEtaria || row.faixa || 'Não informado';
-      const hood = row['Região/Bairro'] || row.bairro || row.Bairro || row.regiao_bairro || row.regiaoBairro;
-      const dateStr = row.Data || row.data || row.created_at;
-
-      if (risk && Object.prototype.hasOwnProperty.call(riskCounts, risk)) {
-        riskCounts[risk] += 1;
-      }
-
-      if (!ageMap.has(age)) ageMap.set(age, { faixa: age, Alto: 0, Moderado: 0, Baixo: 0 });
-      if (risk && ageMap.get(age)[risk] !== undefined) ageMap.get(age)[risk] += 1;
-
-      if (risk === 'Alto' && hood) hoodMap.set(hood, (hoodMap.get(hood) || 0) + 1);
-
-      const dt = normalizeDate(dateStr);
-      if (dt) {
-        const key = toKeyDate(dt);
-        if (!dateMap.has(key)) dateMap.set(key, { date: key, total: 0, alto: 0 });
-        const rec = dateMap.get(key);
-        rec.total += 1;
-        if (risk === 'Alto') rec.alto += 1;
-      }
-    });
-
-    const ageGroups = Array.from(ageMap.values());
-    const topHoods = Array.from(hoodMap.entries())
-      .map(([name, value]) => ({ name, value }))
-      .sort((a, b) => b.value - a.value)
-      .slice(0, 5);
-    const trend = Array.from(dateMap.values()).sort((a, b) => a.date.localeCompare(b.date));
-
+    const porRisco = charts?.por_risco || {};
+    const riskCounts = { Alto: porRisco.Alto || 0, Moderado: porRisco.Moderado || 0, Baixo: porRisco.Baixo || 0 };
+    const ageGroups = (charts?.por_faixa || []).map((g) => ({
+      faixa: g.faixa || 'Não informado',
+      Alto: g.Alto || 0,
+      Moderado: g.Moderado || 0,
+      Baixo: g.Baixo || 0,
+    }));
+    const topHoods = (charts?.bairros_alto_risco || []).map((h) => ({ name: h.regiao_bairro, value: h.total }));
+    const trend = (charts?.por_data || []).map((d) => ({ date: d.data, total: d.total, alto: d.alto }));
     return { riskCounts, ageGroups, topHoods, trend };
-  }, [data]);
+  }, [charts]);
 
   const total = Math.max(1, (riskCounts.Alto + riskCounts.Moderado + riskCounts.Baixo));
   const pct = {
@@ -316,7 +283,7 @@ function Charts({ data = [] }) {
     );
   }
 
-  const empty = !data || data.length === 0;
+  const empty = riskCounts.Alto + riskCounts.Moderado + riskCounts.Baixo === 0;
 
   return (
     <div style={grid}>
@@ -378,6 +345,38 @@ export function SpecialistDashboard() {
   const [inicio, setInicio] = useState('');
   const [fim, setFim] = useState('');
   const [limit, setLimit] = useState('10');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [charts, setCharts] = useState(null);
+
+  // Filtros e paginação ficam no servidor; os gráficos usam os mesmos filtros,
+  // sem paginação, e não mudam com "Carregar mais"
+  const filters = useMemo(() => {
+    const p = {};
+    if (bairro) p.regiao_bairro = bairro;
+    if (teste) p.teste_tipo = teste;
+    if (risco) p.risco = risco;
+    if (inicio) p.inicio = inicio;
+    if (fim) p.fim = fim;
+    return p;
+  }, [bairro, teste, risco, inicio, fim]);
+  const params = useMemo(() => ({ ...filters, limit: Number(limit) }), [filters, limit]);
+  // Filtros da lista exibida: uma página de "Carregar mais" pedida com filtros
+  // que já mudaram é descartada
+  const currentParams = useRef(params);
+  useEffect(() => {
+    currentParams.current = params;
+  }, [params]);
+
+  const toRow = (p) => ({
+    nome: p.nome_completo,
+    faixa_etaria: p.faixa_etaria,
+    regiao_bairro: p.regiao_bairro,
+    contato: p.contato_principal,
+    risco: p.risco,
+    teste: p.teste_tipo,
+    data: p.data,
+  });
 
   useEffect(() => {
     let alive = true;
@@ -385,21 +384,11 @@ export function SpecialistDashboard() {
       setLoading(true);
       setError(null);
       try {
-        const res = await api.get('/api/v1/tests/especialista/dashboard');
+        const res = await api.get('/api/v1/tests/especialista/dashboard', { params });
         if (!alive) return;
         const data = res.data || {};
-        const pacientes = data.pacientes || [];
-        setRows(
-          pacientes.map((p) => ({
-            nome: p.nome_completo,
-            faixa_etaria: p.faixa_etaria,
-            regiao_bairro: p.regiao_bairro,
-            contato: p.contato_principal,
-            risco: p.risco,
-            teste: p.teste_tipo,
-            data: p.data,
-          }))
-        );
+        setRows((data.pacientes || []).map(toRow));
+        setNextCursor(data.next_cursor || null);
         const tr = data.totais_por_risco || {};
         setTotals({ Alto: tr.Alto || 0, Moderado: tr.Moderado || 0, Baixo: tr.Baixo || 0 });
       } catch (e) {
@@ -412,34 +401,39 @@ export function SpecialistDashboard() {
     return () => {
       alive = false;
     };
-  }, [api]);
+  }, [api, params]);
 
-  const filtered = useMemo(() => {
-    const start = inicio ? normalizeDate(inicio) : null;
-    const end = fim ? normalizeDate(fim) : null;
-    return rows.filter((r) => {
-      if (bairro && String(r.regiao_bairro || '').toLowerCase() !== String(bairro).toLowerCase()) return false;
-      if (teste && String(r.teste || '').toLowerCase() !== String(teste).toLowerCase()) return false;
-      if (risco && r.risco !== risco) return false;
-      if (start || end) {
-        const d = normalizeDate(r.data);
-        if (!d) return false;
-        if (start && d < start) return false;
-        if (end) {
-          const endDay = new Date(end.getFullYear(), end.getMonth(), end.getDate(), 23, 59, 59, 999);
-          if (d > endDay) return false;
-        }
+  useEffect(() => {
+    let alive = true;
+    (async () => {
+      try {
+        const res = await api.get('/api/v1/tests/especialista/dashboard/graficos', { params: filters });
+        if (alive) setCharts(res.data || null);
+      } catch (e) {
+        if (alive) setCharts(null);
       }
-      return true;
-    });
-  }, [rows, bairro, teste, risco, inicio, fim]);
+    })();
+    return () => {
+      alive = false;
+    };
+  }, [api, filters]);
 
-  const displayRows = useMemo(() => {
-    if (limit === 'all') return filtered;
-    const n = Number(limit);
-    if (!Number.isFinite(n) || n <= 0) return filtered;
-    return filtered.slice(0, n);
-  }, [filtered, limit]);
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    const requested = params;
+    setLoadingMore(true);
+    try {
+      const res = await api.get('/api/v1/tests/especialista/dashboard', { params: { ...requested, cursor: nextCursor } });
+      if (currentParams.current !== requested) return;
+      const data = res.data || {};
+      setRows((prev) => prev.concat((data.pacientes || []).map(toRow)));
+      setNextCursor(data.next_cursor || null);
+    } catch (e) {
+      if (currentParams.current === requested) setError('Não foi possível carregar os dados.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const totalCasos = totals.Alto + totals.Moderado + totals.Baixo;
 
@@ -526,12 +520,12 @@ export function SpecialistDashboard() {
               </select>
             </div>
             <div>
-              <label>Mostrar</label>
+              <label>Por página</label>
               <select value={limit} onChange={(e) => setLimit(e.target.value)}>
-                <option value="10">Top 10</option>
-                <option value="20">Top 20</option>
-                <option value="50">Top 50</option>
-                <option value="all">Todos</option>
+                <option value="10">10</option>
+                <option value="20">20</option>
+                <option value="50">50</option>
+                <option value="500">500 (máximo)</option>
               </select>
             </div>
           </div>
@@ -562,7 +556,7 @@ export function SpecialistDashboard() {
                   </tr>
                 </thead>
                 <tbody>
-                  {displayRows.map((r, idx) => (
+                  {rows.map((r, idx) => (
                     <tr key={idx}>
                       <td style={tdS}>{r.nome}</td>
                       <td style={tdS}>{r.faixa_etaria}</td>
@@ -579,11 +573,18 @@ export function SpecialistDashboard() {
                 </tbody>
               </table>
             )}
+            {!loading && !error && nextCursor && (
+              <div style={{ marginTop: 12, textAlign: 'center' }}>
+                <button type="button" className="btn btn-outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
 
-        {/* Charts below the table */}
-        <Charts data={filtered} />
+        {/* Charts below the table: todos os resultados dos filtros, não só as páginas carregadas */}
+        <Charts charts={charts} />
       </div>
     </section>
   );